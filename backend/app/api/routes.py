@@ -1,97 +1,535 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List, Dict, Any, Iterable
-from ..models.flight import Flight
-from ..models.machine import Machine, make_machines
+import asyncio
+import logging
+import os
+import threading
+import time
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from typing import Callable, List, Dict, Any, Iterable, Literal, Optional, Set, Tuple
+from ..config import (
+    APRON_CACHE_DIR, APRON_FILE, DATA_DIR, DB_PATH, DB_POOL_SIZE, DROP_DIR, EDIT_HISTORY_LIMIT, PERSISTENCE_ENABLED,
+    PLAN_WARMUP, SHARED_STATE, SHARED_SYNC_INTERVAL, WATCH_INTERVAL,
+)
+from ..models.flight import Flight, FlightType
+from ..models.machine import Machine, machines_from, make_machines
 from ..models.driver import Driver, Autolift, make_drivers, make_autolifts
 from ..models.bracket import FlightBracket
 from ..models.autolift import AutoliftConfiguration, WindowType
 from ..models.shift import Shift, ShiftAssignment
-
-from ..services.csv_parser import parse_csv
+from ..models.validation import PlanValidation
+from ..models.assignment import (
+    AssignmentBatch, AssignmentBatchResult, AssignmentOp, AssignmentOperation, FlightAssignment
+)
+
+from ..services.csv_ingest import (
+    BatchPreparer, IngestError, IngestReport, MapperFactory, content_digest, ingest_file, ingest_stream,
+)
+from ..services.csv_parser import flight_row_mapper, prepare_flight_records, undated_flight_row_mapper
+from ..services.flight_import import ImportFingerprint, apply_diff, diff_flights
+from ..services.edit_history import EditHistory, EditHistoryError
+from ..services.drivers_csv_parser import autolift_row_mapper, driver_row_mapper
 from ..services.bracket_scheduler import BracketScheduler  # Основной планировщик
-from ..services.shifts_csv_parser import ShiftsCSVParser
+from ..services.apron import TravelTimes, apron, load_travel_times
+from ..services.shifts_csv_parser import ShiftsCSVParser, shift_row_mapper
 from ..services.shift_assignment_service import ShiftAssignmentService
+from ..services.repository import Collection, Snapshot, Store
+from ..services.persistence import PlanArchive
+from ..services.plan_diff import diff_plans
+from ..services.plan_validator import validate_plan
+from ..services.reference_data import ReferenceDataLoader
+from ..services.data_watcher import DataDirectoryWatcher
+from ..services.response_cache import VersionedResponseCache
+from ..services.single_flight import SingleFlight
+from ..services.warmup import PlanWarmup
+from ..services.change_log import ChangeLog
+from ..services.shared_state import SharedStateSync, documents_reader, table_reader
+from ..services import metrics
+from ..services.tracing import TracedRoute, chrome_trace, tracer
+from ..utils.bulk import dump_json_many
+from ..utils.log import current_levels, set_levels
+from ..utils.constants import DAY_END, DAY_START
+from ..services.timing_engine import DEFAULT_PROFILE, RuleProfile, engine as timing_engine
+
+logger = logging.getLogger(__name__)
+
+# Хранилище данных с индексами (вместо глобальных списков);
+# справочники загружаются не при импорте модуля, а через reference_data
+store = Store()
+archive: Optional[PlanArchive] = None
+reference_data = ReferenceDataLoader()
+# Сериализованные ответы GET-списков по версии коллекции (ETag / 304)
+response_cache = VersionedResponseCache()
+# Журнал изменений для дельта-синхронизации (GET /changes)
+change_log = ChangeLog()
+change_log.attach(store, ("flights", "machines", "drivers", "autolifts", "shifts", "shift_assignments"))
+
+
+# Общее состояние нескольких воркеров: справочники хранятся документами в базе
+REFERENCE_COLLECTIONS = ("machines", "drivers", "autolifts", "shifts")
+shared_state = SharedStateSync(SHARED_SYNC_INTERVAL)
+shared_state.register(store.flights, table_reader("flights", PlanArchive.load_flights))
+shared_state.register(
+    store.shift_assignments, table_reader("shift_assignments", PlanArchive.load_shift_assignments)
+)
+shared_state.register(store.machines, documents_reader("machines", Machine))
+shared_state.register(store.drivers, documents_reader("drivers", Driver))
+shared_state.register(store.autolifts, documents_reader("autolifts", Autolift))
+shared_state.register(store.shifts, documents_reader("shifts", Shift))
+_archive_lock = threading.Lock()
+# Одинаковые одновременные запросы планирования выполняются один раз
+planning_requests = SingleFlight(on_join=lambda key: metrics.plan_coalesced.inc(source=key[0]))
+# Спекулятивный план после импорта рейсов
+plan_warmup = PlanWarmup(PLAN_WARMUP)
+# Отмена и повтор ручных правок назначений
+edit_history = EditHistory(EDIT_HISTORY_LIMIT)
+edit_history.attach(store.flights)
+# Наибольшая страница списка версий планов
+MAX_PLANS_PAGE = 500
+# Последняя проверка плана правилами ТГ: ключ (версия рейсов, профиль правил) -> результат
+_plan_validation: Dict[Tuple[int, RuleProfile], PlanValidation] = {}
+
+
+def _open_archive() -> Optional[PlanArchive]:
+    """Открывает постоянное хранилище один раз (его ждут и загрузчики справочников в общем режиме)"""
+    global archive
+    if not PERSISTENCE_ENABLED:
+        return None
+    with _archive_lock:
+        if archive is None:
+            try:
+                opened = PlanArchive(DB_PATH, DB_POOL_SIZE)
+            except Exception as e:
+                raise RuntimeError(f"Не удалось открыть постоянное хранилище {DB_PATH}: {e}") from e
+            if SHARED_STATE:
+                opened.attach_documents(store, REFERENCE_COLLECTIONS)
+                shared_state.bind(opened)
+            archive = opened
+    return archive
+
+
+def _load_reference(collection: Collection, model: Any, read_files: Callable[[], List[Any]]) -> int:
+    """
+    Справочник из CSV каталога данных. В общем режиме берется версия из базы,
+    если она уже сохранена другим воркером; иначе CSV загружается и сохраняется.
+    """
+    shared = _open_archive() if SHARED_STATE else None
+    loaded = shared.load_documents(collection.name, model) if shared is not None else None
+    if loaded is None:
+        collection.replace_all(read_files())
+    else:
+        items, version = loaded
+        with shared.suppressed():
+            collection.replace_all(items)
+        shared_state.remember(collection.name, version)
+    return len(collection)
+
+
+def _load_machines() -> int:
+    return _load_reference(store.machines, Machine, lambda: make_machines(DATA_DIR))
+
+
+def _load_drivers() -> int:
+    return _load_reference(store.drivers, Driver, lambda: make_drivers(DATA_DIR))
+
+
+def _load_autolifts() -> int:
+    return _load_reference(store.autolifts, Autolift, lambda: make_autolifts(DATA_DIR))
+
+
+def _load_shifts() -> int:
+    """Смены по умолчанию из shifts.csv каталога данных"""
+    return _load_reference(
+        store.shifts, Shift, lambda: ShiftsCSVParser.parse_shifts_file(os.path.join(DATA_DIR, "shifts.csv"))
+    )
+
+
+def _load_apron() -> int:
+    """Схема перрона: матрица времен переезда между стоянками (файла нет - постоянные интервалы)"""
+    return apron.load(APRON_FILE, APRON_CACHE_DIR)
+
+
+def _parse_apron_file(path: str) -> List[TravelTimes]:
+    return [load_travel_times(path, APRON_CACHE_DIR)]
+
+
+def _apply_apron(items: List[TravelTimes]) -> int:
+    return apron.set_times(items[0])
+
+
+def _load_archive() -> int:
+    """Постоянное хранилище: восстанавливаем рейсы и назначения смен после перезапуска"""
+    opened = _open_archive()
+    if opened is None:
+        return 0
+    try:
+        # Версии читаются до данных: изменения между чтениями подхватит сверка
+        versions = opened.read_versions()
+        store.flights.replace_all(opened.load_flights())
+        store.shift_assignments.replace_all(opened.load_shift_assignments())
+        opened.attach(store)
+    except Exception as e:
+        raise RuntimeError(f"Не удалось открыть постоянное хранилище {DB_PATH}: {e}") from e
+    for name in ("flights", "shift_assignments"):
+        shared_state.remember(name, versions.get(name, 0))
+    return len(store.flights)
+
+
+reference_data.register("machines", _load_machines)
+reference_data.register("drivers", _load_drivers)
+reference_data.register("autolifts", _load_autolifts)
+reference_data.register("shifts", _load_shifts)
+reference_data.register("apron", _load_apron)
+reference_data.register("archive", _load_archive)
+
+
+def _parse_reference_file(mapper_factory: MapperFactory, model: Any) -> Callable[[str], List[Any]]:
+    """Разбор справочного файла для горячей перезагрузки (ошибки строк - в лог)"""
+    def parse(path: str) -> List[Any]:
+        items, report = ingest_file(path, mapper_factory, model)
+        if report.error_count:
+            logger.warning("%s: пропущено строк с ошибками - %d", path, report.error_count)
+        return items
+    return parse
+
+
+def _parse_flights_file(path: str) -> List[Flight]:
+    started = time.perf_counter()
+    flights, report = ingest_file(path, flight_row_mapper, Flight, prepare=prepare_flight_records)
+    _observe_import("flights", report, time.perf_counter() - started)
+    import_reports["flights"] = report
+    return flights
+
+
+def _swap_into(collection: Collection) -> Callable[[List[Any]], int]:
+    def apply(items: List[Any]) -> int:
+        collection.replace_all(items)
+        return len(collection)
+    return apply
+
+
+def _parse_with_machines(
+    mapper_factory: MapperFactory, model: Any, collection: Collection
+) -> Callable[[str], List[Tuple[List[Any], List[Machine]]]]:
+    """
+    Разбор водителей или автолифтов вместе со сборкой машин из разобранных
+    записей и текущей второй коллекции (в пуле потоков, как и сам разбор)
+    """
+    parse = _parse_reference_file(mapper_factory, model)
+
+    def parse_batch(path: str) -> List[Tuple[List[Any], List[Machine]]]:
+        items = parse(path)
+        if not items:
+            return []
+        drivers = items if collection is store.drivers else store.drivers.all()
+        autolifts = items if collection is store.autolifts else store.autolifts.all()
+        return [(items, machines_from(drivers, autolifts))]
+    return parse_batch
+
+
+def _swap_with_machines(collection: Collection) -> Callable[[List[Tuple[List[Any], List[Machine]]]], int]:
+    """Подмена водителей или автолифтов вместе с машинами, собранными при разборе"""
+    def apply(batch: List[Tuple[List[Any], List[Machine]]]) -> int:
+        items, machines = batch[0]
+        collection.replace_all(items)
+        store.machines.replace_all(machines)
+        return len(collection)
+    return apply
+
+
+def _import_dropped_flights(flights: List[Flight]) -> int:
+    count = _swap_into(store.flights)(flights)
+    _warm_up_plan()
+    return count
+
+
+# Горячая перезагрузка справочников и прием файлов рейсов из каталога данных
+data_watcher = DataDirectoryWatcher(DATA_DIR, WATCH_INTERVAL, DROP_DIR)
+data_watcher.watch_file(
+    "drivers.csv",
+    _parse_with_machines(driver_row_mapper, Driver, store.drivers),
+    _swap_with_machines(store.drivers),
+)
+data_watcher.watch_file(
+    "autolifts.csv",
+    _parse_with_machines(autolift_row_mapper, Autolift, store.autolifts),
+    _swap_with_machines(store.autolifts),
+)
+data_watcher.watch_file("shifts.csv", _parse_reference_file(shift_row_mapper, Shift), _swap_into(store.shifts))
+data_watcher.watch_file(APRON_FILE, _parse_apron_file, _apply_apron)
+data_watcher.watch_drop_dir(_parse_flights_file, _import_dropped_flights)
+
+
+async def _require_reference_data(request: Request) -> None:
+    """
+    Зависимость маршрутов: справочники должны быть загружены до обработки
+    запроса; в общем режиме копия в памяти сверяется с базой (запись - всегда)
+    """
+    await reference_data.wait()
+    await shared_state.sync(force=request.method not in ("GET", "HEAD"))
+
+
+router = APIRouter(dependencies=[Depends(_require_reference_data)], route_class=TracedRoute)
+# Служебные маршруты без ожидания загрузки справочников
+health_router = APIRouter()
+
+
+@health_router.get("/health")
+async def health():
+    """Процесс запущен и принимает запросы"""
+    return {"status": "ok"}
+
+
+@health_router.get("/data/watcher")
+async def get_data_watcher_status():
+    """Состояние наблюдения за каталогом данных и последние перезагрузки"""
+    return data_watcher.status()
+
+
+@health_router.get("/data/shared")
+async def get_shared_state_status():
+    """Состояние общего режима нескольких воркеров"""
+    return shared_state.status()
+
+
+@health_router.get("/metrics")
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@health_router.get("/logging/levels")
+async def get_logging_levels():
+    """Явно заданные уровни логгеров приложения"""
+    return current_levels()
+
+
+@health_router.put("/logging/levels")
+async def update_logging_levels(levels: Dict[str, str]):
+    """Меняет уровни логгеров на лету, например {"services.bracket_scheduler": "DEBUG"}"""
+    try:
+        set_levels(levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return current_levels()
+
+
+@health_router.get("/traces")
+async def list_traces(limit: int = Query(50, ge=1, le=1000)):
+    """Последние трассы запросов (корневые интервалы)"""
+    return tracer.recent_traces(limit)
+
+
+@health_router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: str = Query("json", pattern="^(json|chrome)$")):
+    """Интервалы трассы; format=chrome - файл для chrome://tracing / Perfetto"""
+    spans = tracer.trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Трасса не найдена (буфер хранит последние интервалы)")
+    if format == "chrome":
+        return JSONResponse(
+            chrome_trace(spans),
+            headers={"Content-Disposition": f'attachment; filename="trace-{trace_id}.json"'},
+        )
+    return spans
+
 
-router = APIRouter()
-
-# Хранилища данных
-flights_storage: List[Flight] = []
-machines_storage: List[Machine] = make_machines()
-drivers_storage: List[Driver] = make_drivers()
-autolifts_storage: List[Autolift] = make_autolifts()
-shifts_storage: List[Shift] = []
-shift_assignments_storage: List[ShiftAssignment] = []
-
-
-def _to_camel_case(name: str) -> str:
-    parts = name.split('_')
-    if not parts:
-        return name
-    return parts[0] + ''.join(part.capitalize() for part in parts[1:])
-
-
-def _to_snake_case(name: str) -> str:
-    if not name:
-        return name
-    result: List[str] = []
-    for char in name:
-        if char.isupper():
-            if result and result[-1] != '_':
-                result.append('_')
-            result.append(char.lower())
+@health_router.get("/ready")
+async def ready(response: Response):
+    """Готовность: загружены ли справочники, с отчетом по каждому источнику"""
+    report = reference_data.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+
+def shutdown_storage() -> None:
+    """Дописывает отложенные изменения в постоянное хранилище"""
+    if archive is not None:
+        archive.close()
+
+
+def _get_or_404(collection: Collection, item_id: str, detail: str) -> Any:
+    """Возвращает объект коллекции по ID или 404"""
+    item = collection.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return item
+
+
+def _apply_plan_assignments(
+    assignments: Iterable[Dict[str, Any]],
+    scope_ids: Optional[Set[str]] = None,
+    base: Optional[Snapshot[Flight]] = None,
+    reset_ids: Iterable[str] = (),
+) -> int:
+    """
+    Применяет результаты планирования к рейсам одним пакетом.
+    Рейс находится по flightId, а при его отсутствии - по индексу flightNo.
+    base - снимок рейсов, по которому строился план: рейсы, измененные
+    другим запросом во время планирования, не перезаписываются.
+    reset_ids - рейсы, с которых снимаются прежние назначения в том же пакете.
+    """
+    source = base if base is not None else store.flights.snapshot()
+    changes: Dict[str, Dict[str, Any]] = {
+        flight_id: {"vehicleId": "", "chainId": ""} for flight_id in reset_ids
+    }
+    for assignment in assignments:
+        flight_id = assignment.get("flightId")
+        if flight_id is None:
+            flight_no = assignment.get("flightNo")
+            if not flight_no:
+                continue
+            candidates = [f.id for f in source.find("flightNo", flight_no)]
         else:
-            result.append(char)
-    return ''.join(result)
+            candidates = [flight_id]
+        for candidate in candidates:
+            if scope_ids is not None and candidate not in scope_ids:
+                continue
+            changes[candidate] = {
+                "vehicleId": assignment.get("driverId") or "",
+                "chainId": assignment.get("bracketId") or "",
+            }
+    with tracer.span("storage.apply", collection="flights", changes=len(changes)):
+        applied = store.flights.update_many(changes, expected=base)
+    if base is not None and applied < len(changes):
+        logger.warning("План применен частично: %d рейсов изменены во время планирования", len(changes) - applied)
+    _validate_plan()
+    return applied
+
+
+def _validate_plan() -> PlanValidation:
+    """
+    Проверка текущего плана правилами ТГ. Выполняется после каждого
+    применения плана и ручной правки; для той же версии рейсов не повторяется.
+    """
+    flights = store.flights.snapshot()
+    profile = timing_engine.profile
+    key = (flights.version, profile)
+    cached = _plan_validation.get(key)
+    if cached is not None:
+        return cached
+    with tracer.span("plan.validate", flights=len(flights)):
+        validation = validate_plan(flights, flights.version, profile.leave_before_std)
+    _plan_validation.clear()
+    _plan_validation[key] = validation
+    metrics.observe_validation(validation.counts)
+    if not validation.valid:
+        logger.warning(
+            "План версии %d нарушает правила ТГ: %s", flights.version,
+            ", ".join(f"{kind.value}={count}" for kind, count in validation.counts.items() if count),
+        )
+    return validation
+
+
+async def _archive_plan(
+    source: str,
+    result: Dict[str, Any],
+    flights: List[Flight],
+    shift_assignments: Optional[List[ShiftAssignment]] = None,
+) -> Optional[int]:
+    """Архивирует результат планирования; возвращает номер версии плана"""
+    if archive is None:
+        return None
+    try:
+        with tracer.span("archive.save", source=source):
+            future = archive.save_plan(source, result, flights, store.version, shift_assignments)
+            return await asyncio.wrap_future(future)
+    except Exception as e:
+        logger.error("Не удалось сохранить план в архив: %s", e)
+        return None
 
 
-def _iter_keys(field: str) -> Iterable[str]:
-    """Возвращает возможные варианты имени поля (snake/camel)."""
-    yield field
-    if '_' in field:
-        candidate = _to_camel_case(field)
-        if candidate != field:
-            yield candidate
-    else:
-        candidate = _to_snake_case(field)
-        if candidate != field:
-            yield candidate
-
-
-def _get_field(entity: Any, field: str, default: Any = None) -> Any:
-    """Безопасно получает значение поля из модели или словаря."""
-    if isinstance(entity, dict):
-        for key in _iter_keys(field):
-            if key in entity:
-                return entity[key]
-        return default
-    return getattr(entity, field, default)
-
-
-def _set_field(entity: Any, field: str, value: Any) -> None:
-    """Безопасно устанавливает значение поля в модели или словаре."""
-    if isinstance(entity, dict):
-        for key in _iter_keys(field):
-            if key in entity:
-                entity[key] = value
-                return
-        entity[field] = value
-    else:
-        setattr(entity, field, value)
+def _plan_key(snapshot: Snapshot) -> Tuple[Any, ...]:
+    """Ключ входных данных полного плана с водителями (рейсы, машины, водители, схема перрона)"""
+    return snapshot.version, store.machines.version, store.drivers.version, apron.times.digest
 
 
-def _find_in_storage(storage: Iterable[Any], field: str, target: str) -> Any:
-    """Ищет объект в хранилище по указанному полю."""
-    for item in storage:
-        if _get_field(item, field) == target:
-            return item
-    return None
+def _warm_up_plan() -> None:
+    """
+    Планирует текущее расписание в фоне: первый запрос плана получит готовый
+    результат, а проверка плана (GET /plans/validate) - кеш по версии рейсов
+    """
+    snapshot = store.flights.snapshot()
+    if not snapshot:
+        plan_warmup.discard()
+        return
+    scheduler = BracketScheduler(snapshot.all(), store.machines.all(), store.drivers.all())
+    plan_warmup.start(_plan_key(snapshot), scheduler.plan_brackets, prepare=(_validate_plan,))
+
 
-# Загружаем смены по умолчанию при старте
-try:
-    default_shifts = ShiftsCSVParser.parse_shifts_file("/Users/igordvoretskii/Documents/aeromar-python/shifts.csv")
-    shifts_storage.extend(default_shifts)
-except Exception as e:
-    print(f"Не удалось загрузить смены по умолчанию: {e}")
+async def _run_planner(
+    source: str, scheduler: BracketScheduler, flights_count: int, warm_key: Optional[Tuple[Any, ...]] = None
+) -> Dict[str, Any]:
+    """
+    Планирование скобок в пуле потоков с метриками длительности и результата.
+    warm_key - ключ входных данных: план прогрева с тем же ключом берется готовым.
+    """
+    if warm_key is not None:
+        with tracer.span("plan.warmup", source=source) as span:
+            result = await plan_warmup.take(warm_key)
+            if span is not None:
+                span.set(hit=result is not None)
+        metrics.plan_warmup.inc(result="hit" if result is not None else "miss")
+        if result is not None:
+            return result
+    started = time.perf_counter()
+    with tracer.span("plan", source=source, flights=flights_count) as span:
+        result = await run_in_threadpool(scheduler.plan_brackets)
+        if span is not None:
+            span.set(brackets=len(result.get("brackets", [])), assigned=len(result.get("assignments", [])))
+    metrics.observe_plan(source, time.perf_counter() - started, flights_count, result)
+    return result
+
+
+def _require_archive() -> PlanArchive:
+    if archive is None:
+        raise HTTPException(status_code=503, detail="Постоянное хранилище отключено")
+    return archive
+
+# Отчеты о последних импортах CSV по типу данных
+import_reports: Dict[str, IngestReport] = {}
+# Итоги последнего diff-импорта (добавленные, удаленные, измененные рейсы)
+import_diffs: Dict[str, Dict[str, Any]] = {}
+flight_import_fingerprint = ImportFingerprint()
+
+
+def _observe_import(kind: str, report: IngestReport, seconds: float) -> None:
+    metrics.observe_import(kind, seconds, report.rows, report.imported, report.error_count)
+
+
+def _check_csv_upload(file: UploadFile) -> None:
+    if not file.filename or not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
+
+
+async def _ingest_upload(
+    kind: str,
+    file: UploadFile,
+    response: Response,
+    mapper_factory: MapperFactory,
+    model: Any,
+    prepare: Optional[BatchPreparer] = None,
+) -> List[Any]:
+    """Потоковый разбор загруженного CSV в пуле потоков; итоги - в заголовках ответа"""
+    _check_csv_upload(file)
+    started = time.perf_counter()
+    try:
+        with tracer.span("csv.ingest", kind=kind) as span:
+            items, report = await run_in_threadpool(
+                ingest_stream, file.file, mapper_factory, model, prepare=prepare
+            )
+            if span is not None:
+                span.set(rows=report.rows, imported=report.imported, errors=report.error_count)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка при парсинге CSV: {str(e)}")
+    _observe_import(kind, report, time.perf_counter() - started)
+    import_reports[kind] = report
+    response.headers["X-Import-Rows"] = str(report.rows)
+    response.headers["X-Import-Imported"] = str(report.imported)
+    response.headers["X-Import-Errors"] = str(report.error_count)
+    response.headers["X-Import-Encoding"] = report.encoding
+    return items
 
 # Хранилище в памяти (в реальном приложении использовать БД)  
 # (Дублирующие определения удалены)
@@ -102,260 +540,482 @@ async def root():
     """Корневой эндпоинт"""
     return {"message": "Aeromar Flight Planner API"}
 
+@router.get("/changes")
+async def get_changes(since: int = Query(0, ge=0), epoch: Optional[str] = None):
+    """
+    Изменения хранилища после версии since: каждая сущность один раз
+    (upserted - текущее состояние, deleted - ключи). Скобки - группы рейсов
+    по chainId, назначения - поля рейсов, водителей и shift_assignments.
+    reload - коллекции, замененные целиком; full_reload - журнал не покрывает
+    since или epoch не совпадает (перезапуск): нужна полная загрузка.
+    """
+    return change_log.changes_since(since, epoch)
+
+
+def _parse_cursor(cursor: str) -> Tuple[int, str]:
+    """Курсор страницы рейсов: "<stdMin>:<id>" последнего выданного рейса"""
+    std, _, flight_id = cursor.partition(":")
+    try:
+        return int(std), flight_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Некорректный курсор: {cursor}")
+
+
 @router.get("/flights", response_model=List[Flight])
-async def get_flights():
-    """Получить все рейсы"""
-    return flights_storage
+async def get_flights(
+    request: Request,
+    stdFrom: Optional[int] = None,
+    stdTo: Optional[int] = None,
+    overlapFrom: Optional[int] = None,
+    overlapTo: Optional[int] = None,
+    chainId: Optional[str] = None,
+    vehicleId: Optional[str] = None,
+    type: Optional[FlightType] = None,
+    acType: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+):
+    """
+    Получить рейсы.
+    Без параметров - весь список (с ETag). Фильтры: диапазон STD (stdFrom/stdTo),
+    пересечение интервала обслуживания serviceStart..unloadEnd с
+    [overlapFrom, overlapTo], chainId, vehicleId (пустое значение -
+    неназначенные), type, acType. Страницы: limit и cursor из заголовка
+    X-Next-Cursor предыдущего ответа; порядок - по (stdMin, id).
+    """
+    flights = store.flights.snapshot()
+    filters = {"chainId": chainId, "vehicleId": vehicleId, "type": type,
+               "acType": acType.upper().strip() if acType else None}
+    filters = {field: value for field, value in filters.items() if value is not None}
+    overlap = overlapFrom is not None or overlapTo is not None
+    if not filters and not overlap and stdFrom is None and stdTo is None and limit is None and cursor is None:
+        return response_cache.respond(request, store.flights, Flight)
+
+    after = _parse_cursor(cursor) if cursor else None
+    if overlap:
+        # Индекс интервалов; полуоткрытый запрос ограничивается границами дня
+        low = overlapFrom if overlapFrom is not None else DAY_START
+        high = overlapTo if overlapTo is not None else DAY_END
+        candidates = sorted(flights.overlapping(low, high), key=flights.sort_key)
+    elif filters:
+        # Самый избирательный хеш-индекс, остальные условия проверяются ниже
+        field = min(filters, key=lambda f: flights.count(f, filters[f]))
+        candidates = sorted(flights.find(field, filters[field]), key=flights.sort_key)
+    else:
+        candidates = None
+
+    if candidates is None:
+        # Только диапазон STD: страница берется прямо из сортированного индекса
+        page = flights.range(stdFrom, stdTo, after=after, limit=limit + 1 if limit else None)
+    else:
+        page = []
+        for flight in candidates:
+            if after is not None and flights.sort_key(flight) <= after:
+                continue
+            if stdFrom is not None and flight.stdMin < stdFrom:
+                continue
+            if stdTo is not None and flight.stdMin > stdTo:
+                continue
+            if any(getattr(flight, f) != v for f, v in filters.items()):
+                continue
+            page.append(flight)
+            if limit and len(page) > limit:
+                break
+
+    headers = {}
+    if limit and len(page) > limit:
+        page = page[:limit]
+        std_min, flight_id = flights.sort_key(page[-1])
+        headers["X-Next-Cursor"] = f"{std_min}:{flight_id}"
+    # Рейсы из хранилища уже проверены - сериализуем пакетом, минуя response_model
+    return Response(content=dump_json_many(Flight, page), media_type="application/json", headers=headers)
 
 @router.delete("/flights")
 async def clear_flights():
     """Очистить все рейсы"""
-    flights_storage.clear()
+    store.flights.clear()
     return {"message": "Все рейсы удалены"}
 
 @router.post("/flights", response_model=List[Flight])
 async def add_flights(flights: List[Flight]):
     """Добавить рейсы"""
-    flights_storage.extend(flights)
-    return flights_storage
+    store.flights.add_many(flights)
+    return response_cache.send(store.flights, Flight)
 
 @router.post("/flights/import-csv", response_model=List[Flight])
-async def import_csv(file: UploadFile = File(...)):
-    """Импорт рейсов из CSV файла"""
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
-    
-    content = await file.read()
-    print(f"DEBUG: Получен файл размером {len(content)} байт")
-    
-    # Пробуем разные кодировки
-    text = None
-    for encoding in ['utf-8', 'utf-8-sig', 'cp1251', 'iso-8859-1']:
-        try:
-            text = content.decode(encoding)
-            print(f"DEBUG: Успешно декодировано с кодировкой {encoding}")
-            break
-        except UnicodeDecodeError:
-            print(f"DEBUG: Не удалось декодировать с кодировкой {encoding}")
-            continue
-    
-    if text is None:
-        raise HTTPException(status_code=400, detail="Не удалось декодировать файл. Проверьте кодировку.")
-    
-    print(f"DEBUG: Декодированный текст (первые 200 символов): {repr(text[:200])}")
-    
-    # Тестируем split на строки
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    print(f"DEBUG: Количество строк после split: {len(lines)}")
-    print(f"DEBUG: Первая строка: {repr(lines[0] if lines else 'НЕТ СТРОК')}")
-    print(f"DEBUG: Вторая строка: {repr(lines[1] if len(lines) > 1 else 'НЕТ ВТОРОЙ СТРОКИ')}")
-    
-    try:
-        new_flights = parse_csv(text)
-        print(f"DEBUG: Импортировано {len(new_flights)} рейсов из CSV")
-        # Заменяем все данные новыми (очищаем старые)
-        flights_storage.clear()
-        flights_storage.extend(new_flights)
-        print(f"DEBUG: flights_storage теперь содержит {len(flights_storage)} рейсов")
-        
-        # Возвращаем полный список для обновления фронтенда
-        result = list(flights_storage)
-        return result
-    except Exception as e:
-        print(f"DEBUG: Ошибка при парсинге CSV: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=400, detail=f"Ошибка при парсинге CSV: {str(e)}")
+async def import_csv(
+    response: Response,
+    file: UploadFile = File(...),
+    mode: Literal["replace", "diff"] = "replace",
+    repair: bool = False,
+):
+    """
+    Импорт рейсов из CSV файла.
+    mode=replace - рейсы заменяются целиком (новые id, назначения сброшены).
+    mode=diff - применяются только отличия по ключу (flightNo, flightDate,
+    origin), совпавшие рейсы сохраняют id и назначения; рейсы со STD без даты
+    сопоставляются по (flightNo, origin) и сохраняют дату; repair=true - новые
+    рейсы и рейсы, потерявшие скобку, сразу перепланируются. Итоги - в
+    заголовках X-Import-Added/Removed/Changed/Released и GET /imports/flights/diff.
+    """
+    if mode == "diff":
+        return await _import_flights_diff(response, file, repair)
+
+    new_flights = await _ingest_upload(
+        "flights", file, response, flight_row_mapper, Flight, prepare_flight_records
+    )
+    # Заменяем все данные новыми (очищаем старые)
+    store.flights.replace_all(new_flights)
+    _warm_up_plan()
+
+    # Возвращаем полный список для обновления фронтенда
+    return response_cache.send(store.flights, Flight, response.headers)
+
+
+async def _import_flights_diff(response: Response, file: UploadFile, repair: bool) -> Response:
+    _check_csv_upload(file)
+    digest = await run_in_threadpool(content_digest, file.file)
+    if flight_import_fingerprint.matches(digest, store.flights.snapshot()):
+        # Тот же файл, расписание с прошлого импорта не менялось
+        response.headers["X-Import-Unchanged"] = "1"
+        return response_cache.send(store.flights, Flight, response.headers)
+
+    # Дата рейса со STD без даты берется из хранилища при сравнении (diff_flights)
+    new_flights = await _ingest_upload(
+        "flights", file, response, undated_flight_row_mapper, Flight, prepare_flight_records
+    )
+    # Разбор выполнен один раз; если рейсы изменил другой запрос - сравниваем заново
+    for _ in range(3):
+        base = store.flights.snapshot()
+        diff = await run_in_threadpool(diff_flights, base, new_flights)
+        with tracer.span("storage.apply", collection="flights", changes=len(diff.changed)):
+            if apply_diff(store.flights, diff, base):
+                break
+    else:
+        raise HTTPException(status_code=409, detail="Рейсы изменялись во время импорта, повторите загрузку")
+    flight_import_fingerprint.remember(digest, store.flights.snapshot())
+
+    summary = diff.to_dict()
+    if repair and diff.repair_ids:
+        planned = await _plan_selected("flights/import-csv", diff.repair_ids)
+        summary["repair"] = {"stats": planned["stats"], "planVersion": planned["planVersion"]}
+        if planned["planVersion"] is not None:
+            response.headers["X-Plan-Version"] = str(planned["planVersion"])
+    import_diffs["flights"] = summary
+    if not diff.empty:
+        _warm_up_plan()
+    response.headers["X-Import-Added"] = str(len(diff.added))
+    response.headers["X-Import-Removed"] = str(len(diff.removed))
+    response.headers["X-Import-Changed"] = str(len(diff.changed))
+    response.headers["X-Import-Released"] = str(len(diff.released))
+    return response_cache.send(store.flights, Flight, response.headers)
 
 @router.post("/drivers/import-csv", response_model=List[Driver])
-async def import_drivers_csv(file: UploadFile = File(...)):
+async def import_drivers_csv(response: Response, file: UploadFile = File(...)):
     """Импорт водителей из CSV файла"""
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
-    
-    try:
-        contents = await file.read()
-        text = contents.decode('utf-8')
-        
-        from ..services.drivers_csv_parser import parse_drivers_csv
-        new_drivers = parse_drivers_csv(text)
-        
-        # Заменяем существующих водителей
-        drivers_storage.clear()
-        drivers_storage.extend(new_drivers)
-        
-        return drivers_storage
-        
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Ошибка декодирования файла. Убедитесь, что файл в кодировке UTF-8")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка при парсинге CSV: {str(e)}")
+    new_drivers = await _ingest_upload("drivers", file, response, driver_row_mapper, Driver)
+    # Заменяем существующих водителей
+    store.drivers.replace_all(new_drivers)
+    return response_cache.send(store.drivers, Driver, response.headers)
 
 @router.post("/autolifts/import-csv", response_model=List[Autolift])
-async def import_autolifts_csv(file: UploadFile = File(...)):
+async def import_autolifts_csv(response: Response, file: UploadFile = File(...)):
     """Импорт автолифтов из CSV файла"""
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
-    
+    new_autolifts = await _ingest_upload("autolifts", file, response, autolift_row_mapper, Autolift)
+    # Заменяем существующие автолифты
+    store.autolifts.replace_all(new_autolifts)
+    return response_cache.send(store.autolifts, Autolift, response.headers)
+
+@router.get("/imports/{kind}/report")
+async def get_import_report(kind: str):
+    """Отчет о последнем импорте CSV (flights, drivers, autolifts, shifts)"""
+    report = import_reports.get(kind)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Импорт этого типа еще не выполнялся")
+    return report.to_dict()
+
+@router.get("/imports/flights/diff")
+async def get_flight_import_diff():
+    """Итоги последнего импорта рейсов в режиме diff (id добавленных, удаленных, измененных)"""
+    summary = import_diffs.get("flights")
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Импорт рейсов в режиме diff еще не выполнялся")
+    return summary
+
+@router.get("/rules/profile")
+async def get_rule_profile():
+    """Активный профиль правил ТГ для расчета времен рейсов"""
+    return timing_engine.profile.to_dict()
+
+@router.put("/rules/profile")
+async def update_rule_profile(changes: Dict[str, Any]):
+    """Изменить профиль правил ТГ и пересчитать времена всех рейсов"""
     try:
-        contents = await file.read()
-        text = contents.decode('utf-8')
-        
-        from ..services.drivers_csv_parser import parse_autolifts_csv
-        new_autolifts = parse_autolifts_csv(text)
-        
-        # Заменяем существующие автолифты
-        autolifts_storage.clear()
-        autolifts_storage.extend(new_autolifts)
-        
-        return autolifts_storage
-        
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Ошибка декодирования файла. Убедитесь, что файл в кодировке UTF-8")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка при парсинге CSV: {str(e)}")
+        profile = timing_engine.profile.with_changes(**changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timing_engine.set_profile(profile)
+    updated = timing_engine.rederive(store.flights)
+    _validate_plan()
+    return {"profile": profile.to_dict(), "updated_flights": updated}
+
+@router.post("/rules/profile/reset")
+async def reset_rule_profile():
+    """Вернуть профиль правил по умолчанию и пересчитать времена рейсов"""
+    timing_engine.set_profile(DEFAULT_PROFILE)
+    updated = timing_engine.rederive(store.flights)
+    _validate_plan()
+    return {"profile": DEFAULT_PROFILE.to_dict(), "updated_flights": updated}
 
 @router.get("/machines", response_model=List[Machine])
-async def get_machines():
+async def get_machines(request: Request):
     """Получить все машины"""
-    return machines_storage
+    return response_cache.respond(request, store.machines, Machine)
 
 @router.post("/assign/auto")
+@planning_requests.coalesce("assign/auto", lambda: (store.version,))
 async def auto_assign():
     """Автоматическое назначение рейсов используя BracketScheduler"""
-    print(f"DEBUG: flights_storage содержит {len(flights_storage)} рейсов")
-    print(f"DEBUG: machines_storage содержит {len(machines_storage)} машин")
+    logger.debug("Автоназначение: рейсов %d, машин %d", len(store.flights), len(store.machines))
     
-    if not flights_storage:
+    if not store.flights:
         raise HTTPException(status_code=400, detail="Нет рейсов для назначения")
     
     try:
         # Используем BracketScheduler
-        print("DEBUG: Используем BracketScheduler...")
-        scheduler = BracketScheduler(flights_storage, machines_storage)
+        # Планировщик работает с неизменяемым снимком рейсов в пуле потоков
+        snapshot = store.flights.snapshot()
+        flights = snapshot.all()
+        scheduler = BracketScheduler(flights, store.machines.all())
         
         # Получаем неназначенные рейсы
-        unassigned_flights = [
-            f for f in flights_storage
-            if not _get_field(f, "vehicleId")
-        ]
-        print(f"DEBUG: Неназначенных рейсов: {len(unassigned_flights)}")
+        unassigned_flights = snapshot.find("chainId", "")
+        logger.debug("Неназначенных рейсов: %d", len(unassigned_flights))
         
         # Планирование скобок
-        result = scheduler.plan_brackets()
+        result = await _run_planner("assign/auto", scheduler, len(flights))
         
         # result содержит assignments, brackets, unassigned
         assignments = result.get("assignments", [])
         brackets = result.get("brackets", [])
         
         # Обновляем назначения рейсов
-        for assignment in assignments:
-            flight_no = assignment.get("flightNo")
-            driver_id = assignment.get("driverId") 
-            bracket_id = assignment.get("bracketId")
-            
-            if not flight_no:
-                continue
-                
-            # Находим рейс и обновляем его назначения
-            for flight in flights_storage:
-                if _get_field(flight, "flightNo") == flight_no:
-                    _set_field(flight, "vehicleId", driver_id or "")
-                    _set_field(flight, "chainId", bracket_id or "")
-                    break
+        _apply_plan_assignments(assignments, base=snapshot)
+        plan_version = await _archive_plan("assign/auto", result, flights)
                     
         assigned_count = len(assignments)
         brackets_count = len(brackets)
-        print(f"DEBUG: Назначено {assigned_count} рейсов в {brackets_count} скобок")
+        logger.info("Назначено %d рейсов в %d скобок", assigned_count, brackets_count,
+                    extra={"source": "assign/auto", "plan_version": plan_version})
         
         return {
             "message": f"Планирование скобок выполнено. Создано {brackets_count} скобок", 
             "assigned_count": assigned_count,
-            "brackets_count": brackets_count
+            "brackets_count": brackets_count,
+            "planVersion": plan_version
         }
         
     except Exception as e:
-        print(f"DEBUG: Ошибка при автоназначении: {str(e)}")
-        import traceback
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        logger.exception("Ошибка при автоназначении")
         raise HTTPException(status_code=500, detail=f"Ошибка при автоназначении: {str(e)}")
 
+async def _prepare_edit_history() -> None:
+    """Пересборка назначений для новой истории правок - в пуле потоков, а не в цикле событий"""
+    if edit_history.needs_prepare():
+        await run_in_threadpool(edit_history.prepare, store.flights.snapshot())
+
+def _edit_assignments(changes: Dict[str, Dict[str, Any]]) -> int:
+    """Ручная правка назначений {id рейса: {vehicleId, chainId}} с записью в историю правок"""
+    base = store.flights.snapshot()
+    applied = store.flights.update_many(changes, expected=base)
+    edit_history.record(base, store.flights.version, changes)
+    _validate_plan()
+    return applied
+
 @router.post("/assign/reset")
 async def reset_assignments():
     """Сброс всех назначений"""
-    for flight in flights_storage:
-        _set_field(flight, "vehicleId", "")
-        _set_field(flight, "chainId", "")
+    await _prepare_edit_history()
+    _edit_assignments({
+        flight.id: {"vehicleId": "", "chainId": ""} for flight in store.flights
+    })
     return {"message": "Назначения сброшены"}
 
 @router.post("/assign/flight/{flight_id}/machine/{machine_id}")
 async def assign_flight_to_machine(flight_id: str, machine_id: str):
     """Назначить рейс на конкретную машину"""
-    flight = _find_in_storage(flights_storage, "id", flight_id)
-    if not flight:
-        raise HTTPException(status_code=404, detail="Рейс не найден")
-    
-    machine = _find_in_storage(machines_storage, "id", machine_id)
-    if not machine:
-        raise HTTPException(status_code=404, detail="Машина не найдена")
+    _get_or_404(store.flights, flight_id, "Рейс не найден")
+    machine = _get_or_404(store.machines, machine_id, "Машина не найдена")
     
     # Назначить
-    _set_field(flight, "vehicleId", machine_id)
-    _set_field(flight, "chainId", f"chain_{machine_id}_{flight_id}")
+    await _prepare_edit_history()
+    _edit_assignments({flight_id: {"vehicleId": machine_id, "chainId": f"chain_{machine_id}_{flight_id}"}})
+    flight = store.flights.get(flight_id)
     
     return {
-        "message": f"Рейс {_get_field(flight, 'flightNo')} назначен на машину {_get_field(machine, 'name')}",
+        "message": f"Рейс {flight.flightNo} назначен на машину {machine.name}",
         "flight": flight
     }
 
 @router.delete("/assign/flight/{flight_id}")
 async def unassign_flight(flight_id: str):
     """Снять назначение с рейса"""
-    flight = _find_in_storage(flights_storage, "id", flight_id)
-    if not flight:
-        raise HTTPException(status_code=404, detail="Рейс не найден")
+    _get_or_404(store.flights, flight_id, "Рейс не найден")
     
     # Снять назначение
-    _set_field(flight, "vehicleId", "")
-    _set_field(flight, "chainId", "")
+    await _prepare_edit_history()
+    _edit_assignments({flight_id: {"vehicleId": "", "chainId": ""}})
+    flight = store.flights.get(flight_id)
     
     return {
-        "message": f"Назначение с рейса {_get_field(flight, 'flightNo')} снято",
+        "message": f"Назначение с рейса {flight.flightNo} снято",
         "flight": flight
     }
 
+def _plan_assignment_batch(operations: List[AssignmentOperation]) -> Dict[str, Dict[str, Any]]:
+    """
+    Проверяет операции по индексам и сводит их в изменения {id рейса: поля}.
+    Операции применяются к рабочему состоянию по порядку, так что следующая
+    видит результат предыдущей. Ошибка в любой операции - 400, ничего не меняется.
+    """
+    state: Dict[str, Dict[str, Any]] = {}
+    errors: List[Dict[str, Any]] = []
+
+    def current(flight_id: str) -> Optional[Dict[str, Any]]:
+        if flight_id not in state:
+            flight = store.flights.get(flight_id)
+            if flight is None:
+                return None
+            state[flight_id] = {"vehicleId": flight.vehicleId, "chainId": flight.chainId}
+        return state[flight_id]
+
+    for index, operation in enumerate(operations):
+        def fail(detail: str) -> None:
+            errors.append({"index": index, "op": operation.op.value, "detail": detail})
+
+        needs_machine = operation.op != AssignmentOp.UNASSIGN
+        if needs_machine and (not operation.machineId or operation.machineId not in store.machines):
+            fail(f"Машина не найдена: {operation.machineId}")
+            continue
+
+        if operation.op == AssignmentOp.MOVE_BRACKET:
+            if not operation.chainId:
+                fail("Не указана скобка chainId")
+                continue
+            members = [k for k, fields in state.items() if fields["chainId"] == operation.chainId]
+            members += [f.id for f in store.flights.find("chainId", operation.chainId) if f.id not in state]
+            members = [k for k in members if current(k)["chainId"] == operation.chainId]
+            if not members:
+                fail(f"Скобка не найдена: {operation.chainId}")
+                continue
+            for flight_id in members:
+                state[flight_id]["vehicleId"] = operation.machineId
+            continue
+
+        fields = current(operation.flightId) if operation.flightId else None
+        if fields is None:
+            fail(f"Рейс не найден: {operation.flightId}")
+            continue
+        if operation.op == AssignmentOp.ASSIGN:
+            fields["vehicleId"] = operation.machineId
+            fields["chainId"] = operation.chainId or f"chain_{operation.machineId}_{operation.flightId}"
+        elif operation.op == AssignmentOp.MOVE:
+            if not fields["vehicleId"]:
+                fail(f"Рейс {operation.flightId} не назначен, переносить нечего")
+                continue
+            fields["vehicleId"] = operation.machineId
+            if operation.chainId:
+                fields["chainId"] = operation.chainId
+        else:
+            fields["vehicleId"] = ""
+            fields["chainId"] = ""
+
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Пакет не применен", "errors": errors})
+
+    # В изменения попадают только рейсы, состояние которых действительно поменялось
+    return {
+        flight_id: fields
+        for flight_id, fields in state.items()
+        if (store.flights.get(flight_id).vehicleId, store.flights.get(flight_id).chainId)
+        != (fields["vehicleId"], fields["chainId"])
+    }
+
+@router.post("/assign/batch", response_model=AssignmentBatchResult)
+async def assign_batch(batch: AssignmentBatch):
+    """
+    Пакет операций назначения (assign, unassign, move, move_bracket) для
+    перетаскивания нескольких рейсов: проверяется целиком и применяется
+    атомарно с одним увеличением версии.
+    """
+    changes = _plan_assignment_batch(batch.operations)
+    await _prepare_edit_history()
+    _edit_assignments(changes)
+    return AssignmentBatchResult(
+        version=store.flights.version,
+        applied=len(batch.operations),
+        flights=[FlightAssignment(id=flight_id, **fields) for flight_id, fields in changes.items()],
+    )
+
+@router.get("/history")
+async def get_edit_history():
+    """Сколько ручных правок назначений можно отменить и повторить"""
+    return edit_history.status(store.flights.version)
+
+@router.post("/history/undo", response_model=AssignmentBatchResult)
+async def undo_edit(steps: int = Query(1, ge=1)):
+    """Отменить последние ручные правки назначений (steps - сколько)"""
+    return _move_edit_history(-steps)
+
+@router.post("/history/redo", response_model=AssignmentBatchResult)
+async def redo_edit(steps: int = Query(1, ge=1)):
+    """Повторить отмененные ручные правки назначений"""
+    return _move_edit_history(steps)
+
+def _move_edit_history(steps: int) -> AssignmentBatchResult:
+    try:
+        target, changes = edit_history.plan_move(steps, store.flights.version)
+    except EditHistoryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    store.flights.update_many(changes)
+    edit_history.moved(target, store.flights.version)
+    _validate_plan()
+    return AssignmentBatchResult(
+        version=store.flights.version,
+        applied=abs(steps),
+        flights=[FlightAssignment(id=flight_id, **fields) for flight_id, fields in changes.items()],
+    )
+
 @router.put("/flights/{flight_id}")
 async def update_flight(flight_id: str, flight: Flight):
-    """Обновить рейс"""
-    for i, f in enumerate(flights_storage):
-        if _get_field(f, "id") == flight_id:
-            flights_storage[i] = flight
-            return flight
-    raise HTTPException(status_code=404, detail="Рейс не найден")
+    """Обновить рейс (смена id - удаление прежнего ключа в той же версии)"""
+    base = store.flights.snapshot()
+    if base.get(flight_id) is None:
+        raise HTTPException(status_code=404, detail="Рейс не найден")
+    removes = [flight_id] if flight.id != flight_id else []
+    if store.flights.apply([flight], removes, expected=base) is None:
+        raise HTTPException(status_code=409, detail="Рейсы изменены во время обновления, повторите запрос")
+    return flight
 
 @router.put("/machines/{machine_id}/driver")
 async def update_machine_driver(machine_id: str, driver_data: Dict[str, Any]):
     """Обновить водителя машины"""
-    machine = _find_in_storage(machines_storage, "id", machine_id)
-    if not machine:
-        raise HTTPException(status_code=404, detail="Машина не найдена")
+    _get_or_404(store.machines, machine_id, "Машина не найдена")
     
     # Обновить водителя
-    _set_field(machine, "driver", driver_data.get("driver", ""))
+    machine = store.machines.update(machine_id, driver=driver_data.get("driver", ""))
     
     return {
-        "message": f"Водитель машины {_get_field(machine, 'name')} обновлен",
+        "message": f"Водитель машины {machine.name} обновлен",
         "machine": machine
     }
 
 @router.delete("/flights/{flight_id}")
 async def delete_flight(flight_id: str):
     """Удалить рейс"""
-    for i, f in enumerate(flights_storage):
-        if _get_field(f, "id") == flight_id:
-            del flights_storage[i]
-            return {"message": "Рейс удален"}
-    raise HTTPException(status_code=404, detail="Рейс не найден")
+    if store.flights.remove(flight_id) is None:
+        raise HTTPException(status_code=404, detail="Рейс не найден")
+    return {"message": "Рейс удален"}
 
 # Новые эндпоинты для работы с автолифтами (временно недоступны)
 
@@ -418,47 +1078,44 @@ async def delete_autolift(autolift_id: str):
 # Планировщик скобок (временно недоступен)
 
 @router.post("/brackets/create-schedule")
+@planning_requests.coalesce("brackets/create-schedule", lambda: (store.version,))
 async def create_bracket_schedule():
     """Создать расписание скобок для всех рейсов"""
-    if not flights_storage:
+    if not store.flights:
         raise HTTPException(status_code=400, detail="Нет рейсов для планирования")
     
-    if not machines_storage:
+    if not store.machines:
         raise HTTPException(status_code=400, detail="Нет автолифтов для планирования")
     
     try:
-        print(f"🔴 DEBUG: Starting bracket scheduling for {len(flights_storage)} flights")
-        print(f"🔴 DEBUG: Flights in storage: {[f.flightNo for f in flights_storage[:5]]}...")  # первые 5
+        # Снимок рейсов: импорт или правки во время планирования его не меняют
+        snapshot = store.flights.snapshot()
+        flights = snapshot.all()
+        logger.debug("Планирование скобок для %d рейсов", len(flights))
         # Создаем планировщик и планируем все рейсы
-        scheduler = BracketScheduler(flights_storage, machines_storage, drivers_storage)
-        print(f"🔴 DEBUG: BracketScheduler created, calling plan_brackets...")
-        result = scheduler.plan_brackets()  # Убираем параметры!
-        print(f"🔴 DEBUG: plan_brackets completed")
+        scheduler = BracketScheduler(flights, store.machines.all(), store.drivers.all())
+        result = await _run_planner("brackets/create-schedule", scheduler, len(flights), _plan_key(snapshot))
         
         # Получаем результаты планирования
         assignments = result.get('assignments', [])
         brackets = result.get('brackets', [])
         unassigned = result.get('unassigned', [])
         
-        print(f"🔴 DEBUG: Created {len(brackets)} brackets, {len(assignments)} assignments, {len(unassigned)} unassigned")
+        logger.info(
+            "Создано скобок %d, назначено рейсов %d, не назначено %d",
+            len(brackets), len(assignments), len(unassigned),
+            extra={"source": "brackets/create-schedule"},
+        )
         
-        # Обновляем рейсы в storage с назначениями
-        for assignment in assignments:
-            flight_no = assignment.get('flightNo')
-            if not flight_no:
-                continue
-            for flight in flights_storage:
-                if _get_field(flight, 'flightNo') == flight_no:
-                    # Используем driverId как vehicleId для совместимости
-                    _set_field(flight, 'vehicleId', assignment.get('driverId', ''))
-                    # Используем bracketId как chainId для группировки в frontend
-                    _set_field(flight, 'chainId', assignment.get('bracketId', ''))
-                    
-        print(f"🔴 DEBUG: Updated flight assignments in storage")
+        # Обновляем рейсы в storage с назначениями:
+        # driverId -> vehicleId для совместимости, bracketId -> chainId для группировки в frontend
+        _apply_plan_assignments(assignments, base=snapshot)
+
+        plan_version = await _archive_plan("brackets/create-schedule", result, flights)
         
         # Подсчитываем статистику
         assigned_count = len(assignments)
-        total_count = len(flights_storage)
+        total_count = len(flights)
         
         return {
             "status": "success",
@@ -471,67 +1128,61 @@ async def create_bracket_schedule():
             },
             "brackets": brackets,
             "assignments": assignments,
-            "unassigned": unassigned
+            "unassigned": unassigned,
+            "planVersion": plan_version
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка планирования: {str(e)}")
 
 @router.post("/brackets/plan-for-flights")
+@planning_requests.coalesce(
+    "brackets/plan-for-flights", lambda flight_ids: (store.version, frozenset(flight_ids))
+)
 async def plan_brackets_for_flights(flight_ids: List[str]):
     """Создать расписание скобок для указанных рейсов"""
     if not flight_ids:
         raise HTTPException(status_code=400, detail="Не указаны ID рейсов")
-    
-    # Находим рейсы по ID
-    selected_ids = set(flight_ids)
-    selected_flights = [f for f in flights_storage if _get_field(f, "id") in selected_ids]
+    return await _plan_selected("brackets/plan-for-flights", flight_ids)
+
+
+async def _plan_selected(source: str, flight_ids: List[str]) -> Dict[str, Any]:
+    """Планирование скобок только для указанных рейсов (их прежние назначения снимаются)"""
+    # Находим рейсы по ID в снимке, с которым будет работать планировщик
+    snapshot = store.flights.snapshot()
+    selected_flights = [
+        flight for flight in (snapshot.get(flight_id) for flight_id in dict.fromkeys(flight_ids))
+        if flight is not None
+    ]
+    selected_ids = {flight.id for flight in selected_flights}
     
     if not selected_flights:
         raise HTTPException(status_code=404, detail="Рейсы не найдены")
     
-    if not machines_storage:
+    if not store.machines:
         raise HTTPException(status_code=400, detail="Нет автолифтов для планирования")
     
     try:
         # Создаем планировщик только для выбранных рейсов
-        scheduler = BracketScheduler(selected_flights, machines_storage)
-        result = scheduler.plan_brackets()  # Убираем параметры!
+        scheduler = BracketScheduler(selected_flights, store.machines.all())
+        result = await _run_planner(source, scheduler, len(selected_flights))
 
         assignments = result.get("assignments", [])
         brackets = result.get("brackets", [])
         unassigned = result.get("unassigned", [])
 
-        # Сбрасываем старые назначения только для выбранных рейсов
-        for flight in flights_storage:
-            if _get_field(flight, "id") in selected_ids:
-                _set_field(flight, "vehicleId", "")
-                _set_field(flight, "chainId", "")
+        # Сброс старых назначений выбранных рейсов и новые назначения - одним пакетом
+        _apply_plan_assignments(assignments, scope_ids=selected_ids, base=snapshot, reset_ids=selected_ids)
+        plan_version = await _archive_plan(source, result, selected_flights)
 
-        # Применяем новые назначения
-        for assignment in assignments:
-            flight_no = assignment.get("flightNo")
-            if not flight_no:
-                continue
-            for flight in flights_storage:
-                if (
-                    _get_field(flight, "flightNo") == flight_no
-                    and _get_field(flight, "id") in selected_ids
-                ):
-                    _set_field(flight, "vehicleId", assignment.get("driverId", ""))
-                    _set_field(flight, "chainId", assignment.get("bracketId", ""))
-                    break
-
-        planned_flights = [f for f in flights_storage if _get_field(f, "id") in selected_ids]
+        planned_flights = [
+            flight for flight in (store.flights.get(f.id) for f in selected_flights) if flight is not None
+        ]
 
         # Подсчитываем статистику
-        assigned_count = sum(1 for f in planned_flights if _get_field(f, "vehicleId"))
+        assigned_count = sum(1 for f in planned_flights if f.vehicleId)
         total_count = len(planned_flights)
-        unique_chains = {
-            _get_field(f, "chainId")
-            for f in planned_flights
-            if _get_field(f, "chainId")
-        }
+        unique_chains = {f.chainId for f in planned_flights if f.chainId}
 
         return {
             "status": "success",
@@ -545,7 +1196,8 @@ async def plan_brackets_for_flights(flight_ids: List[str]):
             "brackets": brackets,
             "assignments": assignments,
             "unassigned": unassigned,
-            "flights": planned_flights
+            "flights": planned_flights,
+            "planVersion": plan_version
         }
         
     except Exception as e:
@@ -579,44 +1231,36 @@ async def validate_bracket_combination(request_data: Dict[str, Any]):
 # === ВОДИТЕЛИ И АВТОЛИФТЫ ===
 
 @router.get("/drivers", response_model=List[Driver])
-async def get_drivers():
+async def get_drivers(request: Request):
     """Получить всех водителей"""
-    return drivers_storage
+    return response_cache.respond(request, store.drivers, Driver)
 
 @router.post("/drivers", response_model=List[Driver])
 async def add_drivers(drivers: List[Driver]):
     """Добавить водителей"""
-    drivers_storage.extend(drivers)
-    return drivers_storage
+    store.drivers.add_many(drivers)
+    return response_cache.send(store.drivers, Driver)
 
 @router.get("/drivers/with-shifts")
 async def get_drivers_with_shifts():
     """Получить водителей с назначенными сменами"""
     drivers_with_shifts = []
     
-    # Создаем словарь назначений по водителям
-    assignments_by_driver: Dict[str, Any] = {}
-    for assignment in shift_assignments_storage:
-        driver_id = _get_field(assignment, "driver_id") or _get_field(assignment, "driverId")
-        if driver_id:
-            assignments_by_driver[driver_id] = assignment
-    
-    for driver in drivers_storage:
+    for driver in store.drivers:
         driver_data = {
-            "id": _get_field(driver, "id"),
-            "full_name": _get_field(driver, "full_name"),
+            "id": driver.id,
+            "full_name": driver.full_name,
             "shift_start": None,
             "shift_end": None,
             "brackets_count": 0
         }
         
-        driver_id = _get_field(driver, "id")
-        assignment = assignments_by_driver.get(driver_id) if driver_id else None
+        # Назначения смен индексированы по ID водителя
+        assignment = store.shift_assignments.get(driver.id)
         if assignment:
-            driver_data["shift_start"] = _get_field(assignment, "shift_start")
-            driver_data["shift_end"] = _get_field(assignment, "shift_end")
-            bracket_ids = _get_field(assignment, "bracket_ids", []) or []
-            driver_data["brackets_count"] = len(bracket_ids)
+            driver_data["shift_start"] = assignment.shift_start
+            driver_data["shift_end"] = assignment.shift_end
+            driver_data["brackets_count"] = len(assignment.bracket_ids or [])
         
         drivers_with_shifts.append(driver_data)
     
@@ -625,78 +1269,64 @@ async def get_drivers_with_shifts():
 @router.get("/drivers/{driver_id}", response_model=Driver)
 async def get_driver(driver_id: str):
     """Получить водителя по ID"""
-    driver = _find_in_storage(drivers_storage, "id", driver_id)
-    if not driver:
-        raise HTTPException(status_code=404, detail=f"Водитель {driver_id} не найден")
-    return driver
+    return _get_or_404(store.drivers, driver_id, f"Водитель {driver_id} не найден")
 
 @router.put("/drivers/{driver_id}", response_model=Driver)
 async def update_driver(driver_id: str, driver_data: Driver):
     """Обновить данные водителя"""
-    driver = _find_in_storage(drivers_storage, "id", driver_id)
-    if not driver:
-        raise HTTPException(status_code=404, detail=f"Водитель {driver_id} не найден")
+    _get_or_404(store.drivers, driver_id, f"Водитель {driver_id} не найден")
     
     # Обновляем данные
-    _set_field(driver, "full_name", driver_data.full_name)
-    _set_field(driver, "shift_start", driver_data.shift_start)
-    _set_field(driver, "shift_end", driver_data.shift_end)
-    _set_field(driver, "assigned_autolift", driver_data.assigned_autolift)
-    
-    return driver
+    return store.drivers.update(
+        driver_id,
+        full_name=driver_data.full_name,
+        shift_start=driver_data.shift_start,
+        shift_end=driver_data.shift_end,
+        assigned_autolift=driver_data.assigned_autolift,
+    )
 
 @router.get("/autolifts", response_model=List[Autolift])
-async def get_autolifts():
+async def get_autolifts(request: Request):
     """Получить все автолифты"""
-    return autolifts_storage
+    return response_cache.respond(request, store.autolifts, Autolift)
 
 @router.post("/autolifts", response_model=List[Autolift])
 async def add_autolifts(autolifts: List[Autolift]):
     """Добавить автолифты"""
-    autolifts_storage.extend(autolifts)
-    return autolifts_storage
+    store.autolifts.add_many(autolifts)
+    return response_cache.send(store.autolifts, Autolift)
 
 @router.get("/autolifts/{autolift_id}", response_model=Autolift)
 async def get_autolift(autolift_id: str):
     """Получить автолифт по ID"""
-    autolift = _find_in_storage(autolifts_storage, "id", autolift_id)
-    if not autolift:
-        raise HTTPException(status_code=404, detail=f"Автолифт {autolift_id} не найден")
-    return autolift
+    return _get_or_404(store.autolifts, autolift_id, f"Автолифт {autolift_id} не найден")
 
 @router.post("/assign-autolift/{driver_id}/{autolift_id}")
 async def assign_autolift_to_driver(driver_id: str, autolift_id: str):
     """Назначить автолифт водителю"""
-    driver = _find_in_storage(drivers_storage, "id", driver_id)
-    if not driver:
-        raise HTTPException(status_code=404, detail=f"Водитель {driver_id} не найден")
-    
-    autolift = _find_in_storage(autolifts_storage, "id", autolift_id)
-    if not autolift:
-        raise HTTPException(status_code=404, detail=f"Автолифт {autolift_id} не найден")
+    driver = _get_or_404(store.drivers, driver_id, f"Водитель {driver_id} не найден")
+    autolift = _get_or_404(store.autolifts, autolift_id, f"Автолифт {autolift_id} не найден")
     
     # Проверяем, не назначен ли автолифт другому водителю
-    assigned_driver = _get_field(autolift, "assigned_driver")
+    assigned_driver = autolift.assigned_driver
     if assigned_driver and assigned_driver != driver_id:
         raise HTTPException(
             status_code=400,
-            detail=f"Автолифт {_get_field(autolift, 'number')} уже назначен водителю {assigned_driver}"
+            detail=f"Автолифт {autolift.number} уже назначен водителю {assigned_driver}"
         )
     
     # Если у водителя уже есть автолифт, освобождаем его
-    current_autolift = _get_field(driver, "assigned_autolift")
+    current_autolift = driver.assigned_autolift
     if current_autolift:
-        old_autolift = _find_in_storage(autolifts_storage, "id", current_autolift)
-        if old_autolift:
-            _set_field(old_autolift, "assigned_driver", None)
+        store.autolifts.update(current_autolift, assigned_driver=None)
     
     # Назначаем
-    _set_field(driver, "assigned_autolift", autolift_id)
-    _set_field(autolift, "assigned_driver", driver_id)
+    driver = store.drivers.update(driver_id, assigned_autolift=autolift_id)
+    autolift = store.autolifts.update(autolift_id, assigned_driver=driver_id)
     
     return {
         "message": (
-            f"Автолифт №{_get_field(autolift, 'number')} назначен водителю {_get_field(driver, 'full_name')}"
+            f"Автолифт №{autolift.number} назначен водителю {driver.full_name}"
         ),
         "driver": driver,
         "autolift": autolift
@@ -705,26 +1335,21 @@ async def assign_autolift_to_driver(driver_id: str, autolift_id: str):
 @router.delete("/assign-autolift/{driver_id}")
 async def unassign_autolift_from_driver(driver_id: str):
     """Снять назначение автолифта с водителя"""
-    driver = _find_in_storage(drivers_storage, "id", driver_id)
-    if not driver:
-        raise HTTPException(status_code=404, detail=f"Водитель {driver_id} не найден")
+    driver = _get_or_404(store.drivers, driver_id, f"Водитель {driver_id} не найден")
     
-    current_autolift = _get_field(driver, "assigned_autolift")
+    current_autolift = driver.assigned_autolift
     if not current_autolift:
         raise HTTPException(
             status_code=400,
-            detail=f"У водителя {_get_field(driver, 'full_name')} нет назначенного автолифта"
+            detail=f"У водителя {driver.full_name} нет назначенного автолифта"
         )
     
     # Освобождаем автолифт
-    autolift = _find_in_storage(autolifts_storage, "id", current_autolift)
-    if autolift:
-        _set_field(autolift, "assigned_driver", None)
-    
-    _set_field(driver, "assigned_autolift", None)
+    store.autolifts.update(current_autolift, assigned_driver=None)
+    driver = store.drivers.update(driver_id, assigned_autolift=None)
     
     return {
-        "message": f"Назначение автолифта снято с водителя {_get_field(driver, 'full_name')}",
+        "message": f"Назначение автолифта снято с водителя {driver.full_name}",
         "driver": driver
     }
 
@@ -733,142 +1358,170 @@ async def auto_assign_autolifts():
     """Автоматическое назначение автолифтов водителям"""
     assigned_count = 0
     
-    # Сброс существующих назначений
-    for driver in drivers_storage:
-        _set_field(driver, "assigned_autolift", None)
-    for autolift in autolifts_storage:
-        _set_field(autolift, "assigned_driver", None)
-    
-    # Получаем доступные автолифты и водителей
-    available_autolifts = [a for a in autolifts_storage if not _get_field(a, "assigned_driver")]
-    available_drivers = [d for d in drivers_storage if not _get_field(d, "assigned_autolift")]
+    # После сброса существующих назначений все водители и автолифты свободны
+    drivers = store.drivers.all()
+    autolifts = store.autolifts.all()
+    driver_changes: Dict[str, Dict[str, Any]] = {d.id: {"assigned_autolift": None} for d in drivers}
+    autolift_changes: Dict[str, Dict[str, Any]] = {a.id: {"assigned_driver": None} for a in autolifts}
     
     # Простое назначение: первому водителю - первый автолифт
-    for i, driver in enumerate(available_drivers):
-        if i < len(available_autolifts):
-            autolift = available_autolifts[i]
-            _set_field(driver, "assigned_autolift", _get_field(autolift, "id"))
-            _set_field(autolift, "assigned_driver", _get_field(driver, "id"))
-            assigned_count += 1
+    for driver, autolift in zip(drivers, autolifts):
+        driver_changes[driver.id]["assigned_autolift"] = autolift.id
+        autolift_changes[autolift.id]["assigned_driver"] = driver.id
+        assigned_count += 1
+    
+    store.drivers.update_many(driver_changes)
+    store.autolifts.update_many(autolift_changes)
     
     return {
         "message": f"Автоназначение автолифтов выполнено",
         "assigned_count": assigned_count,
-        "total_drivers": len(drivers_storage),
-        "total_autolifts": len(autolifts_storage)
+        "total_drivers": len(store.drivers),
+        "total_autolifts": len(store.autolifts)
     }
 
 # ============ НОВЫЕ МАРШРУТЫ ДЛЯ СМЕН ============
 
 @router.get("/shifts", response_model=List[Shift])
-async def get_shifts():
+async def get_shifts(request: Request):
     """Получить все доступные смены"""
-    return shifts_storage
+    return response_cache.respond(request, store.shifts, Shift)
 
 @router.post("/shifts/upload")
-async def upload_shifts(file: UploadFile = File(...)):
+async def upload_shifts(response: Response, file: UploadFile = File(...)):
     """Загрузить смены из CSV файла"""
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Файл должен быть в формате CSV")
-    
-    try:
-        # Читаем содержимое файла
-        contents = await file.read()
-        temp_file_path = f"/tmp/{file.filename}"
-        
-        # Сохраняем во временный файл
-        with open(temp_file_path, "wb") as f:
-            f.write(contents)
-        
-        # Парсим смены
-        shifts = ShiftsCSVParser.parse_shifts_file(temp_file_path)
-        
-        # Очищаем старые смены и сохраняем новые
-        shifts_storage.clear()
-        shifts_storage.extend(shifts)
-        
-        return {
-            "message": f"Загружено {len(shifts)} смен",
-            "shifts_count": len(shifts)
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при обработке файла: {str(e)}")
+    shifts = await _ingest_upload("shifts", file, response, shift_row_mapper, Shift)
+    report = import_reports["shifts"]
+    ShiftsCSVParser.log_errors(report)
+
+    # Очищаем старые смены и сохраняем новые
+    store.shifts.replace_all(shifts)
+
+    return {
+        "message": f"Загружено {len(shifts)} смен",
+        "shifts_count": len(shifts),
+        "errors_count": report.error_count,
+        "errors": report.to_dict()["errors"],
+    }
 
 @router.get("/shift-assignments", response_model=List[ShiftAssignment])
 async def get_shift_assignments():
     """Получить назначения смен водителям"""
-    return shift_assignments_storage
+    return store.shift_assignments.all()
 
 @router.post("/shift-assignments/auto-assign")
+@planning_requests.coalesce("shift-assignments/auto-assign", lambda: (store.version,))
 async def auto_assign_shifts():
     """
     Автоматически назначить смены водителям на основе их брекетов.
     Требует наличия созданных брекетов.
     """
-    print("DEBUG: Начинаем автоназначение смен")
-    
-    if not shifts_storage:
-        print("DEBUG: Нет доступных смен в shifts_storage")
+    if not store.shifts:
         raise HTTPException(status_code=400, detail="Сначала загрузите доступные смены")
     
-    print(f"DEBUG: Найдено {len(shifts_storage)} смен")
-    print(f"DEBUG: Найдено {len(flights_storage)} рейсов")
-    print(f"DEBUG: Найдено {len(drivers_storage)} водителей")
+    logger.debug(
+        "Автоназначение смен: смен %d, рейсов %d, водителей %d",
+        len(store.shifts), len(store.flights), len(store.drivers),
+    )
     
     try:
         # Создаем планировщик брекетов для получения актуальных брекетов
-        print("DEBUG: Создаем планировщик брекетов")
-        scheduler = BracketScheduler(flights_storage, machines_storage, drivers_storage)
-        
-        print("DEBUG: Запускаем планирование брекетов")
-        planning_result = scheduler.plan_brackets()
-        
-        print(f"DEBUG: Результат планирования: {len(planning_result.get('brackets', []))} брекетов")
+        drivers = store.drivers.all()
+        snapshot = store.flights.snapshot()
+        flights = snapshot.all()
+        scheduler = BracketScheduler(flights, store.machines.all(), drivers)
+        planning_result = await _run_planner(
+            "shift-assignments/auto-assign", scheduler, len(flights), _plan_key(snapshot)
+        )
         
         if not planning_result.get("brackets"):
-            print("DEBUG: Нет созданных брекетов")
             raise HTTPException(status_code=400, detail="Нет созданных брекетов для назначения смен")
         
         # Создаем сервис назначения смен
-        print("DEBUG: Создаем сервис назначения смен")
-        shift_service = ShiftAssignmentService(shifts_storage)
+        shift_service = ShiftAssignmentService(store.shifts.all())
         
         # Назначаем смены
-        print("DEBUG: Назначаем смены водителям")
-        assignments = shift_service.assign_shifts_to_drivers(
-            planning_result["brackets"], 
-            drivers_storage
-        )
+        with tracer.span("shifts.assign", brackets=len(planning_result["brackets"]), drivers=len(drivers)):
+            assignments = shift_service.assign_shifts_to_drivers(
+                planning_result["brackets"], 
+                drivers
+            )
         
-        print(f"DEBUG: Создано {len(assignments)} назначений смен")
+        logger.info("Создано %d назначений смен", len(assignments))
         
         # Очищаем старые назначения и сохраняем новые
-        shift_assignments_storage.clear()
-        shift_assignments_storage.extend(assignments)
+        with tracer.span("storage.apply", collection="shift_assignments", changes=len(assignments)):
+            store.shift_assignments.replace_all(assignments)
+        plan_version = await _archive_plan(
+            "shift-assignments/auto-assign", planning_result, flights, assignments
+        )
         
         return {
             "message": f"Назначено смен: {len(assignments)}",
+            "planVersion": plan_version,
             "assignments": [
                 {
-                    "driver_id": _get_field(a, "driver_id"),
-                    "shift_start": _get_field(a, "shift_start"),
-                    "shift_end": _get_field(a, "shift_end"),
-                    "brackets_count": len(_get_field(a, "bracket_ids", []) or [])
+                    "driver_id": a.driver_id,
+                    "shift_start": a.shift_start,
+                    "shift_end": a.shift_end,
+                    "brackets_count": len(a.bracket_ids or [])
                 }
                 for a in assignments
             ]
         }
         
     except Exception as e:
-        print(f"DEBUG: Ошибка при назначении смен: {str(e)}")
-        print(f"DEBUG: Тип ошибки: {type(e).__name__}")
-        import traceback
-        print(f"DEBUG: Traceback: {traceback.format_exc()}")
+        logger.exception("Ошибка при назначении смен")
         raise HTTPException(status_code=500, detail=f"Ошибка при назначении смен: {str(e)}")
 
 @router.delete("/shift-assignments")
 async def clear_shift_assignments():
     """Очистить все назначения смен"""
-    shift_assignments_storage.clear()
+    store.shift_assignments.clear()
     return {"message": "Назначения смен очищены"}
+
+# ============ АРХИВ ПЛАНОВ ============
+
+@router.get("/plans")
+async def list_plans(limit: int = Query(50, ge=1, le=MAX_PLANS_PAGE)):
+    """Получить последние версии планов из архива"""
+    return await run_in_threadpool(_require_archive().list_plans, limit)
+
+@router.get("/plans/diff")
+async def diff_plan_versions(from_version: int = Query(..., alias="from"), to_version: int = Query(..., alias="to")):
+    """
+    Что изменилось между версиями плана: добавленные и удаленные скобки,
+    скобки со сменой водителя или времени, перешедшие рейсы
+    """
+    plans = _require_archive()
+    brackets = {}
+    for version in (from_version, to_version):
+        brackets[version] = await run_in_threadpool(plans.load_plan_brackets, version)
+        if brackets[version] is None:
+            raise HTTPException(status_code=404, detail=f"План версии {version} не найден")
+    with tracer.span("plans.diff", brackets=len(brackets[from_version]) + len(brackets[to_version])):
+        diff = diff_plans(brackets[from_version], brackets[to_version])
+    return {"from": from_version, "to": to_version, **diff}
+
+@router.get("/plans/validate", response_model=PlanValidation)
+async def validate_current_plan():
+    """Проверка текущего плана: двойные назначения водителей, длительность работы, отъезд от ВС, окна погрузки"""
+    return _validate_plan()
+
+@router.get("/plans/{plan_version}")
+async def get_plan(plan_version: int):
+    """Получить версию плана со скобками, рейсами и назначениями смен"""
+    plan = await run_in_threadpool(_require_archive().get_plan, plan_version)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"План версии {plan_version} не найден")
+    return plan
+
+@router.get("/archive/flights/count")
+async def count_archived_flights(
+    flightDate: str,
+    acType: Optional[str] = None,
+    assigned: Optional[bool] = None,
+    planVersion: Optional[int] = None,
+):
+    """Посчитать рейсы даты в версии плана (например, неназначенные SU9 за дату)"""
+    return await run_in_threadpool(_require_archive().count_flights, flightDate, acType, assigned, planVersion)
@@ -0,0 +1,49 @@
+"""
+Настройки приложения из переменных окружения
+"""
+import os
+
+# Корень репозитория (каталог с backend/ и CSV-файлами)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Каталог со справочными CSV (drivers.csv, autolifts.csv, shifts.csv)
+DATA_DIR = os.environ.get("AEROMAR_DATA_DIR", BASE_DIR)
+# Загружать справочники фоновой задачей при старте (иначе - при первом запросе)
+PRELOAD_REFERENCE_DATA = os.environ.get("AEROMAR_PRELOAD", "1") != "0"
+# Папка приема CSV с расписанием рейсов и период опроса каталога данных (0 - выключено)
+DROP_DIR = os.environ.get("AEROMAR_DROP_DIR", os.path.join(DATA_DIR, "incoming"))
+WATCH_INTERVAL = float(os.environ.get("AEROMAR_WATCH_INTERVAL", "2"))
+# Схема перрона (CSV FROM;TO;MINUTES) и каталог кеша матрицы времен переезда между стоянками
+APRON_FILE = os.environ.get("AEROMAR_APRON_FILE", os.path.join(DATA_DIR, "apron.csv"))
+APRON_CACHE_DIR = os.environ.get("AEROMAR_APRON_CACHE_DIR", os.path.join(BASE_DIR, "data", "apron"))
+
+# Планировать новое расписание в фоне сразу после импорта рейсов (первый запрос плана берет готовый)
+PLAN_WARMUP = os.environ.get("AEROMAR_PLAN_WARMUP", "1") != "0"
+
+# Сколько последних ручных правок назначений можно отменить (POST /history/undo)
+EDIT_HISTORY_LIMIT = int(os.environ.get("AEROMAR_EDIT_HISTORY", "50"))
+
+# Постоянное хранилище (SQLite)
+PERSISTENCE_ENABLED = os.environ.get("AEROMAR_PERSISTENCE", "1") != "0"
+DB_PATH = os.environ.get("AEROMAR_DB_PATH", os.path.join(BASE_DIR, "data", "aeromar.db"))
+DB_POOL_SIZE = int(os.environ.get("AEROMAR_DB_POOL_SIZE", "5"))
+
+# Несколько воркеров uvicorn с общим состоянием в SQLite (требует постоянного хранилища):
+# изменения других воркеров подхватываются не позже чем через интервал сверки (секунды)
+SHARED_STATE = os.environ.get("AEROMAR_SHARED_STATE", "0") == "1"
+SHARED_SYNC_INTERVAL = float(os.environ.get("AEROMAR_SHARED_SYNC_INTERVAL", "0.5"))
+
+# Логирование: уровень, формат (json | text), уровни модулей
+# ("services.bracket_scheduler=DEBUG,api.routes=WARNING") и предел однотипных
+# сообщений ниже WARNING в секунду (0 - без ограничения)
+LOG_LEVEL = os.environ.get("AEROMAR_LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("AEROMAR_LOG_FORMAT", "json")
+LOG_LEVELS = os.environ.get("AEROMAR_LOG_LEVELS", "")
+LOG_RATE = float(os.environ.get("AEROMAR_LOG_RATE", "20"))
+
+# Трассировка запросов: интервалы пишутся JSON-строками в файл с ротацией
+# (пустой путь - только буфер в памяти для GET /traces)
+TRACING_ENABLED = os.environ.get("AEROMAR_TRACING", "1") != "0"
+TRACE_FILE = os.environ.get("AEROMAR_TRACE_FILE", os.path.join(BASE_DIR, "data", "traces", "spans.jsonl"))
+TRACE_MAX_BYTES = int(os.environ.get("AEROMAR_TRACE_MAX_BYTES", str(10_000_000)))
+TRACE_BACKUPS = int(os.environ.get("AEROMAR_TRACE_BACKUPS", "5"))
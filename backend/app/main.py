@@ -1,8 +1,40 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .api.routes import router
+from fastapi.responses import JSONResponse
+from .api.routes import (
+    data_watcher, health_router, plan_warmup, reference_data, router, shared_state, shutdown_storage,
+)
+from .config import (
+    LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_RATE, PERSISTENCE_ENABLED, PRELOAD_REFERENCE_DATA, SHARED_STATE,
+    TRACE_BACKUPS, TRACE_FILE, TRACE_MAX_BYTES, TRACING_ENABLED, WATCH_INTERVAL,
+)
+from .services.metrics import MetricsMiddleware
+from .services.tracing import TracingMiddleware, tracer
+from .utils.log import configure_logging
+
+logger = configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_LEVELS, LOG_RATE)
+
 
-app = FastAPI(title="Aeromar Flight Planner")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Справочники грузятся в фоне: сервер начинает принимать запросы сразу,
+    # маршруты API дожидаются загрузки, /ready сообщает о ее ходе
+    if PRELOAD_REFERENCE_DATA:
+        reference_data.start()
+    # Опрос каталога данных: измененные справочники и новые файлы рейсов
+    if WATCH_INTERVAL > 0:
+        data_watcher.start()
+    tracer.configure(TRACING_ENABLED, TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS)
+    yield
+    await data_watcher.stop()
+    plan_warmup.shutdown()
+    # Дописываем отложенные изменения в SQLite перед остановкой
+    shutdown_storage()
+    tracer.shutdown()
+
+
+app = FastAPI(title="Aeromar Flight Planner", lifespan=lifespan)
 
 # Настройка CORS - разрешаем доступ с любых локальных IP
 app.add_middleware(
@@ -17,6 +49,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Задержка, размер ответа и число запросов в обработке по маршрутам (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+# Корневой интервал трассы запроса и заголовок X-Trace-Id (GET /traces)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+if SHARED_STATE:
+    if not PERSISTENCE_ENABLED:
+        logger.warning("AEROMAR_SHARED_STATE требует постоянного хранилища (AEROMAR_PERSISTENCE=1) - общий режим выключен")
+    else:
+        @app.middleware("http")
+        async def flush_shared_writes(request: Request, call_next):
+            # Ответ на запись уходит после записи в базу: другой воркер сразу видит изменения
+            response = await call_next(request)
+            if request.method not in ("GET", "HEAD", "OPTIONS"):
+                conflicts = await shared_state.flush()
+                if conflicts:
+                    # Другой воркер записал раньше: изменение отброшено, данные перечитаны
+                    return JSONResponse(
+                        status_code=409,
+                        content={"detail": f"Данные изменены другим процессом ({', '.join(conflicts)}), повторите запрос"},
+                    )
+            return response
+
+app.include_router(health_router)
 app.include_router(router)
 
 # Для запуска: uvicorn app.main:app --reload
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+
+
+class ApronEdge(BaseModel):
+    """Участок схемы перрона: время проезда между двумя точками (стоянки, рулежки, кухня)"""
+    source: str
+    target: str
+    minutes: float = Field(ge=0)
@@ -0,0 +1,31 @@
+from enum import Enum
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class AssignmentOp(str, Enum):
+    ASSIGN = "assign"              # рейс на машину (новая скобка, если chainId не задан)
+    UNASSIGN = "unassign"          # снять назначение с рейса
+    MOVE = "move"                  # назначенный рейс на другую машину (скобка сохраняется)
+    MOVE_BRACKET = "move_bracket"  # все рейсы скобки chainId на машину machineId
+
+class AssignmentOperation(BaseModel):
+    """Одна операция пакетного назначения"""
+    op: AssignmentOp
+    flightId: Optional[str] = None
+    machineId: Optional[str] = None
+    chainId: Optional[str] = None
+
+class AssignmentBatch(BaseModel):
+    """Пакет операций, применяемый атомарно"""
+    operations: List[AssignmentOperation] = Field(..., min_length=1, max_length=5000)
+
+class FlightAssignment(BaseModel):
+    """Итоговое назначение измененного рейса"""
+    id: str
+    vehicleId: str
+    chainId: str
+
+class AssignmentBatchResult(BaseModel):
+    version: int
+    applied: int
+    flights: List[FlightAssignment]
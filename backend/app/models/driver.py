@@ -1,6 +1,10 @@
+import logging
+import os
 from pydantic import BaseModel
 from typing import Optional, List
 
+logger = logging.getLogger(__name__)
+
 class Driver(BaseModel):
     id: str
     full_name: str
@@ -13,53 +17,45 @@ class Autolift(BaseModel):
     number: str
     assigned_driver: Optional[str] = None
     
-def make_autolifts() -> List[Autolift]:
-    """Создает список автолифтов из CSV"""
-    autolifts = []
-    numbers = [
-        "133", "135", "136", "139", "140", "141", "149", "150", "151", "152", 
-        "155", "156", "157", "158", "161", "162", "163", "164", "165", "166", 
-        "169", "170", "173", "174", "176", "177", "184", "185", "186", "192", 
-        "193", "194", "202", "203", "204", "205", "207", "210", "211", "212", 
-        "213", "214", "215", "216", "217", "218", "219", "220", "221", "222", 
-        "223", "224", "225", "226", "227", "228", "229", "230", "231", "232"
-    ]
-    
-    for number in numbers:
-        autolifts.append(Autolift(
-            id=f"AL{number}",
-            number=number
-        ))
-    
-    return autolifts
+DEFAULT_AUTOLIFT_NUMBERS = [
+    "133", "135", "136", "139", "140", "141", "149", "150", "151", "152", 
+    "155", "156", "157", "158", "161", "162", "163", "164", "165", "166", 
+    "169", "170", "173", "174", "176", "177", "184", "185", "186", "192", 
+    "193", "194", "202", "203", "204", "205", "207", "210", "211", "212", 
+    "213", "214", "215", "216", "217", "218", "219", "220", "221", "222", 
+    "223", "224", "225", "226", "227", "228", "229", "230", "231", "232"
+]
 
-def make_drivers() -> List[Driver]:
-    """Создает список водителей из CSV файла"""
+def make_autolifts(data_dir: Optional[str] = None) -> List[Autolift]:
+    """Создает список автолифтов из autolifts.csv каталога данных (или встроенного списка)"""
+    if data_dir:
+        csv_path = os.path.join(data_dir, "autolifts.csv")
+        if os.path.exists(csv_path):
+            from ..services.csv_ingest import ingest_file
+            from ..services.drivers_csv_parser import autolift_row_mapper
+            autolifts, _ = ingest_file(csv_path, autolift_row_mapper, Autolift)
+            if autolifts:
+                return autolifts
+
+    return [Autolift(id=f"AL{number}", number=number) for number in DEFAULT_AUTOLIFT_NUMBERS]
+
+def make_drivers(data_dir: Optional[str] = None) -> List[Driver]:
+    """Создает список водителей из drivers.csv каталога данных"""
     try:
-        # Пытаемся загрузить водителей из CSV файла
-        from ..services.drivers_csv_parser import parse_drivers_csv
-        import os
+        # Пытаемся загрузить водителей из CSV файла (кодировка определяется автоматически)
+        from ..services.csv_ingest import ingest_file
+        from ..services.drivers_csv_parser import driver_row_mapper
         
-        csv_path = "/Users/igordvoretskii/Documents/aeromar-python/drivers.csv"
-        if os.path.exists(csv_path):
-            # Пробуем разные кодировки
-            for encoding in ['utf-8-sig', 'utf-8', 'cp1251', 'windows-1251', 'iso-8859-1']:
-                try:
-                    with open(csv_path, 'r', encoding=encoding) as f:
-                        csv_content = f.read()
-                    drivers = parse_drivers_csv(csv_content)
-                    if drivers:
-                        print(f"✅ Загружено {len(drivers)} водителей из CSV (кодировка: {encoding})")
-                        return drivers
-                except UnicodeDecodeError:
-                    continue
-                except Exception as e:
-                    print(f"❌ Ошибка при загрузке с кодировкой {encoding}: {e}")
-                    continue
+        csv_path = os.path.join(data_dir, "drivers.csv") if data_dir else ""
+        if csv_path and os.path.exists(csv_path):
+            drivers, report = ingest_file(csv_path, driver_row_mapper, Driver)
+            if drivers:
+                logger.info("Загружено %d водителей из CSV (кодировка: %s)", len(drivers), report.encoding)
+                return drivers
         
-        print("⚠️ CSV файл с водителями не найден или не удалось прочитать, используем тестовые данные")
+        logger.warning("CSV файл с водителями не найден или не удалось прочитать, используем тестовые данные")
     except Exception as e:
-        print(f"❌ Ошибка при загрузке водителей из CSV: {e}")
+        logger.error("Ошибка при загрузке водителей из CSV: %s", e)
     
     # Fallback к тестовым данным (но с новой структурой - без времен смен)
     test_drivers = [
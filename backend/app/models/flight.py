@@ -21,6 +21,7 @@ class Flight(BaseModel):
     dmsRole: Optional[DmsRole] = None
     dmsPairKey: Optional[str] = None
     flightDate: Optional[str] = None  # Дата рейса в формате YYYY-MM-DD
+    stand: Optional[str] = None  # Стоянка ВС (узел схемы перрона)
     stdMin: int  # Время в минутах от 00:00 базового дня
     kitchenOut: int
     serviceStart: int
@@ -2,6 +2,11 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
 import csv
+import logging
+
+from .driver import Autolift, Driver
+
+logger = logging.getLogger(__name__)
 
 class Machine(BaseModel):
     id: str
@@ -20,12 +25,10 @@ def time_to_minutes(time_str: str) -> int:
     except:
         return 0
 
-def make_machines() -> List[Machine]:
+def make_machines(data_dir: Optional[str] = None) -> List[Machine]:
     """Создает список машин на основе CSV файлов водителей и автолифтов"""
-    machines: List[Machine] = []
-    
-    # Пути к CSV файлам
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+    # Пути к CSV файлам (по умолчанию - корень репозитория)
+    base_dir = data_dir or os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
     drivers_csv = os.path.join(base_dir, 'drivers.csv')
     autolifts_csv = os.path.join(base_dir, 'autolifts.csv')
     
@@ -42,7 +45,7 @@ def make_machines() -> List[Machine]:
                         'shift_end': time_to_minutes(row['SHIFT_END'])
                     }
         except Exception as e:
-            print(f"Ошибка чтения drivers.csv: {e}")
+            logger.warning("Ошибка чтения drivers.csv: %s", e)
     
     # Загружаем данные автолифтов
     autolift_numbers: List[str] = []
@@ -55,8 +58,24 @@ def make_machines() -> List[Machine]:
                     if row:  # Если строка не пустая
                         autolift_numbers.append(str(row[0]).strip())
         except Exception as e:
-            print(f"Ошибка чтения autolifts.csv: {e}")
+            logger.warning("Ошибка чтения autolifts.csv: %s", e)
     
+    return assemble_machines(drivers_data, autolift_numbers)
+
+
+def machines_from(drivers: List[Driver], autolifts: List[Autolift]) -> List[Machine]:
+    """Машины из уже разобранных водителей и автолифтов (та же раскладка, что в make_machines)"""
+    drivers_data = {
+        driver.id: {'name': driver.full_name, 'shift_start': driver.shift_start, 'shift_end': driver.shift_end}
+        for driver in drivers
+    }
+    return assemble_machines(drivers_data, [autolift.number for autolift in autolifts])
+
+
+def assemble_machines(drivers_data: Dict[str, Dict[str, Any]], autolift_numbers: List[str]) -> List[Machine]:
+    """Машины по автолифтам: i-й автолифт получает i-го водителя"""
+    machines: List[Machine] = []
+
     # Создаем машины, сопоставляя водителей и автолифты
     driver_ids = list(drivers_data.keys())
     
@@ -0,0 +1,30 @@
+from enum import Enum
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+class ViolationType(str, Enum):
+    DRIVER_DOUBLE_BOOKED = "driver_double_booked"  # скобки одного водителя пересекаются
+    SERVICE_OVERLAP = "service_overlap"            # обслуживание рейсов одной машины пересекается
+    DUTY_TOO_LONG = "duty_too_long"                # работа водителя дольше FLEX_HOURS
+    LEAVE_TOO_LATE = "leave_too_late"              # отъезд от ВС позже, чем за LEAVE_BEFORE_STD до STD
+    WINDOW_OVERLOAD = "window_overload"            # занято больше окон погрузки, чем есть (DMS - два окна)
+
+class Violation(BaseModel):
+    """Нарушение правил ТГ в плане"""
+    type: ViolationType
+    message: str
+    driverId: Optional[str] = None
+    bracketIds: List[str] = Field(default_factory=list)
+    flightIds: List[str] = Field(default_factory=list)
+    start: Optional[int] = None  # минуты от 00:00 базового дня
+    end: Optional[int] = None
+
+class PlanValidation(BaseModel):
+    """Результат проверки плана"""
+    version: int
+    valid: bool
+    flights: int
+    brackets: int
+    drivers: int
+    counts: Dict[ViolationType, int]  # для пересечений - нижняя граница числа пересекающихся пар
+    violations: List[Violation]
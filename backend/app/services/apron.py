@@ -0,0 +1,155 @@
+"""
+Схема перрона и матрица времен переезда между стоянками.
+
+Граф перрона читается из CSV (FROM;TO;MINUTES - двусторонний участок между
+стоянками, рулежками, кухней) и один раз сворачивается в матрицу кратчайших
+времен всех пар узлов через scipy.sparse.csgraph.shortest_path. Матрица
+кешируется на диске под SHA-256 файла схемы, поэтому перезапуск не
+пересчитывает ее. Планировщик спрашивает время переезда за O(1): два
+словарных поиска и индекс в списке строк. Без файла схемы матрица пуста и
+планировщик работает по постоянным правилам ТГ.
+"""
+import hashlib
+import logging
+import os
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from ..models.apron import ApronEdge
+from .csv_ingest import RowMapper, ingest_file
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = {
+    "FROM": ("FROM", "SOURCE", "STAND_FROM"),
+    "TO": ("TO", "TARGET", "STAND_TO"),
+    "MINUTES": ("MINUTES", "TIME", "TRAVEL"),
+}
+
+
+def edge_row_mapper(header: List[str]) -> RowMapper:
+    """Преобразователь строки схемы перрона по заголовку (FROM;TO;MINUTES)"""
+    indexes = {}
+    for key, names in _COLUMNS.items():
+        found = [header.index(name) for name in names if name in header]
+        if not found:
+            raise ValueError(f"В заголовке схемы перрона нет колонки {key}: {header}")
+        indexes[key] = found[0]
+
+    def map_row(parts: List[str]) -> Optional[Dict[str, Any]]:
+        source = parts[indexes["FROM"]].strip().upper()
+        target = parts[indexes["TO"]].strip().upper()
+        if not source or not target:
+            raise ValueError("Пустая точка участка")
+        try:
+            minutes = float(parts[indexes["MINUTES"]].strip().replace(",", "."))
+        except ValueError:
+            raise ValueError(f"Время участка {source}-{target} не число: {parts[indexes['MINUTES']]!r}")
+        return {"source": source, "target": target, "minutes": minutes}
+
+    return map_row
+
+
+class TravelTimes:
+    """Времена переезда между узлами схемы (минуты; inf - узлы не связаны)"""
+
+    def __init__(self, nodes: Sequence[str], matrix: np.ndarray, digest: str = "") -> None:
+        self.nodes = list(nodes)
+        self.matrix = matrix
+        self.digest = digest
+        self._index = {node: i for i, node in enumerate(self.nodes)}
+        # Списки Python: индексация строки быстрее обращения к элементу массива NumPy
+        self._rows: List[List[float]] = matrix.tolist()
+
+    @classmethod
+    def empty(cls) -> "TravelTimes":
+        return cls([], np.zeros((0, 0)))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def minutes(self, source: Optional[str], target: Optional[str]) -> Optional[float]:
+        """Время переезда; None - стоянка не указана или ее нет на схеме"""
+        i = self._index.get(source) if source else None
+        j = self._index.get(target) if target else None
+        if i is None or j is None:
+            return None
+        return self._rows[i][j]
+
+
+def build_travel_times(edges: Sequence[ApronEdge], digest: str = "") -> TravelTimes:
+    """Матрица кратчайших времен всех пар узлов (граф неориентированный)"""
+    nodes = sorted({edge.source for edge in edges} | {edge.target for edge in edges})
+    index = {node: i for i, node in enumerate(nodes)}
+    size = len(nodes)
+    if not size:
+        return TravelTimes.empty()
+    # Повторные участки между одной парой: берется самый быстрый
+    weights: Dict[Tuple[int, int], float] = {}
+    for edge in edges:
+        pair = (index[edge.source], index[edge.target])
+        weights[pair] = min(weights.get(pair, edge.minutes), edge.minutes)
+    rows, cols = zip(*weights)
+    # Нулевое время csgraph считает отсутствием ребра - заменяем на бесконечно малое
+    data = [w if w > 0 else 1e-9 for w in weights.values()]
+    graph = csr_matrix((data, (rows, cols)), shape=(size, size))
+    matrix = shortest_path(graph, method="D", directed=False)
+    matrix[matrix < 1e-6] = 0.0
+    return TravelTimes(nodes, matrix, digest)
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_travel_times(path: str, cache_dir: Optional[str] = None) -> TravelTimes:
+    """Матрица для файла схемы: из кеша на диске или расчетом с сохранением в кеш"""
+    digest = _file_digest(path)
+    cache_path = os.path.join(cache_dir, f"{digest}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                return TravelTimes([str(n) for n in cached["nodes"]], cached["matrix"], digest)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Кеш матрицы перрона %s не прочитан, пересчитываем: %s", cache_path, e)
+
+    edges, report = ingest_file(path, edge_row_mapper, ApronEdge)
+    if report.error_count:
+        logger.warning("%s: пропущено строк с ошибками - %d", path, report.error_count)
+    times = build_travel_times(edges, digest)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Запись во временный файл и переименование: другой воркер не прочитает недописанный кеш
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, nodes=np.array(times.nodes, dtype=str), matrix=times.matrix)
+        os.replace(tmp_path, cache_path)
+    logger.info("Схема перрона %s: узлов %d, участков %d", path, len(times), len(edges))
+    return times
+
+
+class Apron:
+    """Активная матрица времен переезда (подменяется целиком при перезагрузке схемы)"""
+
+    def __init__(self) -> None:
+        self.times = TravelTimes.empty()
+        self._lock = Lock()
+
+    def load(self, path: str, cache_dir: Optional[str] = None) -> int:
+        """Загружает схему, если файл есть; возвращает число узлов"""
+        if not os.path.exists(path):
+            return 0
+        return self.set_times(load_travel_times(path, cache_dir))
+
+    def set_times(self, times: TravelTimes) -> int:
+        with self._lock:
+            self.times = times
+        return len(times)
+
+
+# Общая схема приложения: планировщик берет матрицу отсюда
+apron = Apron()
@@ -9,9 +9,15 @@ from ..utils.time_utils import uid
 from ..utils.constants import RULE
 from datetime import datetime, timedelta
 import logging
+import math
+from .tracing import tracer
+from .apron import TravelTimes, apron
 
 logger = logging.getLogger(__name__)
 
+# Вес минуты переезда между стоянками в оценке качества скобки
+TRAVEL_WEIGHT = 1.0
+
 class BracketScheduler:
     """
     Планировщик скобок с полной бизнес-логикой.
@@ -32,10 +38,13 @@ class BracketScheduler:
     ограничениями по длительности и специфическими комбинациями.
     """
     
-    def __init__(self, flights: List[Flight], machines: List[Machine], drivers: Optional[List[Any]] = None):
+    def __init__(self, flights: List[Flight], machines: List[Machine], drivers: Optional[List[Any]] = None,
+                 travel: Optional[TravelTimes] = None):
         self.flights = flights
         self.machines = machines
         self.drivers_list = drivers or []
+        # Времена переезда между стоянками (пустая матрица - постоянные интервалы ТГ)
+        self.travel = travel if travel is not None else apron.times
         self.logger = logger
 
     def _fits_driver_shift(self, bracket_flights: List[Flight], driver: Dict) -> bool:
@@ -63,7 +72,7 @@ class BracketScheduler:
         if not flights:
             return {"assignments": [], "brackets": [], "unassigned": []}
         
-        self.logger.info(f"🎯 Начинаем оптимизированное планирование для {len(flights)} рейсов")
+        self.logger.info("Планирование скобок для %d рейсов", len(flights))
         
         # Результаты планирования
         assignments = []
@@ -81,17 +90,18 @@ class BracketScheduler:
         drivers = self._get_available_drivers()
         driver_index = 0
         
-        self.logger.info(f"📊 Доступно водителей: {len(drivers)}")
+        self.logger.debug("Доступно водителей: %d", len(drivers))
         
         # Анализируем типы рейсов
         su9_count = len([f for f in sorted_flights if f.acType == "SU9"])
         sms_count = len([f for f in sorted_flights if hasattr(f, 'type') and f.type.value == "SMS"])
         dms_count = len([f for f in sorted_flights if hasattr(f, 'type') and f.type.value == "DMS"])
-        self.logger.info(f"📈 Рейсы по типам: SU9={su9_count}, SMS={sms_count}, DMS={dms_count}")
+        self.logger.debug("Рейсы по типам: SU9=%d, SMS=%d, DMS=%d", su9_count, sms_count, dms_count)
         
         # Пробуем создать скобки согласно комбинациям
         # 1. SU9 x 5 комбинации с оптимизацией по времени
         su9_flights = [f for f in sorted_flights if f.acType == "SU9"]
+        phase = tracer.start("plan.su9", flights=len(su9_flights))
         
         # Ищем оптимальные группы из 5 SU9 рейсов
         used_su9_indices = set()
@@ -133,6 +143,7 @@ class BracketScheduler:
                             for flight in best_combination:
                                 assigned_flight_ids.add(flight.flightNo)
                                 assignments.append({
+                                    "flightId": flight.id,
                                     "flightNo": flight.flightNo,
                                     "driverId": best_driver["id"],
                                     "bracketId": bracket["id"],
@@ -150,18 +161,25 @@ class BracketScheduler:
             else:
                 break
         
+        if phase is not None:
+            phase.set(brackets=len(brackets))
+            phase.end()
+        
         # 2. SMS 3-рейсовые комбинации
         sms_flights = [f for f in sorted_flights if f.flightNo not in assigned_flight_ids and f.type.value == "SMS"]
-        driver_index = self._create_sms_combinations(sms_flights, drivers, driver_index, assignments, brackets, assigned_flight_ids)
+        with tracer.span("plan.sms", flights=len(sms_flights)):
+            driver_index = self._create_sms_combinations(sms_flights, drivers, driver_index, assignments, brackets, assigned_flight_ids)
         
         # 3. DMS+SMS бизнес комбинации
         remaining_flights = [f for f in sorted_flights if f.flightNo not in assigned_flight_ids]
-        driver_index = self._create_dms_business_combinations(remaining_flights, drivers, driver_index, assignments, brackets, assigned_flight_ids)
+        with tracer.span("plan.dms_business", flights=len(remaining_flights)):
+            driver_index = self._create_dms_business_combinations(remaining_flights, drivers, driver_index, assignments, brackets, assigned_flight_ids)
         
         # 4. НОВАЯ ЛОГИКА: Объединяем существующие скобки для водителей
         if len(brackets) > 1:  # Есть смысл объединять только если больше одной скобки
-            self.logger.info(f"� Пытаемся объединить скобки для водителей: {len(brackets)} скобок доступно")
-            assignments, brackets = self._combine_brackets_for_drivers(assignments, brackets, drivers)
+            self.logger.debug("Объединение скобок для водителей: доступно %d скобок", len(brackets))
+            with tracer.span("plan.combine", brackets=len(brackets)):
+                assignments, brackets = self._combine_brackets_for_drivers(assignments, brackets, drivers)
         
         # Остальные рейсы остаются неназначенными
         for flight in sorted_flights:
@@ -325,6 +343,7 @@ class BracketScheduler:
                         for flight in best_combination:
                             assigned_flight_ids.add(flight.flightNo)
                             assignments.append({
+                                "flightId": flight.id,
                                 "flightNo": flight.flightNo,
                                 "driverId": best_driver["id"],
                                 "bracketId": bracket["id"],
@@ -339,7 +358,7 @@ class BracketScheduler:
                         
                         driver_index += 1
                     
-                    self.logger.info(f"✅ Создана оптимальная SMS скобка с качеством {best_quality_score:.2f}")
+                    self.logger.debug("Создана SMS скобка с качеством %.2f", best_quality_score)
                 else:
                     break
             else:
@@ -399,6 +418,7 @@ class BracketScheduler:
                         for flight in bracket_flights:
                             assigned_flight_ids.add(flight.flightNo)
                             assignments.append({
+                                "flightId": flight.id,
                                 "flightNo": flight.flightNo,
                                 "driverId": best_driver["id"],
                                 "bracketId": bracket["id"],
@@ -410,7 +430,7 @@ class BracketScheduler:
                         used_sms.add(sms_flight.flightNo)
                         driver_index += 1
                         
-                        self.logger.info(f"✅ Создана оптимальная DMS+SMS скобка с временным разрывом {best_time_gap} минут")
+                        self.logger.debug("Создана DMS+SMS скобка с временным разрывом %s минут", best_time_gap)
                     else:
                         break
                 else:
@@ -473,8 +493,16 @@ class BracketScheduler:
             MIN_INTERVAL = 18  # минимум 18 минут между рейсами
             MAX_INTERVAL = 28  # максимум 28 минут между рейсами для компактности
             
+            # Стоянки обоих рейсов есть на схеме перрона - интервал не меньше времени переезда
+            min_interval = MIN_INTERVAL
+            travel = self.travel.minutes(current_flight.stand, next_flight.stand)
+            if travel is not None:
+                if math.isinf(travel):
+                    return False  # Стоянки не связаны на схеме перрона
+                min_interval = max(MIN_INTERVAL, travel)
+            
             # Проверяем, что интервал находится в допустимом диапазоне
-            if interval < MIN_INTERVAL:
+            if interval < min_interval:
                 return False  # Слишком мало времени между рейсами
                 
             if interval > MAX_INTERVAL:
@@ -502,13 +530,18 @@ class BracketScheduler:
         # Общий временной диапазон (в минутах)
         time_span = sorted_flights[-1].stdMin - sorted_flights[0].stdMin
         
-        # Сумма простоев между рейсами
+        # Сумма простоев между рейсами и времени переезда между стоянками
         total_idle_time = 0
+        total_travel_time = 0
         for i in range(len(sorted_flights) - 1):
             current_flight = sorted_flights[i]
             next_flight = sorted_flights[i + 1]
-            idle_time = next_flight.serviceStart - current_flight.serviceEnd
-            total_idle_time += idle_time
+            total_idle_time += next_flight.serviceStart - current_flight.serviceEnd
+            travel = self.travel.minutes(current_flight.stand, next_flight.stand)
+            if travel is not None:
+                if math.isinf(travel):
+                    return float('inf')  # Стоянки не связаны - скобка невыполнима
+                total_travel_time += travel
         
         # Общее время обслуживания
         total_service_time = sum(f.serviceEnd - f.serviceStart for f in flights)
@@ -520,8 +553,9 @@ class BracketScheduler:
             efficiency = 1.0
             
         # Итоговая оценка качества (чем меньше, тем лучше)
-        # Штрафуем за большой временной диапазон и за большие простои
-        quality_score = time_span * 0.7 + total_idle_time * 1.2 - efficiency * 100
+        # Штрафуем за большой временной диапазон, большие простои и долгие переезды
+        quality_score = (time_span * 0.7 + total_idle_time * 1.2 + total_travel_time * TRAVEL_WEIGHT
+                         - efficiency * 100)
         
         return quality_score
     
@@ -569,7 +603,7 @@ class BracketScheduler:
         if len(brackets) < 2:
             return assignments, brackets
             
-        self.logger.info(f"� Анализируем {len(brackets)} скобок для объединения")
+        self.logger.debug("Анализируем %d скобок для объединения", len(brackets))
         
         # Сортируем скобки по времени начала
         sorted_brackets = sorted(brackets, key=lambda b: b["startTime"])
@@ -596,17 +630,19 @@ class BracketScheduler:
                 # Проверяем, можно ли объединить эти скобки
                 if self._can_combine_brackets(first_bracket, second_bracket):
                     combinations_found += 1
-                    self.logger.info(f"🔗 Найдена пара #{combinations_found} для объединения:")
-                    self.logger.info(f"   Первая скобка: {first_bracket['startTime']//60:02d}:{first_bracket['startTime']%60:02d}-{first_bracket['endTime']//60:02d}:{first_bracket['endTime']%60:02d}")
-                    self.logger.info(f"   Вторая скобка: {second_bracket['startTime']//60:02d}:{second_bracket['startTime']%60:02d}-{second_bracket['endTime']//60:02d}:{second_bracket['endTime']%60:02d}")
-                    self.logger.info(f"   Промежуток: {second_bracket['startTime'] - first_bracket['endTime']} минут")
+                    self.logger.debug(
+                        "Пара #%d для объединения: %s (%d-%d) и %s (%d-%d)",
+                        combinations_found,
+                        first_bracket["id"], first_bracket["startTime"], first_bracket["endTime"],
+                        second_bracket["id"], second_bracket["startTime"], second_bracket["endTime"],
+                    )
                     
                     # Находим вторую скобку в исходном списке и переназначаем водителя
                     for bracket in brackets:
                         if bracket["id"] == second_bracket["id"]:
                             bracket["driverId"] = first_bracket["driverId"]
                             bracket["driver"] = first_bracket["driver"].copy()
-                            self.logger.info(f"✅ Переназначили скобку водителю {first_bracket['driver']['name']}")
+                            self.logger.debug("Скобка %s переназначена водителю %s", bracket["id"], first_bracket["driverId"])
                             break
                     
                     # Обновляем назначения для второй скобки
@@ -623,7 +659,7 @@ class BracketScheduler:
             if first_bracket["id"] not in used_bracket_ids:
                 used_bracket_ids.add(first_bracket["id"])
         
-        self.logger.info(f"✅ Объединение завершено: {combinations_found} пар создано")
+        self.logger.debug("Объединение завершено: %d пар", combinations_found)
         return assignments, brackets
     
     def _can_combine_brackets(self, first_bracket: Dict[str, Any], second_bracket: Dict[str, Any]) -> bool:
@@ -0,0 +1,137 @@
+"""
+Журнал изменений хранилища для дельта-синхронизации клиентов.
+
+Подписывается на коллекции Store и хранит для каждой сущности только
+последнее изменение (версия, операция) - журнал сжат по построению: запрос
+GET /changes?since=<версия> отдает каждую сущность один раз в ее текущем
+состоянии или как удаленную. Полная замена коллекции (replace_all, clear)
+не раскладывается на отдельные записи, а помечает коллекцию для полной
+перезагрузки. Если журнал вытеснил записи старше since или клиент пришел
+с другой эпохой (процесс перезапущен), клиент получает full_reload.
+"""
+import uuid
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from .repository import Collection, Store
+
+# Сколько сжатых записей хранить
+MAX_ENTRIES = 50000
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class ChangeLog:
+    """Сжатый журнал изменений: (коллекция, ключ) -> (версия, операция)"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.epoch = uuid.uuid4().hex[:8]
+        self._store: Optional[Store] = None
+        self._collections: Dict[str, Collection] = {}
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, str]]" = OrderedDict()
+        self._resets: Dict[str, int] = {}
+        # Версия, начиная с которой журнал полон (более старые записи вытеснены)
+        self._floor = 0
+        self._lock = Lock()
+
+    def attach(self, store: Store, names: Tuple[str, ...]) -> None:
+        """Подписывается на указанные коллекции хранилища"""
+        self._store = store
+        for name in names:
+            collection: Collection = getattr(store, name)
+            self._collections[name] = collection
+            collection.subscribe(self._listener(name, collection))
+
+    @property
+    def version(self) -> int:
+        return self._store.version if self._store is not None else 0
+
+    def _listener(self, name: str, collection: Collection):
+        def on_change(event: str, payload: List[Any]) -> None:
+            version = collection.version
+            with self._lock:
+                if event == "reset":
+                    self._reset(name, version)
+                elif event == "upsert":
+                    keys = [collection.key_of(item) for item in payload]
+                    if not all(keys):
+                        # Коллекция без ключей (смены) синхронизируется только целиком
+                        self._reset(name, version)
+                        return
+                    for key in keys:
+                        self._record(name, key, version, UPSERT)
+                elif event == "remove":
+                    for key in payload:
+                        self._record(name, str(key), version, DELETE)
+        return on_change
+
+    def _record(self, name: str, key: str, version: int, op: str) -> None:
+        entry_key = (name, key)
+        self._entries.pop(entry_key, None)
+        # Версии общие для всех коллекций, а записи разных коллекций идут под
+        # разными блокировками: более новую версию могли записать раньше.
+        # Журнал держим упорядоченным по версии - такие записи встают после этой
+        newer: List[Tuple[Tuple[str, str], Tuple[int, str]]] = []
+        while self._entries:
+            last_key, last = self._entries.popitem(last=True)
+            if last[0] <= version:
+                self._entries[last_key] = last
+                break
+            newer.append((last_key, last))
+        self._entries[entry_key] = (version, op)
+        for last_key, last in reversed(newer):
+            self._entries[last_key] = last
+        while len(self._entries) > self.max_entries:
+            _, (evicted_version, _) = self._entries.popitem(last=False)
+            self._floor = max(self._floor, evicted_version)
+
+    def _reset(self, name: str, version: int) -> None:
+        self._resets[name] = version
+        for entry_key in [k for k in self._entries if k[0] == name]:
+            del self._entries[entry_key]
+
+    def changes_since(self, since: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Изменения после версии since.
+
+        Returns:
+            dict: version, epoch, full_reload, reload (коллекции для полной
+            перезагрузки) и changes {коллекция: {"upserted": [...], "deleted": [...]}}
+        """
+        current = self.version
+        result: Dict[str, Any] = {
+            "version": current,
+            "epoch": self.epoch,
+            "since": since,
+            "full_reload": False,
+            "reload": [],
+            "changes": {},
+        }
+        if (epoch is not None and epoch != self.epoch) or since > current or since < self._floor:
+            result["full_reload"] = True
+            return result
+
+        with self._lock:
+            reload = sorted(name for name, version in self._resets.items() if version > since)
+            touched: List[Tuple[str, str, str]] = []
+            # Записи упорядочены по версии (см. _record): идем с конца до первой старой
+            for (name, key), (version, op) in reversed(self._entries.items()):
+                if version <= since:
+                    break
+                if name not in reload:
+                    touched.append((name, key, op))
+
+        changes: Dict[str, Dict[str, List[Any]]] = {}
+        for name, key, op in reversed(touched):
+            bucket = changes.setdefault(name, {"upserted": [], "deleted": []})
+            item = self._collections[name].get(key) if op == UPSERT else None
+            if item is None:
+                bucket["deleted"].append(key)
+            else:
+                bucket["upserted"].append(item)
+        result["reload"] = reload
+        result["changes"] = changes
+        return result
@@ -0,0 +1,305 @@
+"""
+Потоковый импорт CSV.
+
+Общий конвейер для рейсов, водителей, автолифтов и смен: файл читается
+блоками с инкрементальным декодированием (кодировка и BOM определяются по
+первому блоку, UTF-8 без BOM при ошибке дальше по файлу сменяется на
+cp1251), строки разбираются генератором csv.reader, преобразуются в словари
+полей и валидируются пакетами. Ошибки собираются построчно и не
+прерывают импорт. Память не зависит от размера файла (кроме самих
+импортированных объектов).
+"""
+import codecs
+import csv
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from ..utils.bulk import list_adapter
+from .tracing import current_span, now_us, tracer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+# Сколько ошибок хранить в отчете (считаются все)
+MAX_REPORTED_ERRORS = 100
+FALLBACK_ENCODING = "cp1251"
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# Преобразователь строки CSV в поля модели; None - строка пропускается молча,
+# ValueError - строка попадает в отчет об ошибках
+RowMapper = Callable[[List[str]], Optional[Dict[str, Any]]]
+# Фабрика преобразователя по заголовку файла
+MapperFactory = Callable[[List[str]], RowMapper]
+# Обработка пакета записей перед валидацией (например, векторный расчет полей)
+BatchPreparer = Callable[[List[Dict[str, Any]]], None]
+
+
+class IngestError(ValueError):
+    """Фатальная ошибка импорта (файл нельзя разобрать целиком)"""
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass
+class IngestReport:
+    """Отчет об импорте файла"""
+    encoding: str = ""
+    delimiter: str = ""
+    rows: int = 0
+    imported: int = 0
+    error_count: int = 0
+    errors: List[RowError] = field(default_factory=list)
+
+    def add_error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.encoding,
+            "delimiter": self.delimiter,
+            "rows": self.rows,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": [{"line": e.line, "message": e.message} for e in self.errors],
+        }
+
+
+def sniff_encoding(chunk: bytes) -> Tuple[str, int]:
+    """
+    Определяет кодировку по первому блоку файла.
+
+    Returns:
+        tuple: (кодировка, длина BOM)
+    """
+    for bom, encoding in _BOMS:
+        if chunk.startswith(bom):
+            return encoding, len(bom)
+    try:
+        # final=False: многобайтный символ может быть разрезан границей блока
+        codecs.getincrementaldecoder("utf-8")().decode(chunk, final=False)
+        return "utf-8", 0
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING, 0
+
+
+def iter_text_lines(stream: BinaryIO, report: IngestReport, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Читает бинарный поток блоками и выдает строки текста вместе с переводом строки.
+
+    Кодировка определяется по первому блоку. Если файл без BOM признан UTF-8,
+    а ошибка декодирования встретилась дальше (кириллица только в поздних
+    строках cp1251-файла), декодирование переключается на cp1251: пока все
+    прочитанное - ASCII, уже выданные строки в обеих кодировках одинаковы.
+    """
+    chunk = stream.read(chunk_size)
+    encoding, bom_length = sniff_encoding(chunk)
+    report.encoding = encoding
+    decoder = codecs.getincrementaldecoder(encoding)()
+    chunk = chunk[bom_length:]
+    # Все прочитанное до текущего блока - ASCII (переход на cp1251 еще возможен)
+    ascii_prefix = encoding == "utf-8" and not bom_length
+    offset = bom_length
+    pending = ""
+    try:
+        while chunk:
+            try:
+                text = decoder.decode(chunk)
+            except UnicodeDecodeError:
+                if not ascii_prefix:
+                    raise
+                logger.info(
+                    "Файл не в UTF-8 (ошибка после %d байт ASCII), декодирование в %s", offset, FALLBACK_ENCODING
+                )
+                encoding = report.encoding = FALLBACK_ENCODING
+                decoder = codecs.getincrementaldecoder(encoding)()
+                ascii_prefix = False
+                text = decoder.decode(chunk)
+            ascii_prefix = ascii_prefix and chunk.isascii()
+            offset += len(chunk)
+            lines = (pending + text).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+            chunk = stream.read(chunk_size)
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise IngestError(f"Не удалось декодировать файл в кодировке {encoding}: {e}") from e
+    if pending:
+        yield pending
+
+
+def iter_text_lines_from_str(text: str, report: IngestReport) -> Iterator[str]:
+    """Строки уже декодированного текста (для разбора строк, а не файлов)"""
+    report.encoding = report.encoding or "str"
+    if text.startswith("\ufeff"):
+        text = text[1:]
+    return iter(text.splitlines(keepends=True))
+
+
+def content_digest(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """SHA-256 содержимого потока; поток возвращается в начало для разбора"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def sniff_delimiter(header_line: str) -> str:
+    """Разделитель по строке заголовка: ';' если его больше, чем запятых"""
+    if ";" in header_line and header_line.count(";") > header_line.count(","):
+        return ";"
+    return ","
+
+
+def iter_records(
+    lines: Iterator[str],
+    mapper_factory: MapperFactory,
+    report: IngestReport,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Генератор записей: (номер строки, поля модели).
+    Пустые строки пропускаются, ошибки преобразования попадают в отчет.
+    """
+    header_line = ""
+    header_line_no = 0
+    for header_line in lines:
+        header_line_no += 1
+        if header_line.strip():
+            break
+    else:
+        return
+
+    report.delimiter = sniff_delimiter(header_line)
+    header = next(csv.reader([header_line], delimiter=report.delimiter))
+    try:
+        mapper = mapper_factory([h.strip().upper() for h in header])
+    except ValueError as e:
+        raise IngestError(str(e)) from e
+
+    reader = csv.reader(lines, delimiter=report.delimiter)
+    for row in reader:
+        line_no = header_line_no + reader.line_num
+        if not row or not any(part.strip() for part in row):
+            continue
+        report.rows += 1
+        try:
+            record = mapper(row)
+        except (ValueError, IndexError) as e:
+            report.add_error(line_no, str(e))
+            continue
+        if record is not None:
+            yield line_no, record
+
+
+def validate_batches(
+    records: Iterable[Tuple[int, Dict[str, Any]]],
+    model: Type[T],
+    report: IngestReport,
+    batch_size: int = BATCH_SIZE,
+    prepare: Optional[BatchPreparer] = None,
+) -> Iterator[T]:
+    """Валидирует записи пакетами; при ошибке в пакете проверяет его построчно"""
+    adapter = list_adapter(model)
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+    # Начало чтения пакета: декодирование и разбор строк идут потоково до flush
+    read_started = now_us()
+
+    def flush() -> Iterator[T]:
+        parent = current_span()
+        if parent is not None:
+            tracer.record("csv.read", parent, read_started, now_us(), rows=len(batch))
+        if prepare is not None:
+            with tracer.span("csv.prepare", rows=len(batch)):
+                prepare([record for _, record in batch])
+        with tracer.span("csv.validate", rows=len(batch)):
+            try:
+                items = adapter.validate_python([record for _, record in batch])
+            except ValidationError:
+                items = []
+                for line_no, record in batch:
+                    try:
+                        items.append(model.model_validate(record))
+                    except ValidationError as e:
+                        report.add_error(line_no, _format_validation_error(e))
+        report.imported += len(items)
+        return iter(items)
+
+    for item in records:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from flush()
+            batch = []
+            read_started = now_us()
+    if batch:
+        yield from flush()
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+def ingest_stream(
+    stream: BinaryIO,
+    mapper_factory: MapperFactory,
+    model: Type[T],
+    chunk_size: int = CHUNK_SIZE,
+    batch_size: int = BATCH_SIZE,
+    prepare: Optional[BatchPreparer] = None,
+) -> Tuple[List[T], IngestReport]:
+    """Полный импорт бинарного потока (файл, UploadFile.file)"""
+    report = IngestReport()
+    lines = iter_text_lines(stream, report, chunk_size)
+    records = iter_records(lines, mapper_factory, report)
+    items = list(validate_batches(records, model, report, batch_size, prepare))
+    logger.info(
+        "Импорт %s: строк %d, загружено %d, ошибок %d (кодировка %s)",
+        model.__name__, report.rows, report.imported, report.error_count, report.encoding,
+    )
+    return items, report
+
+
+def ingest_text(
+    text: str,
+    mapper_factory: MapperFactory,
+    model: Type[T],
+    batch_size: int = BATCH_SIZE,
+    prepare: Optional[BatchPreparer] = None,
+) -> Tuple[List[T], IngestReport]:
+    """Импорт уже декодированного текста"""
+    report = IngestReport()
+    lines = iter_text_lines_from_str(text, report)
+    records = iter_records(lines, mapper_factory, report)
+    items = list(validate_batches(records, model, report, batch_size, prepare))
+    return items, report
+
+
+def ingest_file(
+    path: str,
+    mapper_factory: MapperFactory,
+    model: Type[T],
+    prepare: Optional[BatchPreparer] = None,
+) -> Tuple[List[T], IngestReport]:
+    """Импорт файла с диска"""
+    with open(path, "rb") as stream:
+        return ingest_stream(stream, mapper_factory, model, prepare=prepare)
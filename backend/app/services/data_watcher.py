@@ -0,0 +1,183 @@
+"""
+Наблюдение за каталогом данных с горячей перезагрузкой.
+
+Опрос по (mtime, size) без inotify: справочные файлы (drivers.csv,
+autolifts.csv, shifts.csv) и CSV с расписанием рейсов в папке приема
+(incoming/). Файл обрабатывается, когда его сигнатура не менялась между
+двумя опросами (запись завершена). Разбор выполняется в пуле потоков, а
+новая коллекция подменяется в хранилище целиком одной операцией в цикле
+событий, поэтому перезагрузка не блокирует API. Ошибка разбора оставляет
+прежние данные.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Сигнатура файла для опроса
+Signature = Tuple[int, int]
+# Разбор файла (в пуле потоков) и применение результата (в цикле событий)
+FileParser = Callable[[str], List[Any]]
+FileApplier = Callable[[List[Any]], int]
+
+PROCESSED_DIR = "processed"
+
+
+@dataclass
+class WatchedSource:
+    name: str
+    parse: FileParser
+    apply: FileApplier
+
+
+@dataclass
+class ReloadEvent:
+    """Запись о перезагрузке файла"""
+    source: str
+    path: str
+    status: str  # ok | error
+    count: int = 0
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    at: float = field(default_factory=time.time)
+
+
+def file_signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DataDirectoryWatcher:
+    """
+    Опрашивает каталог данных и перезагружает измененные файлы.
+
+    Args:
+        data_dir: Каталог со справочными файлами
+        interval: Период опроса в секундах
+        drop_dir: Папка приема файлов рейсов (обработанные переносятся в processed/)
+    """
+
+    def __init__(self, data_dir: str, interval: float, drop_dir: Optional[str] = None) -> None:
+        self.data_dir = data_dir
+        self.interval = interval
+        self.drop_dir = drop_dir
+        self._files: Dict[str, WatchedSource] = {}
+        self._drop_source: Optional[WatchedSource] = None
+        self._known: Dict[str, Optional[Signature]] = {}
+        self._pending: Dict[str, Signature] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.events: List[ReloadEvent] = []
+
+    def watch_file(self, filename: str, parse: FileParser, apply: FileApplier) -> None:
+        """Следить за справочным файлом каталога данных"""
+        self._files[os.path.join(self.data_dir, filename)] = WatchedSource(filename, parse, apply)
+
+    def watch_drop_dir(self, parse: FileParser, apply: FileApplier) -> None:
+        """Обрабатывать CSV, появляющиеся в папке приема"""
+        self._drop_source = WatchedSource("incoming", parse, apply)
+
+    def snapshot(self) -> None:
+        """Запоминает текущее состояние справочных файлов (уже загруженных при старте)"""
+        for path in self._files:
+            self._known[path] = file_signature(path)
+
+    def start(self) -> "asyncio.Task[None]":
+        if self._task is None:
+            self.snapshot()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Ошибка наблюдения за каталогом данных")
+
+    async def poll(self) -> List[ReloadEvent]:
+        """Один проход опроса; возвращает события перезагрузки"""
+        events: List[ReloadEvent] = []
+        for path, source in self._files.items():
+            if self._is_ready(path):
+                events.append(await self._reload(source, path))
+        if self._drop_source is not None and self.drop_dir and os.path.isdir(self.drop_dir):
+            for entry in sorted(os.scandir(self.drop_dir), key=lambda e: e.name):
+                if entry.is_file() and entry.name.lower().endswith(".csv") and self._is_ready(entry.path):
+                    event = await self._reload(self._drop_source, entry.path)
+                    events.append(event)
+                    self._archive_dropped(entry.path, event)
+        return events
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "data_dir": self.data_dir,
+            "drop_dir": self.drop_dir,
+            "files": [os.path.basename(path) for path in self._files],
+            "events": [vars(e) for e in self.events[-50:]],
+        }
+
+    def _is_ready(self, path: str) -> bool:
+        """Файл изменился и его сигнатура стабильна два опроса подряд"""
+        current = file_signature(path)
+        if current is None or current == self._known.get(path):
+            self._pending.pop(path, None)
+            return False
+        if self._pending.get(path) != current:
+            self._pending[path] = current
+            return False
+        del self._pending[path]
+        self._known[path] = current
+        return True
+
+    async def _reload(self, source: WatchedSource, path: str) -> ReloadEvent:
+        started = time.perf_counter()
+        try:
+            items = await run_in_threadpool(source.parse, path)
+            if not items:
+                raise ValueError("файл не содержит ни одной корректной записи")
+            # Подмена коллекции выполняется в цикле событий одной синхронной операцией
+            count = source.apply(items)
+            event = ReloadEvent(source.name, path, "ok", count)
+            logger.info("Перезагружен %s: %d записей", path, count,
+                        extra={"source": source.name, "count": count})
+        except Exception as e:
+            event = ReloadEvent(source.name, path, "error", error=str(e))
+            logger.error("Не удалось перезагрузить %s, остаются прежние данные: %s", path, e)
+        event.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.events.append(event)
+        del self.events[:-100]
+        return event
+
+    def _archive_dropped(self, path: str, event: ReloadEvent) -> None:
+        """Переносит обработанный файл приема в processed/ (с пометкой при ошибке)"""
+        target_dir = os.path.join(os.path.dirname(path), PROCESSED_DIR)
+        os.makedirs(target_dir, exist_ok=True)
+        suffix = "" if event.status == "ok" else ".error"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        try:
+            os.replace(path, os.path.join(target_dir, f"{stamp}-{os.path.basename(path)}{suffix}"))
+        except OSError as e:
+            logger.error("Не удалось перенести %s: %s", path, e)
+        self._known.pop(path, None)
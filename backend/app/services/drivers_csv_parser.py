@@ -1,41 +1,33 @@
-import csv
 import re
-from typing import List
+from typing import Any, Dict, List, Optional
 from ..models.driver import Driver, Autolift
+from .csv_ingest import RowMapper, ingest_text
 
-def parse_drivers_csv(text: str) -> List[Driver]:
+def driver_row_mapper(header: List[str]) -> RowMapper:
     """
-    Парсит CSV с водителями в новом формате
+    Преобразователь строки CSV с водителями в новом формате
     Ожидает только DRIVER_ID и FULL_NAME (без времен смен)
     """
-    # Убираем BOM если он есть
-    if text.startswith('\ufeff'):
-        text = text[1:]
-    
-    # Нормализуем окончания строк
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    if not lines:
-        return []
-    
-    # Пропускаем заголовок
-    drivers = []
-    for i in range(1, len(lines)):
-        parts = lines[i].split(';')  # Изменяем разделитель на ;
-        if len(parts) >= 2:
-            driver_id = parts[0].strip()
-            full_name = parts[1].strip()
-            
-            if driver_id and full_name:
-                # Создаем водителя без времен смен (они будут назначены позже)
-                drivers.append(Driver(
-                    id=driver_id,
-                    full_name=full_name,
-                    shift_start=0,  # Временные значения по умолчанию
-                    shift_end=480   # 8 часов в минутах
-                ))
-    
+    def map_row(parts: List[str]) -> Optional[Dict[str, Any]]:
+        if len(parts) < 2:
+            raise ValueError(f"Ожидается DRIVER_ID;FULL_NAME, получено: {';'.join(parts)}")
+        driver_id = parts[0].strip()
+        full_name = parts[1].strip()
+        if not driver_id or not full_name:
+            raise ValueError("Пустой DRIVER_ID или FULL_NAME")
+        # Водитель без времен смен (они будут назначены позже)
+        return {
+            'id': driver_id,
+            'full_name': full_name,
+            'shift_start': 0,  # Временные значения по умолчанию
+            'shift_end': 480,  # 8 часов в минутах
+        }
+
+    return map_row
+
+def parse_drivers_csv(text: str) -> List[Driver]:
+    """Парсит CSV с водителями (строки с ошибками пропускаются)"""
+    drivers, _ = ingest_text(text, driver_row_mapper, Driver)
     return drivers
 
 def parse_time_to_minutes(time_str: str) -> int:
@@ -49,30 +41,18 @@ def parse_time_to_minutes(time_str: str) -> int:
         
         return total_minutes
     return 0
-    
-    return drivers
+
+def autolift_row_mapper(header: List[str]) -> RowMapper:
+    """Преобразователь строки CSV с автолифтами (одна колонка - номер)"""
+    def map_row(parts: List[str]) -> Optional[Dict[str, Any]]:
+        number = parts[0].strip() if parts else ''
+        if not number:
+            return None
+        return {'id': f"AL{number}", 'number': number}
+
+    return map_row
 
 def parse_autolifts_csv(text: str) -> List[Autolift]:
     """Парсит CSV с автолифтами"""
-    # Убираем BOM если он есть
-    if text.startswith('\ufeff'):
-        text = text[1:]
-    
-    # Нормализуем окончания строк
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    if not lines:
-        return []
-    
-    # Пропускаем заголовок
-    autolifts = []
-    for i in range(1, len(lines)):
-        number = lines[i].strip()
-        if number:
-            autolifts.append(Autolift(
-                id=f"AL{number}",
-                number=number
-            ))
-    
+    autolifts, _ = ingest_text(text, autolift_row_mapper, Autolift)
     return autolifts
@@ -0,0 +1,159 @@
+"""
+История ручных правок назначений (undo/redo).
+
+Состояние назначений - неизменяемый словарь id рейса -> (vehicleId, chainId)
+со структурным разделением (PersistentMap): правка копирует O(log n) узлов,
+поэтому последние N состояний хранятся целиком без копирования списка
+рейсов. Переход на любое из них - индекс в списке; изменения для хранилища
+дает diff двух словарей, который обходит только различающиеся ветви.
+
+Каждое состояние помнит версию коллекции рейсов, при которой оно было
+текущим. Если рейсы изменил кто-то помимо ручных правок (импорт,
+автопланирование), история устарела: отмена невозможна, и следующая правка
+начинает историю заново от нового состояния.
+
+Начальное состояние новой истории не собирается заново по всем рейсам:
+история подписана на коллекцию и ведет словарь назначений текущей версии,
+дописывая в него изменения чужих записей за O(k log n). Полная замена
+коллекции или пакет больше 1/8 рейсов сбрасывают этот словарь - его пересборка
+за O(n) выполняется перед следующей правкой в пуле потоков (prepare), а не в
+цикле событий; если до правки не успели, она делается при записи правки.
+"""
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models.flight import Flight
+from ..utils.persistent_map import PersistentMap
+from .repository import Collection, Snapshot
+
+Assignment = Tuple[str, str]
+
+
+class EditHistoryError(Exception):
+    """Отмена или повтор невозможны (нечего отменять или история устарела)"""
+
+
+# Пакет чужих изменений больше этой доли рейсов сбрасывает словарь текущей версии
+REBUILD_FRACTION = 8
+
+
+def _assignment(flight: Optional[Flight]) -> Optional[Assignment]:
+    return (flight.vehicleId, flight.chainId) if flight is not None else None
+
+
+def _assignments(flights: Snapshot[Flight]) -> PersistentMap:
+    return PersistentMap.from_items((flight.id, _assignment(flight)) for flight in flights)
+
+
+class EditHistory:
+    """Последние limit ручных правок назначений рейсов"""
+
+    def __init__(self, limit: int = 50) -> None:
+        self.limit = limit
+        self._lock = Lock()
+        # (состояние назначений, версия коллекции рейсов), текущее - по индексу _cursor
+        self._states: List[Tuple[PersistentMap, int]] = []
+        self._cursor = -1
+        # Назначения текущей версии коллекции рейсов (None - нужна пересборка)
+        self._tracked: Optional[Tuple[PersistentMap, int]] = None
+        self._collection: Optional[Collection[Flight]] = None
+
+    def attach(self, flights: Collection[Flight]) -> None:
+        """Подписывается на коллекцию рейсов, чтобы вести назначения текущей версии"""
+        self._collection = flights
+        flights.subscribe(self._on_change)
+
+    def _on_change(self, event: str, payload: List[Any]) -> None:
+        version = self._collection.version
+        with self._lock:
+            if self._tracked is None:
+                return
+            tracked, _ = self._tracked
+            if event == "reset" or len(payload) * REBUILD_FRACTION > len(tracked):
+                self._tracked = None
+            elif event == "upsert":
+                self._tracked = (tracked.update((flight.id, _assignment(flight)) for flight in payload), version)
+            elif event == "remove":
+                # Удаленный рейс - None (diff считает его отсутствующим)
+                self._tracked = (tracked.update((key, None) for key in payload), version)
+
+    def needs_prepare(self) -> bool:
+        """Следующая правка начнет историю заново, а словаря текущей версии нет"""
+        if self._collection is None:
+            return False
+        with self._lock:
+            in_sync = self._cursor >= 0 and self._states[self._cursor][1] == self._collection.version
+            return self._tracked is None and not in_sync
+
+    def prepare(self, flights: Snapshot[Flight]) -> None:
+        """Пересобирает назначения текущей версии за O(n); вызывается вне цикла событий"""
+        state = _assignments(flights)
+        with self._lock:
+            # Запись после снимка уже прошла мимо словаря - такой результат не годится
+            if self._tracked is None and self._collection.version == flights.version:
+                self._tracked = (state, flights.version)
+
+    def _base_state(self, before: Snapshot[Flight], after_version: int, changes: Dict[str, Dict[str, str]]) -> PersistentMap:
+        """Назначения до правки: из словаря текущей версии за O(k log n), иначе пересборкой за O(n)"""
+        if self._tracked is not None and self._tracked[1] == after_version:
+            return self._tracked[0].update((flight_id, _assignment(before.get(flight_id))) for flight_id in changes)
+        return _assignments(before)
+
+    def record(self, before: Snapshot[Flight], after_version: int, changes: Dict[str, Dict[str, str]]) -> None:
+        """
+        Запоминает правку: before - снимок рейсов до нее, after_version - версия
+        коллекции сразу после, changes - {id рейса: {vehicleId, chainId}}
+        """
+        if not changes or self.limit <= 0:
+            return
+        with self._lock:
+            if self._cursor < 0 or self._states[self._cursor][1] != before.version:
+                self._states = [(self._base_state(before, after_version, changes), before.version)]
+                self._cursor = 0
+            del self._states[self._cursor + 1:]
+            current = self._states[self._cursor][0]
+            state = current.update(
+                (flight_id, (fields.get("vehicleId", ""), fields.get("chainId", "")))
+                for flight_id, fields in changes.items()
+            )
+            self._states.append((state, after_version))
+            if self._collection is not None and self._collection.version == after_version:
+                self._tracked = (state, after_version)
+            if len(self._states) > self.limit + 1:
+                del self._states[0]
+            self._cursor = len(self._states) - 1
+
+    def plan_move(self, steps: int, current_version: int) -> Tuple[int, Dict[str, Dict[str, str]]]:
+        """
+        Целевой индекс и изменения рейсов для перехода на steps состояний
+        (отрицательное - отмена, положительное - повтор)
+        """
+        with self._lock:
+            if self._cursor < 0 or self._states[self._cursor][1] != current_version:
+                self._states = []
+                self._cursor = -1
+                raise EditHistoryError("Рейсы изменены не ручной правкой - история правок сброшена")
+            target = self._cursor + steps
+            if not 0 <= target < len(self._states):
+                raise EditHistoryError("Нечего отменять" if steps < 0 else "Нечего повторять")
+            diff = self._states[self._cursor][0].diff(self._states[target][0])
+        return target, {
+            flight_id: {"vehicleId": after[0], "chainId": after[1]}
+            for flight_id, (_, after) in diff.items()
+            if after is not None
+        }
+
+    def moved(self, target: int, version: int) -> None:
+        """Переход выполнен: target становится текущим состоянием с новой версией рейсов"""
+        with self._lock:
+            if 0 <= target < len(self._states):
+                state, _ = self._states[target]
+                self._states[target] = (state, version)
+                self._cursor = target
+
+    def status(self, current_version: Optional[int] = None) -> Dict[str, int]:
+        with self._lock:
+            stale = self._cursor >= 0 and current_version is not None and self._states[self._cursor][1] != current_version
+            if self._cursor < 0 or stale:
+                return {"undo": 0, "redo": 0, "limit": self.limit}
+            return {"undo": self._cursor, "redo": len(self._states) - 1 - self._cursor, "limit": self.limit}
@@ -0,0 +1,158 @@
+"""
+Инкрементальный импорт рейсов (режим diff).
+
+Рейс файла сопоставляется с рейсом хранилища по устойчивому ключу
+(flightNo, flightDate, origin); повторы ключа нумеруются по порядку STD.
+Если STD в файле без даты (ЧЧ:ММ), рейс сопоставляется по (flightNo, origin)
+и получает дату совпавшего рейса хранилища, новый рейс - сегодняшнюю: иначе
+исправленный файл, загруженный после полуночи, заменил бы все рейсы.
+Совпавший рейс сохраняет свой id и назначение, в хранилище попадают только
+добавленные, удаленные и измененные рейсы - одной версией коллекции. Если у
+рейса изменились поля, от которых зависит скобка (STD, времена ТГ, тип ВС),
+назначение с него снимается: такие рейсы вместе с новыми передаются на
+перепланирование. Повторная загрузка того же файла распознается по хешу
+содержимого и не разбирается вовсе, если расписание с тех пор не менялось.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..models.flight import Flight
+from .csv_parser import UNDATED
+from .repository import Collection, Snapshot
+from .timing_engine import TIMING_FIELDS
+
+STABLE_KEY = ("flightNo", "flightDate", "origin")
+# Ключ сопоставления рейсов файла без дат
+UNDATED_KEY = ("flightNo", "origin")
+# Поля, которые задает файл расписания (назначения и id не сравниваются)
+SCHEDULE_FIELDS = ("route", "dest", "acType", "type", "stand", "stdMin") + TIMING_FIELDS
+# Изменение этих полей делает прежнюю скобку рейса недействительной
+PLANNING_FIELDS = ("acType", "type", "stand", "stdMin") + TIMING_FIELDS
+
+StableKey = Tuple[Any, ...]
+
+
+@dataclass
+class FlightDiff:
+    """Изменения расписания относительно хранилища"""
+    added: List[Flight] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Измененные рейсы, с которых снято назначение
+    released: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    @property
+    def repair_ids(self) -> List[str]:
+        """Рейсы для перепланирования: новые и потерявшие скобку"""
+        return [flight.id for flight in self.added] + self.released
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "added": [flight.id for flight in self.added],
+            "removed": list(self.removed),
+            "changed": {flight_id: sorted(fields) for flight_id, fields in self.changed.items()},
+            "released": list(self.released),
+            "unchanged": self.unchanged,
+        }
+
+
+def stable_keys(flights: Iterable[Flight], fields: Tuple[str, ...] = STABLE_KEY) -> Dict[StableKey, Flight]:
+    """Устойчивый ключ рейса; одинаковые ключи различаются порядковым номером по (дата, STD)"""
+    keyed: Dict[StableKey, Flight] = {}
+    seen: Dict[StableKey, int] = {}
+    for flight in sorted(flights, key=lambda f: (f.flightDate or "", f.stdMin)):
+        base = tuple(getattr(flight, name) for name in fields)
+        ordinal = seen.get(base, 0)
+        seen[base] = ordinal + 1
+        keyed[base + (ordinal,)] = flight
+    return keyed
+
+
+def inherit_dates(current: Iterable[Flight], undated: List[Flight], default_date: str) -> List[Flight]:
+    """Рейсы файла без даты с датой рейса хранилища с тем же (flightNo, origin); новые - default_date"""
+    existing = stable_keys(current, UNDATED_KEY)
+    dated: List[Flight] = []
+    for key, flight in stable_keys(undated, UNDATED_KEY).items():
+        match = existing.get(key)
+        flight_date = match.flightDate if match is not None else default_date
+        dated.append(flight.model_copy(update={"flightDate": flight_date}))
+    return dated
+
+
+def diff_flights(
+    current: Iterable[Flight],
+    incoming: Iterable[Flight],
+    default_date: Optional[str] = None,
+) -> FlightDiff:
+    """
+    Сравнивает рейсы файла с рейсами хранилища по устойчивым ключам.
+    Рейсы с flightDate=UNDATED сначала получают дату (inherit_dates).
+    """
+    current = list(current)
+    incoming = list(incoming)
+    undated = [flight for flight in incoming if flight.flightDate == UNDATED]
+    if undated:
+        default_date = default_date or date.today().strftime("%Y-%m-%d")
+        incoming = [flight for flight in incoming if flight.flightDate != UNDATED]
+        incoming.extend(inherit_dates(current, undated, default_date))
+    existing = stable_keys(current)
+    diff = FlightDiff()
+    for key, flight in stable_keys(incoming).items():
+        old = existing.pop(key, None)
+        if old is None:
+            diff.added.append(flight)
+            continue
+        fields = {
+            name: getattr(flight, name)
+            for name in SCHEDULE_FIELDS
+            if getattr(flight, name) != getattr(old, name)
+        }
+        if not fields:
+            diff.unchanged += 1
+            continue
+        if old.vehicleId or old.chainId:
+            if any(name in fields for name in PLANNING_FIELDS):
+                fields.update(vehicleId="", chainId="")
+                diff.released.append(old.id)
+        diff.changed[old.id] = fields
+    diff.removed = [flight.id for flight in existing.values()]
+    return diff
+
+
+def apply_diff(collection: Collection, diff: FlightDiff, base: Snapshot) -> bool:
+    """Применяет изменения одной версией; False - коллекция изменилась после base"""
+    upserts = list(diff.added)
+    upserts.extend(base.get(flight_id).model_copy(update=fields) for flight_id, fields in diff.changed.items())
+    return collection.apply(upserts, diff.removed, expected=base) is not None
+
+
+def schedule_signature(flights: Iterable[Flight]) -> Tuple[int, int]:
+    """Подпись расписания без учета порядка и назначений (сравнивается в пределах процесса)"""
+    count = 0
+    total = 0
+    for flight in flights:
+        count += 1
+        total = (total + hash(tuple(getattr(flight, name) for name in STABLE_KEY + SCHEDULE_FIELDS))) & 0xFFFFFFFFFFFFFFFF
+    return count, total
+
+
+class ImportFingerprint:
+    """Хеш файла последнего diff-импорта и подпись расписания после него"""
+
+    def __init__(self) -> None:
+        self.digest: Optional[str] = None
+        self.signature: Optional[Tuple[int, int]] = None
+
+    def matches(self, digest: str, flights: Iterable[Flight]) -> bool:
+        """Тот же файл и расписание не менялось - импорт ничего бы не изменил"""
+        return digest == self.digest and schedule_signature(flights) == self.signature
+
+    def remember(self, digest: str, flights: Iterable[Flight]) -> None:
+        self.digest = digest
+        self.signature = schedule_signature(flights)
@@ -0,0 +1,276 @@
+"""
+Метрики приложения в текстовом формате Prometheus (без внешних зависимостей).
+
+Реестр хранит счетчики, показатели и гистограммы с метками; ASGI-middleware
+измеряет задержку и размер ответа по шаблону маршрута (/flights/{flight_id},
+а не фактический путь), планировщик и импорт CSV пишут свои метрики через
+observe_plan и observe_import. GET /metrics отдает render() реестра.
+"""
+import math
+import time
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.label_names}, получено {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> (счетчики корзин без накопления, сумма, количество)
+        self._values: Dict[Labels, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, (list(c), s, n)) for key, (c, s, n) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """Набор метрик с общим выводом в текстовом формате"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(
+        self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "aeromar_http_requests_total", "Обработанные HTTP-запросы", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "aeromar_http_request_duration_seconds", "Время обработки запроса", ("method", "route")
+)
+http_response_size = registry.histogram(
+    "aeromar_http_response_size_bytes", "Размер тела ответа", ("method", "route"), SIZE_BUCKETS
+)
+http_in_flight = registry.gauge("aeromar_http_requests_in_flight", "Запросы в обработке")
+
+plan_duration = registry.histogram(
+    "aeromar_plan_duration_seconds", "Время работы планировщика скобок", ("source",)
+)
+plan_flights = registry.histogram(
+    "aeromar_plan_flights", "Рейсов на входе планировщика", ("source",), COUNT_BUCKETS
+)
+plan_assigned_flights = registry.histogram(
+    "aeromar_plan_assigned_flights", "Рейсов, назначенных в скобки", ("source",), COUNT_BUCKETS
+)
+plan_brackets = registry.histogram(
+    "aeromar_plan_brackets", "Скобок в результате планирования", ("source",), COUNT_BUCKETS
+)
+plan_coalesced = registry.counter(
+    "aeromar_plan_coalesced_total", "Запросы планирования, получившие результат одновременного запроса", ("source",)
+)
+plan_warmup = registry.counter(
+    "aeromar_plan_warmup_total", "Запросы планирования: готовый план прогрева (hit) или расчет заново (miss)", ("result",)
+)
+plan_violations = registry.gauge(
+    "aeromar_plan_violations", "Нарушения правил ТГ в текущем плане", ("type",)
+)
+
+import_rows = registry.counter(
+    "aeromar_import_rows_total", "Строк CSV, обработанных импортом", ("kind", "status")
+)
+import_duration = registry.histogram(
+    "aeromar_import_duration_seconds", "Время разбора CSV", ("kind",)
+)
+import_throughput = registry.gauge(
+    "aeromar_import_rows_per_second", "Скорость последнего импорта (строк в секунду)", ("kind",)
+)
+
+
+def observe_plan(source: str, seconds: float, flights: int, result: Dict[str, Any]) -> None:
+    """Метрики одного запуска планировщика"""
+    plan_duration.observe(seconds, source=source)
+    plan_flights.observe(flights, source=source)
+    plan_assigned_flights.observe(len(result.get("assignments", [])), source=source)
+    plan_brackets.observe(len(result.get("brackets", [])), source=source)
+
+
+def observe_validation(counts: Dict[Any, int]) -> None:
+    """Нарушения последней проверки плана по типам"""
+    for kind, count in counts.items():
+        plan_violations.set(count, type=getattr(kind, "value", kind))
+
+
+def observe_import(kind: str, seconds: float, rows: int, imported: int, errors: int) -> None:
+    """Метрики одного импорта CSV"""
+    import_rows.inc(imported, kind=kind, status="ok")
+    import_rows.inc(errors, kind=kind, status="error")
+    import_duration.observe(seconds, kind=kind)
+    if seconds > 0:
+        import_throughput.set(round(rows / seconds, 1), kind=kind)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: задержка, размер ответа и число запросов в обработке.
+    Маршрут берется из scope после маршрутизации; запросы без маршрута
+    (404) собираются под одной меткой, чтобы не плодить ряды по путям.
+    """
+
+    def __init__(self, app: Any, exclude: Sequence[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope.get("path") in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_requests.inc(method=method, route=route, status=str(status))
+            http_latency.observe(elapsed, method=method, route=route)
+            http_response_size.observe(size, method=method, route=route)
+
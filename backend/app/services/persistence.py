@@ -0,0 +1,688 @@
+"""
+Постоянное хранилище рейсов и архив планов на SQLite.
+
+Текущее состояние (рейсы и назначения смен) зеркалируется из Store через
+подписку на изменения коллекций, каждый запуск планировщика архивируется
+отдельной версией плана. Все записи выполняются пакетами (executemany) в
+одном фоновом потоке-писателе, поэтому обработчики запросов не ждут диск.
+
+Каждая запись коллекции увеличивает ее счетчик в state_versions в той же
+транзакции - по счетчикам другие процессы (воркеры uvicorn) узнают, что их
+копия в памяти устарела (см. shared_state). Справочники, которые в обычном
+режиме читаются из CSV, в общем режиме хранятся документами в documents.
+
+В общем режиме (check_conflicts) счетчик увеличивается сравнением с обменом:
+запись проходит, только если счетчик в базе равен версии, от которой
+построена копия процесса. Иначе транзакция откатывается целиком (и полная
+замена коллекции, и ключевые upsert), а коллекция попадает в конфликты -
+shared_state перечитывает ее из базы и отвечает на запрос 409.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from ..models.flight import Flight
+from ..models.shift import ShiftAssignment
+from ..utils.bulk import validate_json_documents, validate_many
+
+logger = logging.getLogger(__name__)
+
+# Размер пакета для массовой вставки
+BATCH_SIZE = 5000
+
+
+class WriteConflict(Exception):
+    """Коллекцию в базе изменил другой процесс после версии, от которой построена запись"""
+
+metadata = MetaData()
+
+flights_table = Table(
+    "flights",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("flight_no", String, nullable=False),
+    Column("route", String, nullable=False),
+    Column("origin", String),
+    Column("dest", String),
+    Column("ac_type", String, nullable=False),
+    Column("type", String, nullable=False),
+    Column("dms_role", String),
+    Column("dms_pair_key", String),
+    Column("flight_date", String),
+    Column("stand", String),
+    Column("std_min", Integer, nullable=False),
+    Column("kitchen_out", Integer, nullable=False),
+    Column("service_start", Integer, nullable=False),
+    Column("service_end", Integer, nullable=False),
+    Column("unload_end", Integer, nullable=False),
+    Column("load_start", Integer, nullable=False),
+    Column("load_end", Integer, nullable=False),
+    Column("vehicle_id", String, nullable=False, default=""),
+    Column("chain_id", String, nullable=False, default=""),
+    Column("cancelled", Boolean, nullable=False, default=False),
+    Index("ix_flights_flight_date", "flight_date"),
+    Index("ix_flights_std_min", "std_min"),
+    Index("ix_flights_chain_id", "chain_id"),
+    Index("ix_flights_vehicle_id", "vehicle_id"),
+)
+
+plans_table = Table(
+    "plans",
+    metadata,
+    Column("version", Integer, primary_key=True, autoincrement=True),
+    Column("created_at", String, nullable=False),
+    Column("source", String, nullable=False),
+    Column("storage_version", Integer),
+    Column("total_flights", Integer, nullable=False),
+    Column("assigned_flights", Integer, nullable=False),
+    Column("unassigned_flights", Integer, nullable=False),
+    Column("brackets_count", Integer, nullable=False),
+)
+
+plan_brackets_table = Table(
+    "plan_brackets",
+    metadata,
+    Column("plan_version", Integer, nullable=False),
+    Column("bracket_id", String, nullable=False),
+    Column("driver_id", String),
+    Column("start_time", Integer),
+    Column("end_time", Integer),
+    Column("shift_start", Integer),
+    Column("shift_end", Integer),
+    Column("flight_count", Integer),
+    Column("first_flight_type", String),
+    Column("flights", Text),  # JSON-список номеров рейсов
+    Index("ix_plan_brackets_plan_version", "plan_version"),
+    Index("ix_plan_brackets_driver_id", "driver_id"),
+)
+
+# Состояние каждого запланированного рейса в версии плана (chain_id NULL - не назначен)
+plan_flights_table = Table(
+    "plan_flights",
+    metadata,
+    Column("plan_version", Integer, nullable=False),
+    Column("flight_id", String, nullable=False),
+    Column("flight_no", String, nullable=False),
+    Column("flight_date", String),
+    Column("ac_type", String),
+    Column("flight_type", String),
+    Column("std_min", Integer),
+    Column("driver_id", String),
+    Column("chain_id", String),
+    Index("ix_plan_flights_plan_version", "plan_version"),
+    Index("ix_plan_flights_flight_date", "flight_date", "plan_version"),
+    Index("ix_plan_flights_std_min", "std_min"),
+    Index("ix_plan_flights_chain_id", "chain_id"),
+    Index("ix_plan_flights_driver_id", "driver_id"),
+)
+
+plan_shift_assignments_table = Table(
+    "plan_shift_assignments",
+    metadata,
+    Column("plan_version", Integer, nullable=False),
+    Column("driver_id", String, nullable=False),
+    Column("shift_start", String, nullable=False),
+    Column("shift_end", String, nullable=False),
+    Column("bracket_ids", Text, nullable=False),  # JSON-список ID скобок
+    Index("ix_plan_shift_assignments_plan_version", "plan_version"),
+    Index("ix_plan_shift_assignments_driver_id", "driver_id"),
+)
+
+# Текущие назначения смен (восстанавливаются при перезапуске)
+shift_assignments_table = Table(
+    "shift_assignments",
+    metadata,
+    Column("driver_id", String, primary_key=True),
+    Column("shift_start", String, nullable=False),
+    Column("shift_end", String, nullable=False),
+    Column("bracket_ids", Text, nullable=False),
+)
+
+# Счетчик изменений каждой коллекции и процесс, записавший последнее изменение
+state_versions_table = Table(
+    "state_versions",
+    metadata,
+    Column("collection", String, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("writer", String, nullable=False),
+)
+
+# Справочные коллекции целиком (JSON объекта модели в порядке коллекции)
+documents_table = Table(
+    "documents",
+    metadata,
+    Column("collection", String, nullable=False),
+    Column("seq", Integer, nullable=False),
+    Column("data", Text, nullable=False),
+    Index("ix_documents_collection", "collection", "seq"),
+)
+
+# Соответствие полей модели Flight колонкам таблицы flights
+FLIGHT_COLUMNS = {
+    "id": "id",
+    "flightNo": "flight_no",
+    "route": "route",
+    "origin": "origin",
+    "dest": "dest",
+    "acType": "ac_type",
+    "type": "type",
+    "dmsRole": "dms_role",
+    "dmsPairKey": "dms_pair_key",
+    "flightDate": "flight_date",
+    "stand": "stand",
+    "stdMin": "std_min",
+    "kitchenOut": "kitchen_out",
+    "serviceStart": "service_start",
+    "serviceEnd": "service_end",
+    "unloadEnd": "unload_end",
+    "loadStart": "load_start",
+    "loadEnd": "load_end",
+    "vehicleId": "vehicle_id",
+    "chainId": "chain_id",
+    "cancelled": "cancelled",
+}
+
+
+def _configure_sqlite(dbapi_connection: Any, connection_record: Any) -> None:
+    """WAL-журнал: читатели не блокируют единственного писателя"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+def _plain(value: Any) -> Any:
+    """Enum -> значение, остальное без изменений"""
+    return getattr(value, "value", value)
+
+
+def flight_to_row(flight: Flight) -> Dict[str, Any]:
+    return {column: _plain(getattr(flight, field)) for field, column in FLIGHT_COLUMNS.items()}
+
+
+def rows_to_flights(rows: Iterable[Any]) -> List[Flight]:
+    """Рейсы из строк таблицы одним пакетом"""
+    items = FLIGHT_COLUMNS.items()
+    return validate_many(Flight, [{field: row._mapping[column] for field, column in items} for row in rows])
+
+
+def _batched(rows: List[Dict[str, Any]], size: int = BATCH_SIZE) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class PlanArchive:
+    """
+    Постоянное хранилище на локальном файле SQLite.
+
+    Args:
+        path: Путь к файлу базы данных
+        pool_size: Размер пула соединений для читающих запросов
+    """
+
+    def __init__(self, path: str, pool_size: int = 5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.engine = create_engine(
+            f"sqlite:///{path}",
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=pool_size,
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(self.engine, "connect", _configure_sqlite)
+        self._create_schema()
+        # Один поток-писатель: SQLite допускает только одного писателя одновременно
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-archive")
+        # Идентификатор процесса в state_versions и версии, записанные им самим
+        self.writer_id = uuid.uuid4().hex[:12]
+        self._own_versions: Dict[str, Set[int]] = {}
+        self._own_lock = threading.Lock()
+        # Общий режим: запись только поверх известной версии коллекции
+        self.check_conflicts = False
+        self._expected: Dict[str, int] = {}
+        self._conflicts: Set[str] = set()
+        self._local = threading.local()
+
+    def _create_schema(self, attempts: int = 3) -> None:
+        """Создает таблицы; другой воркер может создавать их одновременно - тогда повторяем"""
+        for attempt in range(attempts):
+            try:
+                metadata.create_all(self.engine)
+                self._add_missing_columns()
+                return
+            except OperationalError as e:
+                if ("already exists" not in str(e) and "duplicate column" not in str(e)) or attempt == attempts - 1:
+                    raise
+
+    def _add_missing_columns(self) -> None:
+        """Добавляет в существующие таблицы столбцы, появившиеся в схеме позже (все допускают NULL)"""
+        existing = inspect(self.engine)
+        with self.engine.begin() as conn:
+            for table in metadata.sorted_tables:
+                present = {column["name"] for column in existing.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in present:
+                        logger.info("Добавляем столбец %s.%s", table.name, column.name)
+                        conn.exec_driver_sql(
+                            f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(self.engine.dialect)}"
+                        )
+
+    # --- текущее состояние ---
+
+    def load_flights(self) -> List[Flight]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(flights_table).order_by(flights_table.c.std_min))
+            return rows_to_flights(rows)
+
+    def load_shift_assignments(self) -> List[ShiftAssignment]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(shift_assignments_table))
+            return [
+                ShiftAssignment(
+                    driver_id=row.driver_id,
+                    shift_start=row.shift_start,
+                    shift_end=row.shift_end,
+                    bracket_ids=json.loads(row.bracket_ids),
+                )
+                for row in rows
+            ]
+
+    def load_documents(self, name: str, model: Any) -> Optional[Tuple[List[Any], int]]:
+        """Справочная коллекция и ее версия; None, если коллекция еще не сохранялась"""
+        with self.engine.connect() as conn:
+            version = conn.execute(
+                select(state_versions_table.c.version).where(state_versions_table.c.collection == name)
+            ).scalar()
+            if version is None:
+                return None
+            rows = conn.execute(
+                select(documents_table.c.data)
+                .where(documents_table.c.collection == name)
+                .order_by(documents_table.c.seq)
+            )
+            return validate_json_documents(model, [row.data for row in rows]), version
+
+    def read_versions(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(state_versions_table.c.collection, state_versions_table.c.version))
+            return {row.collection: row.version for row in rows}
+
+    def wrote_all(self, name: str, after: int, version: int) -> bool:
+        """Все версии коллекции в (after, version] записаны этим процессом"""
+        with self._own_lock:
+            own = self._own_versions.setdefault(name, set())
+            # Версии до after уже учтены вызывающим - больше не нужны
+            own.difference_update([v for v in own if v <= after])
+            return all(v in own for v in range(after + 1, version + 1))
+
+    def expect(self, name: str, version: int) -> None:
+        """Копия коллекции в памяти построена от версии базы version"""
+        with self._own_lock:
+            self._expected[name] = max(self._expected.get(name, 0), version)
+
+    def take_conflicts(self) -> Set[str]:
+        """Коллекции, запись которых отклонена с прошлого вызова"""
+        with self._own_lock:
+            conflicts, self._conflicts = self._conflicts, set()
+        return conflicts
+
+    def attach(self, store: Any) -> None:
+        """Подписывает архив на изменения рейсов и назначений смен в Store"""
+        store.flights.subscribe(self._on_flights)
+        store.shift_assignments.subscribe(self._on_shift_assignments)
+
+    def attach_documents(self, store: Any, names: Iterable[str]) -> None:
+        """Подписывает архив на справочные коллекции: каждое изменение сохраняет коллекцию целиком"""
+        for name in names:
+            collection = getattr(store, name)
+            collection.subscribe(self._documents_listener(collection))
+
+    @contextmanager
+    def suppressed(self) -> Iterator[None]:
+        """Изменения Store в текущем потоке не записываются (данные пришли из базы)"""
+        self._local.suppressed = True
+        try:
+            yield
+        finally:
+            self._local.suppressed = False
+
+    @property
+    def _suppressed(self) -> bool:
+        return getattr(self._local, "suppressed", False)
+
+    def _documents_listener(self, collection: Any) -> Callable[[str, List[Any]], None]:
+        def on_change(event_name: str, payload: List[Any]) -> None:
+            if self._suppressed:
+                return
+            rows = [
+                {"collection": collection.name, "seq": seq, "data": item.model_dump_json()}
+                for seq, item in enumerate(collection.snapshot())
+            ]
+            self.submit(self._write_documents, collection.name, rows)
+        return on_change
+
+    def _write_documents(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        with self.engine.begin() as conn:
+            self._bump(conn, name)
+            conn.execute(delete(documents_table).where(documents_table.c.collection == name))
+            for batch in _batched(rows):
+                conn.execute(insert(documents_table), batch)
+
+    def _on_flights(self, event_name: str, payload: List[Any]) -> None:
+        if self._suppressed:
+            return
+        # Строки формируются сразу: объекты в Store могут измениться до записи
+        if event_name == "remove":
+            self.submit(self._delete_rows, "flights", flights_table, flights_table.c.id, list(payload))
+        else:
+            rows = [flight_to_row(flight) for flight in payload]
+            self.submit(self._write_rows, "flights", flights_table, ["id"], rows, event_name == "reset")
+
+    def _on_shift_assignments(self, event_name: str, payload: List[Any]) -> None:
+        if self._suppressed:
+            return
+        name, table = "shift_assignments", shift_assignments_table
+        if event_name == "remove":
+            self.submit(self._delete_rows, name, table, table.c.driver_id, list(payload))
+        else:
+            rows = [
+                {
+                    "driver_id": a.driver_id,
+                    "shift_start": a.shift_start,
+                    "shift_end": a.shift_end,
+                    "bracket_ids": json.dumps(a.bracket_ids),
+                }
+                for a in payload
+            ]
+            self.submit(self._write_rows, name, table, ["driver_id"], rows, event_name == "reset")
+
+    def _write_rows(
+        self,
+        name: str,
+        table: Table,
+        key_columns: List[str],
+        rows: List[Dict[str, Any]],
+        replace: bool,
+    ) -> None:
+        if not replace and not rows:
+            return
+        with self.engine.begin() as conn:
+            self._bump(conn, name)
+            if replace:
+                conn.execute(delete(table))
+                for batch in _batched(rows):
+                    conn.execute(insert(table), batch)
+            else:
+                stmt = sqlite_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=key_columns,
+                    set_={column: stmt.excluded[column] for column in rows[0] if column not in key_columns},
+                )
+                for batch in _batched(rows):
+                    conn.execute(stmt, batch)
+
+    def _delete_rows(self, name: str, table: Table, key_column: Any, keys: List[str]) -> None:
+        with self.engine.begin() as conn:
+            self._bump(conn, name)
+            conn.execute(delete(table).where(key_column.in_(keys)))
+
+    def _bump(self, conn: Any, name: str) -> int:
+        """
+        Увеличивает счетчик коллекции в текущей транзакции записи (первой
+        командой - она же берет блокировку записи SQLite). В общем режиме -
+        сравнением с обменом; при несовпадении WriteConflict откатывает транзакцию.
+        """
+        table = state_versions_table
+        if self.check_conflicts:
+            with self._own_lock:
+                expected = self._expected.get(name, 0)
+            if expected:
+                stmt = (
+                    update(table)
+                    .where(table.c.collection == name, table.c.version == expected)
+                    .values(version=expected + 1, writer=self.writer_id)
+                )
+            else:
+                stmt = sqlite_insert(table).values(collection=name, version=1, writer=self.writer_id)
+                stmt = stmt.on_conflict_do_nothing(index_elements=["collection"])
+            if conn.execute(stmt).rowcount != 1:
+                with self._own_lock:
+                    self._conflicts.add(name)
+                raise WriteConflict(f"{name}: версия в базе уже не {expected}, запись отклонена")
+            version = expected + 1
+        else:
+            stmt = sqlite_insert(table).values(collection=name, version=1, writer=self.writer_id)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["collection"],
+                set_={"version": table.c.version + 1, "writer": stmt.excluded.writer},
+            )
+            conn.execute(stmt)
+            version = conn.execute(select(table.c.version).where(table.c.collection == name)).scalar_one()
+        with self._own_lock:
+            self._own_versions.setdefault(name, set()).add(version)
+            self._expected[name] = max(self._expected.get(name, 0), version)
+        return version
+
+    # --- архив планов ---
+
+    def save_plan(
+        self,
+        source: str,
+        result: Dict[str, Any],
+        flights: List[Flight],
+        storage_version: Optional[int] = None,
+        shift_assignments: Optional[List[ShiftAssignment]] = None,
+    ) -> "Future[int]":
+        """
+        Архивирует результат планирования как новую версию плана.
+        Возвращает Future с номером версии.
+        """
+        assigned = {a.get("flightId"): a for a in result.get("assignments", [])}
+        brackets = result.get("brackets", [])
+        plan_row = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source": source,
+            "storage_version": storage_version,
+            "total_flights": len(flights),
+            "assigned_flights": len(assigned),
+            "unassigned_flights": len(flights) - len(assigned),
+            "brackets_count": len(brackets),
+        }
+        bracket_rows = [
+            {
+                "bracket_id": b["id"],
+                "driver_id": b.get("driverId"),
+                "start_time": b.get("startTime"),
+                "end_time": b.get("endTime"),
+                "shift_start": b.get("shiftStart"),
+                "shift_end": b.get("shiftEnd"),
+                "flight_count": b.get("flightCount"),
+                "first_flight_type": b.get("firstFlightType"),
+                "flights": json.dumps(b.get("flights", [])),
+            }
+            for b in brackets
+        ]
+        flight_rows = []
+        for flight in flights:
+            assignment = assigned.get(flight.id)
+            flight_rows.append({
+                "flight_id": flight.id,
+                "flight_no": flight.flightNo,
+                "flight_date": flight.flightDate,
+                "ac_type": flight.acType,
+                "flight_type": _plain(flight.type),
+                "std_min": flight.stdMin,
+                "driver_id": assignment.get("driverId") if assignment else None,
+                "chain_id": assignment.get("bracketId") if assignment else None,
+            })
+        shift_rows = [
+            {
+                "driver_id": a.driver_id,
+                "shift_start": a.shift_start,
+                "shift_end": a.shift_end,
+                "bracket_ids": json.dumps(a.bracket_ids),
+            }
+            for a in shift_assignments or []
+        ]
+        return self.submit(self._write_plan, plan_row, bracket_rows, flight_rows, shift_rows)
+
+    def _write_plan(
+        self,
+        plan_row: Dict[str, Any],
+        bracket_rows: List[Dict[str, Any]],
+        flight_rows: List[Dict[str, Any]],
+        shift_rows: List[Dict[str, Any]],
+    ) -> int:
+        with self.engine.begin() as conn:
+            version = conn.execute(insert(plans_table), plan_row).inserted_primary_key[0]
+            for table, rows in (
+                (plan_brackets_table, bracket_rows),
+                (plan_flights_table, flight_rows),
+                (plan_shift_assignments_table, shift_rows),
+            ):
+                for row in rows:
+                    row["plan_version"] = version
+                for batch in _batched(rows):
+                    conn.execute(insert(table), batch)
+        return version
+
+    def list_plans(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(plans_table).order_by(plans_table.c.version.desc()).limit(limit)
+            )
+            return [dict(row._mapping) for row in rows]
+
+    def get_plan(self, version: int) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            plan = conn.execute(select(plans_table).where(plans_table.c.version == version)).first()
+            if plan is None:
+                return None
+            brackets = conn.execute(
+                select(plan_brackets_table).where(plan_brackets_table.c.plan_version == version)
+            )
+            flights = conn.execute(
+                select(plan_flights_table).where(plan_flights_table.c.plan_version == version)
+            )
+            shifts = conn.execute(
+                select(plan_shift_assignments_table)
+                .where(plan_shift_assignments_table.c.plan_version == version)
+            )
+            result = dict(plan._mapping)
+            result["brackets"] = [
+                {**row._mapping, "flights": json.loads(row.flights)} for row in brackets
+            ]
+            result["flights"] = [dict(row._mapping) for row in flights]
+            result["shift_assignments"] = [
+                {**row._mapping, "bracket_ids": json.loads(row.bracket_ids)} for row in shifts
+            ]
+            return result
+
+    def load_plan_brackets(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Скобки версии плана в формате планировщика (None - версии нет)"""
+        table = plan_brackets_table
+        with self.engine.connect() as conn:
+            if conn.execute(select(plans_table.c.version).where(plans_table.c.version == version)).first() is None:
+                return None
+            rows = conn.execute(
+                select(table.c.bracket_id, table.c.driver_id, table.c.start_time, table.c.end_time, table.c.flights)
+                .where(table.c.plan_version == version)
+            )
+            return [
+                {
+                    "id": row.bracket_id,
+                    "driverId": row.driver_id,
+                    "startTime": row.start_time,
+                    "endTime": row.end_time,
+                    "flights": json.loads(row.flights),
+                }
+                for row in rows
+            ]
+
+    def count_flights(
+        self,
+        flight_date: str,
+        ac_type: Optional[str] = None,
+        assigned: Optional[bool] = None,
+        plan_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Считает рейсы даты в версии плана (по умолчанию - в последней версии,
+        содержащей эту дату), например неназначенные SU9 за прошлый вторник.
+        """
+        table = plan_flights_table
+        with self.engine.connect() as conn:
+            if plan_version is None:
+                plan_version = conn.execute(
+                    select(func.max(table.c.plan_version)).where(table.c.flight_date == flight_date)
+                ).scalar()
+            if plan_version is None:
+                return {"planVersion": None, "flightDate": flight_date, "count": 0}
+            query = select(func.count()).select_from(table).where(
+                table.c.plan_version == plan_version,
+                table.c.flight_date == flight_date,
+            )
+            if ac_type:
+                query = query.where(table.c.ac_type == ac_type.upper())
+            if assigned is True:
+                query = query.where(table.c.chain_id.is_not(None))
+            elif assigned is False:
+                query = query.where(table.c.chain_id.is_(None))
+            count = conn.execute(query).scalar() or 0
+        return {"planVersion": plan_version, "flightDate": flight_date, "count": count}
+
+    # --- служебное ---
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        future = self._writer.submit(fn, *args)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        error = future.exception()
+        if isinstance(error, WriteConflict):
+            logger.warning("Конфликт записи с другим процессом: %s", error)
+        elif error is not None:
+            logger.error("Ошибка записи в постоянное хранилище: %s", error)
+
+    def flush(self) -> None:
+        """Дожидается записи всех изменений, поставленных в очередь до вызова"""
+        self._writer.submit(lambda: None).result()
+
+    def close(self) -> None:
+        """Дожидается всех отложенных записей и закрывает соединения"""
+        self._writer.shutdown(wait=True)
+        self.engine.dispose()
@@ -0,0 +1,107 @@
+"""
+Разница двух версий плана.
+
+Скобки сравниваются по отпечаткам содержимого (plan_fingerprint): совпавшие
+отпечатки - неизменные скобки, дальше рассматриваются только остальные.
+Из них пары с одинаковым набором рейсов - одна и та же скобка, у которой
+сменился водитель или время; прочие - добавленные и удаленные скобки. Для
+рейсов этих скобок по картам flightNo -> скобка определяется, куда рейс
+перешел. Все шаги - словари и один проход по скобкам, время линейное от
+размера планов.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from .plan_fingerprint import bracket_fingerprint
+
+# Поля скобки, изменение которых при том же наборе рейсов показывается в разнице
+_BRACKET_FIELDS = ("driverId", "startTime", "endTime")
+
+
+def _compact(bracket: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": bracket.get("id"),
+        "driverId": bracket.get("driverId"),
+        "startTime": bracket.get("startTime"),
+        "endTime": bracket.get("endTime"),
+        "flights": list(bracket.get("flights") or []),
+    }
+
+
+def _place(bracket: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if bracket is None:
+        return None
+    return {"bracketId": bracket.get("id"), "driverId": bracket.get("driverId")}
+
+
+def _by_fingerprint(brackets: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {bracket_fingerprint(bracket): bracket for bracket in brackets}
+
+
+def _flight_map(brackets: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """flightNo -> (отпечаток скобки, скобка)"""
+    return {
+        flight_no: (fingerprint, bracket)
+        for fingerprint, bracket in brackets.items()
+        for flight_no in bracket.get("flights") or []
+    }
+
+
+def diff_plans(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Изменения скобок и рейсов от плана old к плану new"""
+    old_prints = _by_fingerprint(old)
+    new_prints = _by_fingerprint(new)
+    removed = {fp: b for fp, b in old_prints.items() if fp not in new_prints}
+    added = {fp: b for fp, b in new_prints.items() if fp not in old_prints}
+
+    # Тот же набор рейсов в другой скобке - сменились водитель или время
+    removed_by_flights = {tuple(b.get("flights") or []): fp for fp, b in removed.items()}
+    changed = []
+    for fp, bracket in list(added.items()):
+        old_fp = removed_by_flights.get(tuple(bracket.get("flights") or []))
+        if old_fp is None:
+            continue
+        before = removed.pop(old_fp)
+        del added[fp]
+        changed.append({
+            "from": before.get("id"),
+            "to": bracket.get("id"),
+            "flights": list(bracket.get("flights") or []),
+            "changes": {
+                name: [before.get(name), bracket.get(name)]
+                for name in _BRACKET_FIELDS
+                if before.get(name) != bracket.get(name)
+            },
+        })
+
+    # Рейсы удаленных и добавленных скобок: куда перешел каждый
+    old_flights = _flight_map(old_prints)
+    new_flights = _flight_map(new_prints)
+    touched = {flight_no for b in removed.values() for flight_no in b.get("flights") or []}
+    touched.update(flight_no for b in added.values() for flight_no in b.get("flights") or [])
+    flights = []
+    for flight_no in sorted(touched):
+        before = old_flights.get(flight_no)
+        after = new_flights.get(flight_no)
+        if before is not None and after is not None and before[0] == after[0]:
+            continue
+        flights.append({
+            "flightNo": flight_no,
+            "from": _place(before[1] if before else None),
+            "to": _place(after[1] if after else None),
+        })
+
+    return {
+        "summary": {
+            "unchanged": len(old_prints) - len(removed) - len(changed),
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "movedFlights": len(flights),
+        },
+        "brackets": {
+            "added": [_compact(b) for b in added.values()],
+            "removed": [_compact(b) for b in removed.values()],
+            "changed": changed,
+        },
+        "flights": flights,
+    }
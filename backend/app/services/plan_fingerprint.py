@@ -0,0 +1,29 @@
+"""
+Отпечатки скобок и плана по содержимому.
+
+ID скобки - случайный uid, поэтому два одинаковых плана различаются по ID.
+Отпечаток скобки строится из того, что определяет работу водителя: водитель,
+рейсы по порядку, начало и конец скобки. Отпечаток плана - хеш
+отсортированных отпечатков скобок, от порядка скобок он не зависит.
+"""
+import hashlib
+from typing import Any, Dict, Iterable
+
+
+def bracket_fingerprint(bracket: Dict[str, Any]) -> str:
+    """Отпечаток скобки (словарь планировщика: driverId, flights, startTime, endTime)"""
+    parts = [
+        str(bracket.get("driverId") or ""),
+        ",".join(bracket.get("flights") or []),
+        str(bracket.get("startTime")),
+        str(bracket.get("endTime")),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def plan_fingerprint(brackets: Iterable[Dict[str, Any]]) -> str:
+    """Отпечаток плана по отпечаткам его скобок"""
+    digest = hashlib.sha256()
+    for fingerprint in sorted(bracket_fingerprint(bracket) for bracket in brackets):
+        digest.update(fingerprint.encode("ascii"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,195 @@
+"""
+Проверка всего плана правилами ТГ.
+
+План - назначенные рейсы хранилища: vehicleId - водитель (машина), chainId -
+скобка. Скобки восстанавливаются группировкой рейсов по (водитель, скобка)
+с теми же границами, что у планировщика: начало - за LOAD_SMS/LOAD_DMS до STD
+первого рейса, конец - RETURN_UNLOAD после обслуживания последнего.
+
+Все проверки - сортировки и проходы NumPy по массивам сразу всех рейсов,
+скобок и водителей, без попарного сравнения:
+  пересечения скобок водителя и обслуживания рейсов машины - сортировка по
+      (водитель, начало) и накопленный максимум концов внутри группы;
+  длительность работы водителя - min/max по группам (reduceat);
+  отъезд от ВС - сравнение массивов STD и окончания обслуживания;
+  окна погрузки - сканирующая прямая по событиям начала и конца погрузки;
+      скобка DMS при DMS_ADJACENT_WINDOWS занимает два соседних окна.
+
+Пересечение сообщается для интервала и того из предыдущих, что заканчивается
+позже всех, поэтому counts для пересечений - нижняя граница числа
+пересекающихся пар: три взаимно пересекающиеся скобки дают 2, а не 3.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from ..models.flight import Flight, FlightType
+from ..models.validation import PlanValidation, Violation, ViolationType
+from ..utils.constants import DMS_ADJACENT_WINDOWS, FLEX_HOURS, LOADING_WINDOWS, RULE
+from ..utils.time_utils import to_hhmm
+
+# Сколько нарушений возвращать списком (счетчики - по всем)
+MAX_VIOLATIONS = 1000
+
+
+def _groups(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Начала и концы (включительно) групп одинаковых ключей в отсортированном массиве"""
+    if not len(keys):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:] - 1, len(keys) - 1]
+    return starts, ends
+
+
+def _overlaps(group: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пересечения интервалов внутри групп: пары (i, j), где интервал j начинается
+    раньше, чем закончился один из предыдущих интервалов i той же группы.
+    Для каждого j - одна пара с i, заканчивающимся позже всех, поэтому пар
+    не больше, чем интервалов: это нижняя граница числа пересекающихся пар.
+    Индексы - в исходных массивах.
+    """
+    if len(start) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.lexsort((start, group))
+    g, s, e = group[order], start[order], end[order]
+    # Смещение групп: накопленный максимум не переходит из группы в группу
+    base = min(int(s.min()), int(e.min()))
+    span = max(int(s.max()), int(e.max())) - base + 1
+    keyed = g * span + (e - base)
+    running = np.maximum.accumulate(keyed)
+    # Индекс интервала, на котором достигнут текущий максимум
+    holder = np.maximum.accumulate(np.where(keyed == running, np.arange(len(keyed)), 0))
+    previous_end = running[:-1] - g[1:] * span + base
+    hits = np.flatnonzero((g[1:] == g[:-1]) & (s[1:] < previous_end)) + 1
+    return order[holder[hits - 1]], order[hits]
+
+
+def validate_plan(
+    flights: Iterable[Flight],
+    version: int,
+    leave_before_std: int = RULE.LEAVE_BEFORE_STD,
+    windows: int = len(LOADING_WINDOWS),
+    max_duty: int = FLEX_HOURS * 60,
+) -> PlanValidation:
+    """Нарушения правил ТГ во всем плане"""
+    assigned = [flight for flight in flights if flight.vehicleId and not flight.cancelled]
+    violations: List[Violation] = []
+    counts: Dict[ViolationType, int] = {kind: 0 for kind in ViolationType}
+
+    def report(kind: ViolationType, message: str, **fields) -> None:
+        counts[kind] += 1
+        if len(violations) < MAX_VIOLATIONS:
+            violations.append(Violation(type=kind, message=message, **fields))
+
+    n = len(assigned)
+    if not n:
+        return PlanValidation(
+            version=version, valid=True, flights=0, brackets=0, drivers=0, counts=counts, violations=[]
+        )
+
+    ids = [flight.id for flight in assigned]
+    flight_nos = [flight.flightNo for flight in assigned]
+    std = np.fromiter((flight.stdMin for flight in assigned), dtype=np.int64, count=n)
+    service_start = np.fromiter((flight.serviceStart for flight in assigned), dtype=np.int64, count=n)
+    service_end = np.fromiter((flight.serviceEnd for flight in assigned), dtype=np.int64, count=n)
+    dms = np.fromiter((flight.type == FlightType.DMS for flight in assigned), dtype=bool, count=n)
+    drivers, driver = np.unique([flight.vehicleId for flight in assigned], return_inverse=True)
+    chains, chain = np.unique([flight.chainId or flight.id for flight in assigned], return_inverse=True)
+
+    # Отъезд от ВС
+    late = np.flatnonzero(std - service_end < leave_before_std)
+    for i in late:
+        report(
+            ViolationType.LEAVE_TOO_LATE,
+            f"Рейс {flight_nos[i]}: отъезд от ВС в {to_hhmm(int(service_end[i]))}, "
+            f"менее {leave_before_std} мин до STD {to_hhmm(int(std[i]))}",
+            driverId=str(drivers[driver[i]]), flightIds=[ids[i]], start=int(service_end[i]), end=int(std[i]),
+        )
+
+    # Обслуживание рейсов одной машины не должно пересекаться
+    first, second = _overlaps(driver, service_start, service_end)
+    for i, j in zip(first, second):
+        report(
+            ViolationType.SERVICE_OVERLAP,
+            f"Машина {drivers[driver[j]]}: обслуживание {flight_nos[i]} и {flight_nos[j]} пересекается",
+            driverId=str(drivers[driver[j]]), flightIds=[ids[i], ids[j]],
+            start=int(service_start[j]), end=int(min(service_end[i], service_end[j])),
+        )
+
+    # Скобки: группы рейсов по (водитель, скобка), рейсы группы - по STD
+    pair = driver.astype(np.int64) * len(chains) + chain
+    _, bracket = np.unique(pair, return_inverse=True)
+    order = np.lexsort((std, bracket))
+    group_starts, _ = _groups(bracket[order])
+    head = order[group_starts]
+    bracket_driver = driver[head]
+    bracket_ids = [str(chains[c]) for c in chain[head]]
+    bracket_start = std[head] - np.where(dms[head], RULE.LOAD_DMS, RULE.LOAD_SMS)
+    bracket_end = np.maximum.reduceat(service_end[order], group_starts) + RULE.RETURN_UNLOAD
+
+    first, second = _overlaps(bracket_driver, bracket_start, bracket_end)
+    for i, j in zip(first, second):
+        report(
+            ViolationType.DRIVER_DOUBLE_BOOKED,
+            f"Водитель {drivers[bracket_driver[j]]}: скобки {to_hhmm(int(bracket_start[i]))}-"
+            f"{to_hhmm(int(bracket_end[i]))} и {to_hhmm(int(bracket_start[j]))}-{to_hhmm(int(bracket_end[j]))} пересекаются",
+            driverId=str(drivers[bracket_driver[j]]), bracketIds=[bracket_ids[i], bracket_ids[j]],
+            start=int(bracket_start[j]), end=int(min(bracket_end[i], bracket_end[j])),
+        )
+
+    # Длительность работы водителя: от начала первой скобки до конца последней
+    by_driver = np.argsort(bracket_driver, kind="stable")
+    driver_starts, _ = _groups(bracket_driver[by_driver])
+    duty_start = np.minimum.reduceat(bracket_start[by_driver], driver_starts)
+    duty_end = np.maximum.reduceat(bracket_end[by_driver], driver_starts)
+    for k in np.flatnonzero(duty_end - duty_start > max_duty):
+        code = bracket_driver[by_driver[driver_starts[k]]]
+        members = by_driver[bracket_driver[by_driver] == code]
+        report(
+            ViolationType.DUTY_TOO_LONG,
+            f"Водитель {drivers[code]}: работа {to_hhmm(int(duty_start[k]))}-{to_hhmm(int(duty_end[k]))} "
+            f"дольше {max_duty // 60} ч",
+            driverId=str(drivers[code]), bracketIds=[bracket_ids[b] for b in members],
+            start=int(duty_start[k]), end=int(duty_end[k]),
+        )
+
+    # Окна погрузки: от начала скобки до выезда от окна к первому рейсу
+    window_leave = std[head] - np.where(dms[head], RULE.WINDOW_TO_DEPARTURE_DMS, RULE.WINDOW_TO_DEPARTURE_SMS)
+    # Два автолифта DMS грузятся в двух соседних окнах
+    occupied = np.where(dms[head], 2, 1) if DMS_ADJACENT_WINDOWS else np.ones(len(head), dtype=np.int64)
+    _window_overloads(bracket_start, window_leave, occupied, windows, report)
+
+    return PlanValidation(
+        version=version,
+        valid=not any(counts.values()),
+        flights=n,
+        brackets=len(head),
+        drivers=len(drivers),
+        counts=counts,
+        violations=violations,
+    )
+
+
+def _window_overloads(start: np.ndarray, end: np.ndarray, occupied: np.ndarray, windows: int, report) -> None:
+    """Промежутки, где занято больше окон, чем есть (сканирующая прямая; occupied - окон на скобку)"""
+    loading = end > start
+    if not loading.any():
+        return
+    times = np.concatenate((start[loading], end[loading]))
+    weight = occupied[loading].astype(np.int64)
+    deltas = np.concatenate((weight, -weight))
+    # В одну минуту освобождение окна раньше занятия
+    order = np.lexsort((deltas, times))
+    times, level = times[order], np.cumsum(deltas[order])
+    over = np.r_[False, level > windows, False]
+    run_starts = np.flatnonzero(~over[:-1] & over[1:])
+    run_ends = np.flatnonzero(over[:-1] & ~over[1:])
+    for first, last in zip(run_starts, run_ends):
+        peak = int(level[first:last].max())
+        report(
+            ViolationType.WINDOW_OVERLOAD,
+            f"Окна погрузки {to_hhmm(int(times[first]))}-{to_hhmm(int(times[last]))}: "
+            f"занято {peak} окон при {windows}",
+            start=int(times[first]), end=int(times[last]),
+        )
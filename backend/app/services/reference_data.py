@@ -0,0 +1,105 @@
+"""
+Загрузка справочных данных (машины, водители, автолифты, смены, рейсы из
+архива) вне импорта модуля.
+
+Источники регистрируются функциями загрузки и выполняются параллельно в
+пуле потоков фоновой задачей при старте приложения либо лениво при первом
+запросе. Для каждого источника сохраняется отчет: статус, число записей,
+время загрузки и ошибка.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Функция загрузки источника: кладет данные в хранилище и возвращает число записей
+SourceLoader = Callable[[], int]
+
+
+@dataclass
+class SourceReport:
+    """Отчет о загрузке одного источника"""
+    name: str
+    status: str = "pending"  # pending | loading | ok | error
+    count: int = 0
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    loaded_at: Optional[float] = None
+
+
+class ReferenceDataLoader:
+    """Реестр источников справочных данных с ленивой и фоновой загрузкой"""
+
+    def __init__(self) -> None:
+        self._sources: Dict[str, SourceLoader] = {}
+        self._reports: Dict[str, SourceReport] = {}
+        self._locks: Dict[str, Lock] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def register(self, name: str, loader: SourceLoader) -> None:
+        self._sources[name] = loader
+        self._reports[name] = SourceReport(name)
+        self._locks[name] = Lock()
+
+    @property
+    def ready(self) -> bool:
+        return all(r.status in ("ok", "error") for r in self._reports.values())
+
+    def load_source(self, name: str) -> SourceReport:
+        """Загружает источник один раз (повторные вызовы ждут первую загрузку)"""
+        report = self._reports[name]
+        with self._locks[name]:
+            if report.status in ("ok", "error"):
+                return report
+            report.status = "loading"
+            started = time.perf_counter()
+            try:
+                report.count = self._sources[name]()
+                report.status = "ok"
+            except Exception as e:
+                report.status = "error"
+                report.error = str(e)
+                logger.error("Не удалось загрузить справочник %s: %s", name, e)
+            report.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            report.loaded_at = time.time()
+        return report
+
+    def load_all(self) -> None:
+        """Синхронная загрузка всех источников по очереди"""
+        self.started_at = self.started_at or time.time()
+        for name in self._sources:
+            self.load_source(name)
+        self.finished_at = self.finished_at or time.time()
+
+    async def load_all_async(self) -> None:
+        """Параллельная загрузка всех источников в пуле потоков"""
+        self.started_at = self.started_at or time.time()
+        await asyncio.gather(*(run_in_threadpool(self.load_source, name) for name in self._sources))
+        self.finished_at = self.finished_at or time.time()
+
+    def start(self) -> "asyncio.Task[None]":
+        """Запускает фоновую загрузку (идемпотентно); требует работающий цикл событий"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.load_all_async())
+        return self._task
+
+    async def wait(self) -> None:
+        """Дожидается загрузки; при первом обращении запускает ее"""
+        if self.ready:
+            return
+        await asyncio.shield(self.start())
+
+    def report(self) -> Dict[str, Any]:
+        sources: List[Dict[str, Any]] = [asdict(r) for r in self._reports.values()]
+        total_ms = None
+        if self.started_at and self.finished_at:
+            total_ms = round((self.finished_at - self.started_at) * 1000, 2)
+        return {"ready": self.ready, "total_ms": total_ms, "sources": sources}
@@ -0,0 +1,683 @@
+"""
+Репозиторий сущностей в памяти с индексами.
+
+Заменяет глобальные списки в api/routes.py: каждая коллекция хранит объекты
+по ключу, поддерживает хеш-индексы по выбранным полям и отсортированный
+индекс по одному числовому полю (для рейсов - stdMin). Любая мутация
+публикует новый неизменяемый снимок коллекции (копирование при записи с
+общими кусками, см. utils/chunked.py), увеличивает общую монотонную версию
+хранилища и уведомляет подписчиков
+(например, постоянное хранилище) о событиях "upsert", "remove" и "reset".
+"""
+from bisect import bisect_left, bisect_right, insort
+from itertools import count
+from threading import RLock
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from ..models.flight import Flight
+from ..models.machine import Machine
+from ..models.driver import Driver, Autolift
+from ..models.shift import Shift, ShiftAssignment
+from ..utils.chunked import MIN_CHUNK, ChunkedList, ChunkedMap, MapEditor
+
+T = TypeVar("T")
+
+_MISSING = object()
+_EMPTY_MAP = ChunkedMap()
+
+# Подписчик коллекции: (событие, объекты или ключи) -> None
+Listener = Callable[[str, List[Any]], None]
+
+
+class VersionClock:
+    """Монотонный счетчик версий, общий для всех коллекций хранилища"""
+
+    def __init__(self) -> None:
+        self._counter = count(1)
+        self.value = 0
+
+    def tick(self) -> int:
+        self.value = next(self._counter)
+        return self.value
+
+
+class IntervalIndex:
+    """
+    Индекс интервалов [start, end] для запросов пересечения.
+
+    Интервалы хранятся отсортированными по началу; дополнительно хранится
+    верхняя оценка длины интервала. Пересечение с [low, high] ищется
+    бисекцией по началу в диапазоне [low - max_length, high] с проверкой
+    конца: O(log n + k) при ограниченной длине интервалов (время обслуживания
+    рейса). Оценка длины не уменьшается при удалении и пересчитывается при
+    полной перестройке.
+    """
+
+    def __init__(self, start_field: str, end_field: str) -> None:
+        self.start_field = start_field
+        self.end_field = end_field
+        self._entries: List[Tuple[Any, str, Any]] = []
+        self._max_length = 0
+
+    def entry(self, item_key: str, item: Any) -> Tuple[Any, str, Any]:
+        return getattr(item, self.start_field), item_key, getattr(item, self.end_field)
+
+    def add(self, item_key: str, item: Any) -> None:
+        entry = self.entry(item_key, item)
+        insort(self._entries, entry)
+        self._max_length = max(self._max_length, entry[2] - entry[0])
+
+    def remove(self, item_key: str, item: Any) -> None:
+        entry = self.entry(item_key, item)
+        pos = bisect_left(self._entries, entry)
+        if pos < len(self._entries) and self._entries[pos] == entry:
+            del self._entries[pos]
+
+    def copy(self) -> "IntervalIndex":
+        clone = IntervalIndex(self.start_field, self.end_field)
+        clone._entries = list(self._entries)
+        clone._max_length = self._max_length
+        return clone
+
+    def rebuild(self, items: Iterable[Tuple[str, Any]]) -> None:
+        self._entries = sorted(self.entry(k, item) for k, item in items)
+        self._max_length = max((end - start for start, _, end in self._entries), default=0)
+
+    def overlapping(self, low: Any, high: Any) -> List[str]:
+        """Ключи интервалов, у которых start <= high и end >= low, по возрастанию начала"""
+        start = bisect_left(self._entries, (low - self._max_length, ""))
+        end = bisect_right(self._entries, (high, "\uffff"))
+        return [k for _, k, finish in self._entries[start:end] if finish >= low]
+
+
+class Snapshot(Generic[T]):
+    """
+    Неизменяемая версия коллекции: объекты и индексы на момент публикации.
+
+    Получение снимка - O(1) (ссылка на текущую версию); снимок никогда не
+    меняется, поэтому чтение из него не требует блокировок и остается
+    согласованным, даже если коллекцию в это время заменяют или изменяют.
+
+    Объекты лежат в списке из кусков (строка - номер слота в порядке
+    добавления), ключи и корзины хеш-индексов - в словарях из кусков
+    (ключ -> слот): следующая версия делит с этой все незатронутые куски.
+    """
+
+    __slots__ = (
+        "name", "version", "_key", "_sorted_by", "_slots", "_rows", "_indexes", "_sorted", "_intervals", "_values",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        version: int,
+        key: Optional[str],
+        sorted_by: Optional[str],
+        slots: ChunkedMap,
+        rows: ChunkedList,
+        indexes: Dict[str, ChunkedMap],
+        sorted_entries: List[Tuple[Any, str]],
+        intervals: Optional[IntervalIndex],
+    ) -> None:
+        self.name = name
+        self.version = version
+        self._key = key
+        self._sorted_by = sorted_by
+        self._slots = slots
+        self._rows = rows
+        self._indexes = indexes
+        self._sorted = sorted_entries
+        self._intervals = intervals
+        # Объекты в порядке добавления; считаются при первом обращении
+        self._values: Optional[List[T]] = None
+
+    def _take(self, slots: Iterable[int]) -> List[T]:
+        return [row[1] for row in self._rows.take(slots)]
+
+    def _all(self) -> List[T]:
+        if self._values is None:
+            self._values = [row[1] for row in self._rows if row is not None]
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._all())
+
+    def __contains__(self, item_key: str) -> bool:
+        return item_key in self._slots
+
+    def all(self) -> List[T]:
+        """Все объекты в порядке добавления"""
+        return list(self._all())
+
+    def get(self, item_key: str) -> Optional[T]:
+        """Объект по ключу за O(1)"""
+        slot = self._slots.get(item_key)
+        if slot is None:
+            return None
+        return self._rows[slot][1]
+
+    def find(self, field: str, value: Any) -> List[T]:
+        """Все объекты с заданным значением индексированного поля (в порядке добавления)"""
+        bucket = self._indexes[field].get(value)
+        if not bucket:
+            return []
+        return self._take(sorted(bucket.values()))
+
+    def first(self, field: str, value: Any) -> Optional[T]:
+        """Первый объект с заданным значением индексированного поля"""
+        bucket = self._indexes[field].get(value)
+        if not bucket:
+            return None
+        return self._rows[min(bucket.values())][1]
+
+    def count(self, field: str, value: Any) -> int:
+        """Число объектов с заданным значением индексированного поля за O(1)"""
+        bucket = self._indexes[field].get(value)
+        return len(bucket) if bucket else 0
+
+    def values_of(self, field: str) -> List[Any]:
+        """Различные значения индексированного поля"""
+        return [value for value, keys in self._indexes[field].items() if keys]
+
+    def range(
+        self,
+        low: Optional[int] = None,
+        high: Optional[int] = None,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[T]:
+        """
+        Объекты, у которых low <= sorted_by <= high, в порядке (sorted_by, ключ).
+        after - позиция курсора (значение, ключ): выдаются объекты строго после нее.
+        """
+        if self._sorted_by is None:
+            raise ValueError(f"Коллекция {self.name} не имеет сортированного индекса")
+        start = 0 if low is None else bisect_left(self._sorted, (low, ""))
+        if after is not None:
+            start = max(start, bisect_right(self._sorted, after))
+        end = len(self._sorted) if high is None else bisect_right(self._sorted, (high, "\uffff"))
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._take(self._slots.get_many(k for _, k in self._sorted[start:end]))
+
+    def overlapping(self, low: int, high: int) -> List[T]:
+        """Объекты, интервал которых пересекается с [low, high]"""
+        if self._intervals is None:
+            raise ValueError(f"Коллекция {self.name} не имеет индекса интервалов")
+        return self._take(self._slots.get_many(self._intervals.overlapping(low, high)))
+
+    def sorted(self) -> List[T]:
+        """Все объекты в порядке возрастания sorted_by"""
+        return self.range()
+
+    def key_of(self, item: T) -> str:
+        return str(getattr(item, self._key)) if self._key else ""
+
+    def sort_key(self, item: T) -> Tuple[Any, str]:
+        """Позиция объекта в сортированном индексе (для курсоров)"""
+        return getattr(item, self._sorted_by), self.key_of(item)
+
+
+def _build_snapshot(base: Snapshot[T], version: int, rows: List[Tuple[str, T]]) -> Snapshot[T]:
+    """Снимок с нуля по строкам (ключ, объект) в порядке добавления"""
+    indexes: Dict[str, ChunkedMap] = {}
+    for field in base._indexes:
+        buckets: Dict[Any, Dict[str, int]] = {}
+        for slot, (item_key, item) in enumerate(rows):
+            value = getattr(item, field)
+            bucket = buckets.get(value)
+            if bucket is None:
+                bucket = buckets[value] = {}
+            bucket[item_key] = slot
+        indexes[field] = ChunkedMap.build({value: ChunkedMap.build(bucket) for value, bucket in buckets.items()})
+    sorted_by = base._sorted_by
+    sorted_entries = sorted((getattr(item, sorted_by), k) for k, item in rows) if sorted_by is not None else []
+    intervals = None
+    if base._intervals is not None:
+        intervals = IntervalIndex(base._intervals.start_field, base._intervals.end_field)
+        intervals.rebuild(rows)
+    return Snapshot(
+        base.name, version, base._key, sorted_by,
+        ChunkedMap.build({item_key: slot for slot, (item_key, _) in enumerate(rows)}),
+        ChunkedList.build(rows), indexes, sorted_entries, intervals,
+    )
+
+
+class _Draft(Generic[T]):
+    """
+    Черновик следующей версии коллекции (копирование при записи).
+
+    Копируются только затронутые куски объектов и корзин индексов, а также
+    поля, значение которых изменилось. Сортированный индекс и индекс
+    интервалов копируются целиком, только если изменилось их поле.
+    fresh - версия строится с нуля (замена всего содержимого): объекты
+    собираются в обычный словарь, индексы строятся один раз в freeze.
+    """
+
+    def __init__(self, base: Snapshot[T], fresh: bool = False) -> None:
+        self.base = base
+        self.fresh = fresh
+        self.sorted_by = base._sorted_by
+        self.sorted = base._sorted
+        self.intervals = base._intervals
+        self._sorted_owned = False
+        self._intervals_owned = False
+        # Сортированные индексы перестраиваются целиком в freeze (большой пакет)
+        self._stale = False
+        if fresh:
+            self.items: Dict[str, T] = {}
+            return
+        self.slots = base._slots.editor()
+        self.rows = base._rows.editor()
+        self.indexes = {field: index.editor() for field, index in base._indexes.items()}
+        self._buckets: Dict[Tuple[str, Any], MapEditor] = {}
+
+    def __contains__(self, item_key: str) -> bool:
+        return item_key in (self.items if self.fresh else self.slots)
+
+    def get(self, item_key: str) -> Optional[T]:
+        if self.fresh:
+            return self.items.get(item_key)
+        slot = self.slots.get(item_key)
+        return None if slot is None else self.rows[slot][1]
+
+    def put(self, item_key: str, item: T, keep_sorted: bool = True) -> None:
+        """Добавляет объект или заменяет объект с тем же ключом (на его месте)"""
+        if self.fresh:
+            self.items[item_key] = item
+            return
+        slot = self.slots.get(item_key)
+        previous = None
+        if slot is None:
+            slot = len(self.rows)
+            self.rows.append((item_key, item))
+            self.slots[item_key] = slot
+        else:
+            previous = self.rows[slot][1]
+            self.rows[slot] = (item_key, item)
+        self._reindex(item_key, slot, previous, item, keep_sorted)
+
+    def pop(self, item_key: str, keep_sorted: bool = True) -> Optional[T]:
+        if self.fresh:
+            return self.items.pop(item_key, None)
+        slot = self.slots.pop(item_key)
+        if slot is None:
+            return None
+        previous = self.rows[slot][1]
+        self.rows[slot] = None
+        self._reindex(item_key, slot, previous, None, keep_sorted)
+        return previous
+
+    def _bucket(self, field: str, value: Any) -> MapEditor:
+        bucket = self._buckets.get((field, value))
+        if bucket is None:
+            bucket = self._buckets[(field, value)] = self.indexes[field].get(value, _EMPTY_MAP).editor()
+        return bucket
+
+    def _reindex(self, item_key: str, slot: int, old: Optional[T], new: Optional[T], keep_sorted: bool) -> None:
+        """Переносит ключ между корзинами индексов только для полей, значение которых изменилось"""
+        for field in self.indexes:
+            before = getattr(old, field) if old is not None else _MISSING
+            after = getattr(new, field) if new is not None else _MISSING
+            if before is not _MISSING and after is not _MISSING and before == after:
+                continue
+            if before is not _MISSING:
+                self._bucket(field, before).pop(item_key)
+            if after is not _MISSING:
+                self._bucket(field, after)[item_key] = slot
+        if self.sorted_by is not None:
+            before = (getattr(old, self.sorted_by), item_key) if old is not None else None
+            after = (getattr(new, self.sorted_by), item_key) if new is not None else None
+            if before != after:
+                if not keep_sorted:
+                    self._stale = True
+                elif not self._stale:
+                    if not self._sorted_owned:
+                        self.sorted = list(self.sorted)
+                        self._sorted_owned = True
+                    if before is not None:
+                        pos = bisect_left(self.sorted, before)
+                        if pos < len(self.sorted) and self.sorted[pos] == before:
+                            del self.sorted[pos]
+                    if after is not None:
+                        insort(self.sorted, after)
+        if self.intervals is not None:
+            before = self.intervals.entry(item_key, old) if old is not None else None
+            after = self.intervals.entry(item_key, new) if new is not None else None
+            if before != after:
+                if not keep_sorted:
+                    self._stale = True
+                elif not self._stale:
+                    if not self._intervals_owned:
+                        self.intervals = self.intervals.copy()
+                        self._intervals_owned = True
+                    if old is not None:
+                        self.intervals.remove(item_key, old)
+                    if new is not None:
+                        self.intervals.add(item_key, new)
+
+    def freeze(self, version: int) -> Snapshot[T]:
+        base = self.base
+        if self.fresh:
+            return _build_snapshot(base, version, list(self.items.items()))
+        slots = self.slots.freeze()
+        rows = self.rows.freeze()
+        if len(rows) - len(slots) > max(len(slots), MIN_CHUNK):
+            # Удаленных строк больше, чем живых - версия собирается заново без пропусков
+            return _build_snapshot(base, version, [row for row in rows if row is not None])
+        for (field, value), bucket in self._buckets.items():
+            if len(bucket):
+                self.indexes[field][value] = bucket.freeze()
+            else:
+                self.indexes[field].pop(value)
+        indexes = {field: index.freeze() for field, index in self.indexes.items()}
+        sorted_entries, intervals = self.sorted, self.intervals
+        if self._stale:
+            live = [row for row in rows if row is not None]
+            if self.sorted_by is not None:
+                sorted_entries = sorted((getattr(item, self.sorted_by), k) for k, item in live)
+            if intervals is not None:
+                intervals = IntervalIndex(intervals.start_field, intervals.end_field)
+                intervals.rebuild(live)
+        return Snapshot(
+            base.name, version, base._key, self.sorted_by, slots, rows, indexes, sorted_entries, intervals,
+        )
+
+
+class Collection(Generic[T]):
+    """
+    Коллекция сущностей с хеш-индексами и неизменяемыми снимками.
+
+    Каждая запись строит следующую версию копированием при записи (объекты
+    не меняются на месте - обновленный объект создается через model_copy)
+    и публикует ее атомарной заменой ссылки на текущий снимок. Читатели и
+    планировщики берут snapshot() за O(1) и работают с ним без блокировок.
+    Писатели сериализуются блокировкой коллекции.
+
+    Args:
+        name: Имя коллекции
+        clock: Общий счетчик версий хранилища
+        key: Имя поля-ключа; None - ключ генерируется последовательно
+        indexes: Поля, по которым строятся хеш-индексы (значение -> ключи)
+        sorted_by: Числовое поле для отсортированного индекса
+        interval: Поля (начало, конец) для индекса пересечения интервалов
+    """
+
+    def __init__(
+        self,
+        name: str,
+        clock: VersionClock,
+        key: Optional[str] = "id",
+        indexes: Iterable[str] = (),
+        sorted_by: Optional[str] = None,
+        interval: Optional[Tuple[str, str]] = None,
+    ):
+        self.name = name
+        self._clock = clock
+        self._key = key
+        self._seq = count(1)
+        self._sorted_by = sorted_by
+        self._state: Snapshot[T] = Snapshot(
+            name, 0, key, sorted_by, ChunkedMap(), ChunkedList(), {field: ChunkedMap() for field in indexes}, [],
+            IntervalIndex(*interval) if interval else None,
+        )
+        self._write_lock = RLock()
+        self._listeners: List[Listener] = []
+
+    def subscribe(self, listener: Listener) -> None:
+        """Подписывает обработчик на изменения коллекции"""
+        self._listeners.append(listener)
+
+    # --- чтение (через текущий снимок) ---
+
+    def snapshot(self) -> Snapshot[T]:
+        """Текущая неизменяемая версия коллекции за O(1)"""
+        return self._state
+
+    @property
+    def version(self) -> int:
+        return self._state.version
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._state)
+
+    def __contains__(self, item_key: str) -> bool:
+        return item_key in self._state
+
+    def all(self) -> List[T]:
+        """Все объекты в порядке добавления"""
+        return self._state.all()
+
+    def get(self, item_key: str) -> Optional[T]:
+        """Объект по ключу за O(1)"""
+        return self._state.get(item_key)
+
+    def find(self, field: str, value: Any) -> List[T]:
+        """Все объекты с заданным значением индексированного поля"""
+        return self._state.find(field, value)
+
+    def first(self, field: str, value: Any) -> Optional[T]:
+        """Первый объект с заданным значением индексированного поля"""
+        return self._state.first(field, value)
+
+    def count(self, field: str, value: Any) -> int:
+        """Число объектов с заданным значением индексированного поля за O(1)"""
+        return self._state.count(field, value)
+
+    def values_of(self, field: str) -> List[Any]:
+        """Различные значения индексированного поля"""
+        return self._state.values_of(field)
+
+    def range(
+        self,
+        low: Optional[int] = None,
+        high: Optional[int] = None,
+        after: Optional[Tuple[Any, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[T]:
+        """Объекты, у которых low <= sorted_by <= high (см. Snapshot.range)"""
+        return self._state.range(low, high, after, limit)
+
+    def overlapping(self, low: int, high: int) -> List[T]:
+        """Объекты, интервал которых пересекается с [low, high]"""
+        return self._state.overlapping(low, high)
+
+    def sorted(self) -> List[T]:
+        """Все объекты в порядке возрастания sorted_by"""
+        return self._state.sorted()
+
+    def sort_key(self, item: T) -> Tuple[Any, str]:
+        """Позиция объекта в сортированном индексе (для курсоров)"""
+        return self._state.sort_key(item)
+
+    def key_of(self, item: T) -> str:
+        return str(getattr(item, self._key)) if self._key else ""
+
+    # --- запись ---
+
+    def add(self, item: T) -> T:
+        """Добавляет объект; объект с тем же ключом заменяется"""
+        with self._write_lock:
+            draft = _Draft(self._state)
+            self._put(draft, item)
+            self._publish(draft)
+            self._notify("upsert", [item])
+        return item
+
+    def add_many(self, items: Iterable[T]) -> List[T]:
+        """Добавляет объекты одной операцией (одно увеличение версии)"""
+        with self._write_lock:
+            draft = _Draft(self._state)
+            added = self._put_many(draft, items)
+            self._publish(draft)
+            self._notify("upsert", added)
+        return added
+
+    def replace_all(self, items: Iterable[T], expected: Optional[Snapshot[T]] = None) -> Optional[List[T]]:
+        """
+        Полностью заменяет содержимое коллекции.
+        Новая версия строится с нуля и публикуется целиком: читатели видят
+        либо старые данные, либо новые, но не пустую коллекцию.
+        expected - снимок, на основе которого подготовлена замена: если
+        коллекция изменилась после него, замена не выполняется (None).
+        """
+        with self._write_lock:
+            if expected is not None and self._state is not expected:
+                return None
+            draft = _Draft(self._state, fresh=True)
+            added = self._put_many(draft, items)
+            self._publish(draft)
+            self._notify("reset", added)
+        return added
+
+    def update(self, item_key: str, **changes: Any) -> Optional[T]:
+        """Обновляет поля объекта (новой копией) с переиндексацией; None, если объекта нет"""
+        with self._write_lock:
+            item = self._state.get(item_key)
+            if item is None:
+                return None
+            draft = _Draft(self._state)
+            updated = self._replace(draft, item_key, item, changes)
+            self._publish(draft)
+            self._notify("upsert", [updated])
+        return updated
+
+    def update_many(self, changes: Dict[str, Dict[str, Any]], expected: Optional[Snapshot[T]] = None) -> int:
+        """
+        Применяет пакет изменений {ключ: {поле: значение}} с одним увеличением версии.
+        expected - снимок, на основе которого посчитаны изменения: объекты,
+        замененные после него другим писателем, пропускаются (сравнение по ссылке).
+        """
+        with self._write_lock:
+            state = self._state
+            draft = _Draft(state)
+            updated: List[T] = []
+            for item_key, fields in changes.items():
+                item = state.get(item_key)
+                if item is None:
+                    continue
+                if expected is not None and expected.get(item_key) is not item:
+                    continue
+                updated.append(self._replace(draft, item_key, item, fields))
+            if updated:
+                self._publish(draft)
+                self._notify("upsert", updated)
+        return len(updated)
+
+    def apply(
+        self,
+        upserts: Iterable[T] = (),
+        removes: Iterable[str] = (),
+        expected: Optional[Snapshot[T]] = None,
+    ) -> Optional[Tuple[List[T], List[str]]]:
+        """
+        Пакет добавлений/замен и удалений с одним увеличением версии
+        (подписчики получают обычные события upsert и remove).
+        expected - как в replace_all: если коллекция изменилась после снимка,
+        пакет не применяется (None).
+        """
+        with self._write_lock:
+            if expected is not None and self._state is not expected:
+                return None
+            draft = _Draft(self._state)
+            batch = list(upserts)
+            keys = [key for key in removes if key in draft]
+            # Большой пакет: сортированные индексы перестраиваются один раз при публикации
+            bulk = len(batch) + len(keys) > 64
+            for item_key in keys:
+                draft.pop(item_key, keep_sorted=not bulk)
+            added = [self._put(draft, item, keep_sorted=not bulk) for item in batch]
+            if not added and not keys:
+                return added, keys
+            self._publish(draft)
+            if keys:
+                self._notify("remove", keys)
+            if added:
+                self._notify("upsert", added)
+        return added, keys
+
+    def remove(self, item_key: str) -> Optional[T]:
+        """Удаляет объект по ключу"""
+        with self._write_lock:
+            item = self._state.get(item_key)
+            if item is None:
+                return None
+            draft = _Draft(self._state)
+            draft.pop(item_key)
+            self._publish(draft)
+            self._notify("remove", [item_key])
+        return item
+
+    def clear(self) -> None:
+        with self._write_lock:
+            self._publish(_Draft(self._state, fresh=True))
+            self._notify("reset", [])
+
+    # --- внутреннее ---
+
+    def _put_many(self, draft: _Draft[T], items: Iterable[T]) -> List[T]:
+        batch = list(items)
+        # Большой пакет: сортированные индексы перестраиваются один раз при публикации
+        bulk = len(batch) > 64
+        return [self._put(draft, item, keep_sorted=not bulk) for item in batch]
+
+    def _put(self, draft: _Draft[T], item: T, keep_sorted: bool = True) -> T:
+        item_key = self.key_of(item) if self._key else str(next(self._seq))
+        draft.put(item_key, item, keep_sorted)
+        return item
+
+    def _replace(self, draft: _Draft[T], item_key: str, item: T, changes: Dict[str, Any]) -> T:
+        """Новая копия объекта с изменениями вместо мутации опубликованного"""
+        current = draft.get(item_key)
+        if current is None:
+            current = item
+        updated = current.model_copy(update=changes)
+        draft.put(item_key, updated)
+        return updated
+
+    def _publish(self, draft: _Draft[T]) -> None:
+        # Атомарная замена ссылки: читатели видят старую или новую версию целиком
+        self._state = draft.freeze(self._clock.tick())
+
+    def _notify(self, event: str, payload: List[Any]) -> None:
+        for listener in self._listeners:
+            listener(event, payload)
+
+
+class Store:
+    """Хранилище всех коллекций приложения с общей версией"""
+
+    def __init__(self) -> None:
+        self.clock = VersionClock()
+        self.flights: Collection[Flight] = Collection(
+            "flights",
+            self.clock,
+            indexes=("flightNo", "chainId", "vehicleId", "type", "acType"),
+            sorted_by="stdMin",
+            interval=("serviceStart", "unloadEnd"),
+        )
+        self.machines: Collection[Machine] = Collection("machines", self.clock)
+        self.drivers: Collection[Driver] = Collection("drivers", self.clock)
+        self.autolifts: Collection[Autolift] = Collection("autolifts", self.clock)
+        self.shifts: Collection[Shift] = Collection("shifts", self.clock, key=None)
+        self.shift_assignments: Collection[ShiftAssignment] = Collection(
+            "shift_assignments", self.clock, key="driver_id"
+        )
+
+    @property
+    def version(self) -> int:
+        return self.clock.value
+
+    def snapshot(self) -> Dict[str, Snapshot]:
+        """Снимки всех коллекций (каждый - O(1))"""
+        return {
+            name: collection.snapshot()
+            for name, collection in vars(self).items()
+            if isinstance(collection, Collection)
+        }
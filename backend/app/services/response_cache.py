@@ -0,0 +1,82 @@
+"""
+Кеш сериализованных ответов GET-списков по версии коллекции.
+
+JSON-тело списка строится один раз на версию коллекции; ответ получает
+строгий ETag, а запрос с совпадающим If-None-Match получает 304 без тела.
+Любая мутация через методы коллекции увеличивает ее версию, поэтому
+устаревшая запись кеша просто перестает совпадать. Маршруты записи,
+возвращающие весь список (импорт, POST списка), отдают то же тело через
+send(): уже проверенные объекты хранилища не проходят response_model
+повторно, а следующий GET получает готовый ответ.
+"""
+import uuid
+from threading import Lock
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from fastapi import Request, Response
+
+from ..utils.bulk import dump_json_many
+from .repository import Collection, Snapshot
+from .tracing import tracer
+
+# Идентификатор запуска: версии коллекций начинаются заново после перезапуска
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class VersionedResponseCache:
+    """Сериализованные тела ответов по (имя коллекции, версия)"""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, Tuple[int, bytes, str]] = {}
+        self._lock = Lock()
+
+    def respond(self, request: Request, collection: Collection, model: Any) -> Response:
+        """Ответ со списком коллекции: 304 при совпадении ETag, иначе кешированное тело"""
+        _, body, etag = self._entry(collection, model)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def send(self, collection: Collection, model: Any, headers: Optional[Mapping[str, str]] = None) -> Response:
+        """
+        Весь список коллекции без проверки If-None-Match (ответ маршрута записи).
+        headers - заголовки, уже выставленные маршрутом (например, X-Import-*).
+        """
+        _, body, etag = self._entry(collection, model)
+        return Response(content=body, media_type="application/json", headers={**(headers or {}), "ETag": etag})
+
+    def _entry(self, collection: Collection, model: Any) -> Tuple[int, bytes, str]:
+        # Тело и ETag строятся из одного снимка, поэтому всегда соответствуют друг другу
+        snapshot = collection.snapshot()
+        entry = self._entries.get(collection.name)
+        if entry is None or entry[0] != snapshot.version:
+            entry = self._build(snapshot, model)
+        return entry
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Сбросить кеш коллекции (или весь кеш)"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def _build(self, snapshot: Snapshot, model: Any) -> Tuple[int, bytes, str]:
+        version = snapshot.version
+        with tracer.span("serialize", collection=snapshot.name, items=len(snapshot)):
+            body = dump_json_many(model, snapshot.all())
+        entry = (version, body, f'"{_BOOT_ID}-{snapshot.name}-{version}"')
+        with self._lock:
+            current = self._entries.get(snapshot.name)
+            # Параллельный запрос мог уже сохранить более новую версию
+            if current is None or current[0] <= version:
+                self._entries[snapshot.name] = entry
+        return entry
@@ -0,0 +1,159 @@
+"""
+Общее состояние нескольких воркеров uvicorn через SQLite.
+
+Каждый воркер держит свою копию Store в памяти и записывает изменения в
+общую базу (PlanArchive), увеличивая счетчик коллекции в state_versions.
+Перед обработкой запроса воркер сверяет счетчики с известными ему: если
+коллекцию изменил другой процесс, она перечитывается из базы и подменяется
+целиком. Чтения сверяются не чаще interval секунд, записи - всегда, чтобы
+изменение строилось на актуальных данных. После запроса на запись очередь
+писателя дописывается, поэтому следующий запрос к любому воркеру видит
+результат.
+
+Два воркера могут начать запись от одной версии. Запись проверяет версию
+сравнением с обменом (PlanArchive.check_conflicts); проигравший воркер
+перечитывает коллекцию из базы, а его запрос получает 409 и повторяется
+клиентом - молча побеждающей последней записи нет.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from .persistence import PlanArchive
+from .repository import Collection
+
+logger = logging.getLogger(__name__)
+
+# Чтение коллекции из базы: (объекты, версия в state_versions)
+CollectionReader = Callable[[PlanArchive], Optional[Tuple[List[Any], int]]]
+
+
+def table_reader(name: str, load: Callable[[PlanArchive], List[Any]]) -> CollectionReader:
+    """Чтение коллекции, хранимой построчно (рейсы, назначения смен)"""
+    def read(archive: PlanArchive) -> Tuple[List[Any], int]:
+        # Версия читается до данных: более новые данные дадут лишь лишнюю перезагрузку
+        version = archive.read_versions().get(name, 0)
+        return load(archive), version
+    return read
+
+
+def documents_reader(name: str, model: Any) -> CollectionReader:
+    """Чтение справочной коллекции, хранимой документами"""
+    def read(archive: PlanArchive) -> Optional[Tuple[List[Any], int]]:
+        return archive.load_documents(name, model)
+    return read
+
+
+@dataclass
+class SharedCollection:
+    collection: Collection
+    read: CollectionReader
+
+
+class SharedStateSync:
+    """
+    Сверка копии Store в памяти с общей базой.
+
+    Args:
+        interval: Минимальный период сверки для читающих запросов (секунды)
+    """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        self.interval = interval
+        self.archive: Optional[PlanArchive] = None
+        self._sources: Dict[str, SharedCollection] = {}
+        self._known: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.reloads = 0
+
+    def register(self, collection: Collection, read: CollectionReader) -> None:
+        self._sources[collection.name] = SharedCollection(collection, read)
+
+    def bind(self, archive: PlanArchive) -> None:
+        self.archive = archive
+        archive.check_conflicts = True
+        for name, version in self._known.items():
+            archive.expect(name, version)
+
+    def remember(self, name: str, version: int) -> None:
+        """Копия коллекции в памяти соответствует версии базы"""
+        self._known[name] = max(self._known.get(name, 0), version)
+        if self.archive is not None:
+            self.archive.expect(name, version)
+
+    def _drop_conflicts(self) -> List[str]:
+        """Коллекции с отклоненной записью: копия в памяти неверна, их нужно перечитать"""
+        conflicts = sorted(self.archive.take_conflicts())
+        for name in conflicts:
+            self._known.pop(name, None)
+        return conflicts
+
+    async def sync(self, force: bool = False) -> List[str]:
+        """Перечитывает коллекции, измененные другими процессами; возвращает их имена"""
+        if self.archive is None:
+            return []
+        if not force and time.monotonic() - self._checked_at < self.interval:
+            return []
+        async with self._lock:
+            archive = self.archive
+            # Сначала дописываем свои изменения: иначе перечитанная коллекция их потеряет
+            await run_in_threadpool(archive.flush)
+            self._drop_conflicts()
+            versions = await run_in_threadpool(archive.read_versions)
+            reloaded = []
+            for name, version in versions.items():
+                source = self._sources.get(name)
+                known = self._known.get(name, 0)
+                if source is None or version <= known:
+                    continue
+                if archive.wrote_all(name, known, version):
+                    self._known[name] = version
+                    continue
+                if await self._reload(source):
+                    reloaded.append(name)
+            self._checked_at = time.monotonic()
+        return reloaded
+
+    async def flush(self) -> List[str]:
+        """
+        Дожидается записи изменений текущего процесса в базу. Возвращает
+        коллекции, запись которых отклонена из-за другого процесса (они уже
+        перечитаны из базы)
+        """
+        if self.archive is None:
+            return []
+        await run_in_threadpool(self.archive.flush)
+        conflicts = self._drop_conflicts()
+        if conflicts:
+            await self.sync(force=True)
+        return conflicts
+
+    async def _reload(self, source: SharedCollection) -> bool:
+        collection = source.collection
+        before = collection.snapshot()
+        loaded = await run_in_threadpool(source.read, self.archive)
+        if loaded is None:
+            return False
+        items, version = loaded
+        with self.archive.suppressed():
+            # Коллекцию изменили в этом процессе во время чтения - сверимся в следующий раз
+            if collection.replace_all(items, expected=before) is None:
+                return False
+        self.remember(collection.name, version)
+        self.reloads += 1
+        logger.info("Коллекция %s перечитана из общей базы (версия %d)", collection.name, version)
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.archive is not None,
+            "writer": self.archive.writer_id if self.archive is not None else None,
+            "interval": self.interval,
+            "known": dict(self._known),
+            "reloads": self.reloads,
+        }
@@ -40,9 +40,9 @@ class ShiftAssignmentService:
                     bracket_ids=[bracket['id'] for bracket in driver_bracket_list]
                 )
                 assignments.append(assignment)
-                logger.info(f"Водителю {driver_id} назначена смена {best_shift.shift_start}-{best_shift.shift_end}")
+                logger.debug("Водителю %s назначена смена %s-%s", driver_id, best_shift.shift_start, best_shift.shift_end)
             else:
-                logger.warning(f"Не удалось найти подходящую смену для водителя {driver_id}")
+                logger.warning("Не удалось найти подходящую смену для водителя %s", driver_id)
         
         return assignments
     
@@ -65,8 +65,6 @@ class ShiftAssignmentService:
             start_time = bracket.get('startTime')
             end_time = bracket.get('endTime')
             
-            logger.debug(f"DEBUG: Bracket startTime: {start_time}, endTime: {end_time}")
-            
             if start_time is not None and end_time is not None:
                 # Времена уже в минутах от 00:00
                 if isinstance(start_time, int):
@@ -81,7 +79,7 @@ class ShiftAssignmentService:
         earliest_start_min = min(all_start_times)
         latest_end_min = max(all_end_times)
         
-        logger.debug(f"DEBUG: Скобки: {earliest_start_min//60:02d}:{earliest_start_min%60:02d} - {latest_end_min//60:02d}:{latest_end_min%60:02d}")
+        logger.debug("Скобки: %d-%d мин", earliest_start_min, latest_end_min)
         
         # Ищем подходящие смены
         suitable_shifts: List[Tuple[Shift, float]] = []
@@ -91,24 +89,23 @@ class ShiftAssignmentService:
             shift_start_min = self._time_str_to_minutes(shift.shift_start)
             shift_end_min = self._time_str_to_minutes(shift.shift_end)
             
-            logger.debug(f"DEBUG: Проверяем смену {shift.shift_start}-{shift.shift_end} ({shift_start_min}-{shift_end_min} мин)")
-            
             if self._shift_can_accommodate_brackets_optimized(shift_start_min, shift_end_min, earliest_start_min, latest_end_min):
                 # Рассчитываем качество смены - чем ближе начало смены к началу скобки, тем лучше
                 quality_score = self._calculate_shift_quality_optimized(shift_start_min, shift_end_min, earliest_start_min, latest_end_min)
                 suitable_shifts.append((shift, quality_score))
-                logger.debug(f"DEBUG: Смена подходит, качество: {quality_score}")
-            else:
-                logger.debug(f"DEBUG: Смена НЕ подходит")
+                logger.debug("Смена %s-%s подходит, качество: %s", shift.shift_start, shift.shift_end, quality_score)
         
         if not suitable_shifts:
-            logger.warning(f"Не найдено подходящих смен для брекетов {earliest_start_min//60:02d}:{earliest_start_min%60:02d} - {latest_end_min//60:02d}:{latest_end_min%60:02d}")
+            logger.warning(
+                "Не найдено подходящих смен для брекетов %02d:%02d - %02d:%02d",
+                earliest_start_min // 60, earliest_start_min % 60, latest_end_min // 60, latest_end_min % 60,
+            )
             return None
         
         # Сортируем по качеству (меньше = лучше) и возвращаем лучшую
         suitable_shifts.sort(key=lambda x: x[1])
         best_shift = suitable_shifts[0][0]
-        logger.info(f"Выбрана лучшая смена: {best_shift.shift_start}-{best_shift.shift_end} (качество: {suitable_shifts[0][1]})")
+        logger.debug("Выбрана лучшая смена: %s-%s (качество: %s)", best_shift.shift_start, best_shift.shift_end, suitable_shifts[0][1])
         return best_shift
     
     def _time_str_to_minutes(self, time_str: str) -> int:
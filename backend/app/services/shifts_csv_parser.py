@@ -1,10 +1,25 @@
-import csv
-from typing import List
+from typing import Any, Dict, List, Optional
 from ..models.shift import Shift
+from .csv_ingest import IngestReport, RowMapper, ingest_file
 import logging
 
 logger = logging.getLogger(__name__)
 
+def shift_row_mapper(header: List[str]) -> RowMapper:
+    """Преобразователь строки CSV со сменами по колонкам SHIFT_START, SHIFT_END"""
+    if 'SHIFT_START' not in header or 'SHIFT_END' not in header:
+        raise ValueError(f"В заголовке нет колонок SHIFT_START и SHIFT_END: {header}")
+    i_start = header.index('SHIFT_START')
+    i_end = header.index('SHIFT_END')
+
+    def map_row(parts: List[str]) -> Optional[Dict[str, Any]]:
+        return {
+            'shift_start': parts[i_start].strip(),
+            'shift_end': parts[i_end].strip(),
+        }
+
+    return map_row
+
 class ShiftsCSVParser:
     """Парсер CSV файла со сменами"""
     
@@ -17,25 +32,18 @@ class ShiftsCSVParser:
         shifts: List[Shift] = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8-sig') as file:
-                reader = csv.DictReader(file, delimiter=';')
-                
-                for row in reader:
-                    try:
-                        shift = Shift(
-                            shift_start=row['SHIFT_START'].strip(),
-                            shift_end=row['SHIFT_END'].strip()
-                        )
-                        shifts.append(shift)
-                        
-                    except Exception as e:
-                        logger.warning(f"Ошибка при парсинге строки смены: {row}, ошибка: {e}")
-                        continue
-                        
+            shifts, report = ingest_file(file_path, shift_row_mapper, Shift)
+            ShiftsCSVParser.log_errors(report)
         except FileNotFoundError:
-            logger.error(f"Файл смен не найден: {file_path}")
+            logger.error("Файл смен не найден: %s", file_path)
         except Exception as e:
-            logger.error(f"Ошибка при чтении файла смен: {e}")
+            logger.error("Ошибка при чтении файла смен: %s", e)
             
-        logger.info(f"Загружено {len(shifts)} смен из файла {file_path}")
+        logger.info("Загружено %d смен из файла %s", len(shifts), file_path)
         return shifts
+
+    @staticmethod
+    def log_errors(report: IngestReport) -> None:
+        """Пишет в лог ошибки разбора строк смен"""
+        for error in report.errors:
+            logger.warning("Ошибка при парсинге строки смены %d: %s", error.line, error.message)
@@ -0,0 +1,55 @@
+"""
+Объединение одинаковых одновременных запросов (single-flight).
+
+Пока вычисление по ключу идет, повторные запросы с тем же ключом не
+запускают свое, а ждут общее и получают тот же результат или ту же ошибку.
+Маршруты планирования включают в ключ версию хранилища, поэтому запрос
+после изменения данных считается заново. Вычисление защищено от отмены:
+отключившийся клиент не прерывает его для остальных ожидающих. Результат не
+кешируется - после завершения ключ освобождается.
+"""
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Общие вычисления для одинаковых одновременных запросов"""
+
+    def __init__(self, on_join: Optional[Callable[[Hashable], None]] = None) -> None:
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._on_join = on_join
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат compute(); при уже идущем вычислении по key - его результат"""
+        task = self._inflight.get(key)
+        if task is not None:
+            if self._on_join is not None:
+                self._on_join(key)
+        else:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._release, key))
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Ошибка уже передана ожидающим; без этого asyncio пишет "exception was never retrieved"
+            task.exception()
+
+    def coalesce(self, name: str, key: Callable[..., Tuple[Any, ...]] = lambda **kwargs: ()) -> Callable:
+        """
+        Декоратор асинхронного обработчика: ключ - (name, key(**kwargs)).
+        Сигнатура сохраняется (functools.wraps), FastAPI видит параметры исходной функции.
+        """
+        def decorator(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            @functools.wraps(handler)
+            async def wrapper(**kwargs: Any) -> Any:
+                return await self.run((name, key(**kwargs)), lambda: handler(**kwargs))
+            return wrapper
+        return decorator
@@ -0,0 +1,210 @@
+"""
+Векторный расчет времен ТГ для таблицы рейсов.
+
+Профиль правил (RuleProfile) компилируется в массивы поиска по категориям
+типов ВС, после чего kitchenOut/serviceStart/serviceEnd/unloadEnd и
+loadStart/loadEnd и тип рейса (SMS/DMS по dms_types профиля) считаются для
+всего массива stdMin одним проходом NumPy.
+Результаты кешируются по паре (профиль, версия коллекции рейсов), поэтому
+пересчет после смены правил не требует повторного импорта.
+"""
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models.flight import FlightType
+from ..utils.constants import DAY_END, DAY_START, DMS_TYPES, RULE
+from .repository import Collection
+
+TIMING_FIELDS = ("kitchenOut", "serviceStart", "serviceEnd", "unloadEnd", "loadStart", "loadEnd")
+
+# Сколько рассчитанных таблиц держать в кеше
+CACHE_SIZE = 8
+
+# Категории типов ВС в массивах поиска
+SMS, DMS = 0, 1
+
+
+@dataclass(frozen=True)
+class RuleProfile:
+    """Единый профиль правил ТГ для расчета времен рейса из STD (минуты)"""
+    name: str = "default"
+    leave_before_std: int = RULE.LEAVE_BEFORE_STD  # отъезд от ВС до STD
+    service_sms: int = RULE.SERVICE_SMS  # длительность обслуживания SMS
+    service_dms: int = RULE.SERVICE_DMS  # длительность обслуживания DMS
+    road_sms: int = RULE.LOAD_SMS  # выезд из окна до начала обслуживания / возврат (SMS)
+    road_dms: int = RULE.LOAD_DMS  # то же для DMS
+    day_start: int = DAY_START
+    day_end: int = DAY_END
+    dms_types: FrozenSet[str] = field(default_factory=lambda: frozenset(DMS_TYPES))
+
+    def with_changes(self, **changes: Any) -> "RuleProfile":
+        """Новый профиль с измененными полями (неизвестные поля - ValueError)"""
+        unknown = set(changes) - set(self.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Неизвестные поля профиля: {', '.join(sorted(unknown))}")
+        for name, value in changes.items():
+            if name == "dms_types":
+                changes[name] = frozenset(str(t).upper().strip() for t in value)
+            elif name != "name":
+                try:
+                    changes[name] = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Поле {name} должно быть числом минут, получено: {value!r}")
+        return replace(self, **changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["dms_types"] = sorted(self.dms_types)
+        return data
+
+
+DEFAULT_PROFILE = RuleProfile()
+
+
+@dataclass(frozen=True)
+class CompiledProfile:
+    """Профиль, скомпилированный в массивы поиска по категории типа ВС"""
+    profile: RuleProfile
+    service: np.ndarray  # длительность обслуживания по категории
+    road: np.ndarray  # время дороги по категории
+
+    def categories(self, ac_types: Sequence[str]) -> np.ndarray:
+        """Категория (SMS/DMS) для каждого рейса; типы сопоставляются один раз на уникальное значение"""
+        if len(ac_types) == 0:
+            return np.zeros(0, dtype=np.int64)
+        unique, inverse = np.unique(np.asarray(ac_types, dtype=str), return_inverse=True)
+        dms_types = self.profile.dms_types
+        lookup = np.fromiter(
+            (DMS if t.upper() in dms_types else SMS for t in unique), dtype=np.int64, count=len(unique)
+        )
+        return lookup[inverse]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_profile(profile: RuleProfile) -> CompiledProfile:
+    return CompiledProfile(
+        profile=profile,
+        service=np.array([profile.service_sms, profile.service_dms], dtype=np.int64),
+        road=np.array([profile.road_sms, profile.road_dms], dtype=np.int64),
+    )
+
+
+def derive_timings(
+    ac_types: Sequence[str],
+    std_min: Iterable[int],
+    profile: RuleProfile = DEFAULT_PROFILE,
+) -> Dict[str, np.ndarray]:
+    """Времена ТГ для массивов типов ВС и STD одним проходом (та же формула, что derive_from_std)"""
+    compiled = compile_profile(profile)
+    std = np.asarray(std_min, dtype=np.int64)
+    category = compiled.categories(ac_types)
+    road = compiled.road[category]
+
+    # Окончание обслуживания = отъезд от ВС
+    service_end = std - profile.leave_before_std
+    service_start = service_end - compiled.service[category]
+    kitchen_out = service_start - road
+    unload_end = service_end + road
+
+    def clamp(values: np.ndarray) -> np.ndarray:
+        return np.clip(values, profile.day_start, profile.day_end)
+
+    service_start = clamp(service_start)
+    service_end = clamp(service_end)
+    return {
+        "kitchenOut": clamp(kitchen_out),
+        "serviceStart": service_start,
+        "serviceEnd": service_end,
+        "unloadEnd": clamp(unload_end),
+        # Для визуализации используем только время обслуживания самолета
+        "loadStart": service_start,
+        "loadEnd": service_end,
+        # Категория типа ВС: тип рейса меняется вместе с dms_types профиля
+        "dms": category == DMS,
+    }
+
+
+def fill_records(records: List[Dict[str, Any]], profile: RuleProfile = DEFAULT_PROFILE) -> None:
+    """Дописывает времена ТГ в пакет словарей полей рейса (acType, stdMin)"""
+    if not records:
+        return
+    timings = derive_timings([r["acType"] for r in records], [r["stdMin"] for r in records], profile)
+    columns = {name: values.tolist() for name, values in timings.items()}
+    for i, record in enumerate(records):
+        for name in TIMING_FIELDS:
+            record[name] = columns[name][i]
+
+
+class TimingEngine:
+    """Активный профиль правил и кеш рассчитанных времен по (профиль, версия рейсов)"""
+
+    def __init__(self, profile: RuleProfile = DEFAULT_PROFILE) -> None:
+        self.profile = profile
+        self._cache: "OrderedDict[Tuple[RuleProfile, int], Tuple[List[str], Dict[str, np.ndarray]]]" = OrderedDict()
+        self._lock = Lock()
+
+    def set_profile(self, profile: RuleProfile) -> None:
+        self.profile = profile
+
+    def timings(
+        self,
+        flights: Collection,
+        profile: Optional[RuleProfile] = None,
+    ) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """Ключи рейсов и массивы времен для всей коллекции (из кеша, если версия не менялась)"""
+        profile = profile or self.profile
+        snapshot = flights.snapshot()
+        cache_key = (profile, snapshot.version)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+        items = snapshot.all()
+        keys = [flights.key_of(f) for f in items]
+        result = (keys, derive_timings([f.acType for f in items], [f.stdMin for f in items], profile))
+        self._remember(cache_key, result)
+        return result
+
+    def rederive(self, flights: Collection, profile: Optional[RuleProfile] = None) -> int:
+        """Пересчитывает времена и тип рейсов коллекции; меняет только отличающиеся, одна версия на пакет"""
+        profile = profile or self.profile
+        keys, timings = self.timings(flights, profile)
+        current = {flights.key_of(f): f for f in flights.all()}
+        columns = {name: values.tolist() for name, values in timings.items()}
+        changes: Dict[str, Dict[str, Any]] = {}
+        for i, key in enumerate(keys):
+            flight = current.get(key)
+            if flight is None:
+                continue
+            diff = {
+                name: columns[name][i]
+                for name in TIMING_FIELDS
+                if getattr(flight, name) != columns[name][i]
+            }
+            flight_type = FlightType.DMS if columns["dms"][i] else FlightType.SMS
+            if flight.type != flight_type:
+                diff["type"] = flight_type
+            if diff:
+                changes[key] = diff
+        updated = flights.update_many(changes) if changes else 0
+        if updated:
+            # После обновления коллекция совпадает с расчетом - запоминаем под новой версией
+            self._remember((profile, flights.version), (keys, timings))
+        return updated
+
+    def _remember(self, cache_key: Tuple[RuleProfile, int], value: Tuple[List[str], Dict[str, np.ndarray]]) -> None:
+        with self._lock:
+            self._cache[cache_key] = value
+            self._cache.move_to_end(cache_key)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+
+# Общий движок приложения: активный профиль используется и при импорте рейсов
+engine = TimingEngine()
@@ -0,0 +1,360 @@
+"""
+Легковесная трассировка запросов вложенными интервалами (spans).
+
+Текущий интервал хранится в contextvars, поэтому вложенность сохраняется и
+в пуле потоков (run_in_threadpool копирует контекст). Идентификатор трассы
+берется из заголовка traceparent / X-Trace-Id или создается заново и
+возвращается клиенту в X-Trace-Id. Завершенные интервалы пишутся JSON-
+строками в файл с ротацией через очередь (запись не блокирует запрос) и
+хранятся в кольцевом буфере для GET /traces и экспорта в формат Chrome
+trace (chrome://tracing, Perfetto).
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+# Сколько завершенных интервалов держать в памяти
+BUFFER_SIZE = 20000
+
+# Абсолютное время в микросекундах из монотонных часов
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+def now_us() -> int:
+    return (time.perf_counter_ns() + _EPOCH_OFFSET_NS) // 1000
+
+
+class Span:
+    """Интервал трассы; end() завершает его и передает на экспорт"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "start_us", "end_us",
+                 "attrs", "error", "thread", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 attrs: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_us = now_us()
+        self.end_us: Optional[int] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+        self._token: Optional[contextvars.Token] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def end(self) -> None:
+        if self.end_us is not None:
+            return
+        self.end_us = now_us()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Завершение в другом контексте: текущий интервал там не наш
+                pass
+            self._token = None
+        self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end_us = self.end_us if self.end_us is not None else now_us()
+        data = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_us": self.start_us,
+            "duration_us": end_us - self.start_us,
+            "thread": self.thread,
+            "attrs": dict(self.attrs),
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("aeromar_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class Tracer:
+    """Создание интервалов, экспорт в файл JSONL с ротацией и буфер последних интервалов"""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.path: Optional[str] = None
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=BUFFER_SIZE)
+        self._logger = logging.getLogger("aeromar.trace")
+        self._logger.propagate = False
+        self._listener: Optional[QueueListener] = None
+
+    def configure(self, enabled: bool, path: str = "", max_bytes: int = 10_000_000, backups: int = 5) -> None:
+        """Включает трассировку; path - файл JSONL (пусто - только буфер в памяти)"""
+        self.shutdown()
+        self.enabled = enabled
+        self.path = path or None
+        if not enabled or not path:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        records: "queue.Queue[logging.LogRecord]" = queue.Queue()
+        self._logger.handlers = [QueueHandler(records)]
+        self._logger.setLevel(logging.INFO)
+        self._listener = QueueListener(records, file_handler)
+        self._listener.start()
+
+    def shutdown(self) -> None:
+        """Дописывает очередь в файл и закрывает его"""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        self._logger.handlers = []
+
+    def start(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+              **attrs: Any) -> Optional[Span]:
+        """Открывает интервал и делает его текущим; None, если трассировка выключена"""
+        if not self.enabled:
+            return None
+        parent = _current.get()
+        if trace_id is None:
+            trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+            parent_id = parent.span_id if parent is not None else parent_id
+        span = Span(self, name, trace_id, parent_id, attrs)
+        span._token = _current.set(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        span = self.start(name, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            if span is not None:
+                span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if span is not None:
+                span.end()
+
+    def record(self, name: str, parent: Span, start_us: int, end_us: int, **attrs: Any) -> None:
+        """Дочерний интервал по известным временам (фазы, измеренные метками)"""
+        if end_us <= start_us:
+            return
+        span = Span(self, name, parent.trace_id, parent.span_id, attrs)
+        span.start_us = start_us
+        span.end_us = end_us
+        self.export(span)
+
+    def export(self, span: Span) -> None:
+        data = span.to_dict()
+        self._recent.append(data)
+        if self._logger.handlers:
+            self._logger.info(json.dumps(data, ensure_ascii=False, default=str))
+
+    def recent_traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Последние корневые интервалы (по одному на трассу)"""
+        roots = [s for s in list(self._recent) if s["parent_id"] is None]
+        return [
+            {"trace_id": s["trace_id"], "name": s["name"], "start_us": s["start_us"],
+             "duration_us": s["duration_us"], "attrs": s["attrs"]}
+            for s in roots[-limit:][::-1]
+        ]
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        spans = [s for s in list(self._recent) if s["trace_id"] == trace_id]
+        return sorted(spans, key=lambda s: s["start_us"])
+
+
+def chrome_trace(spans: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Интервалы в формате Chrome trace (события "X" с длительностью, время в мкс)"""
+    threads: Dict[str, int] = {}
+    events = []
+    for span in spans:
+        tid = threads.setdefault(span.get("thread", ""), len(threads) + 1)
+        args = dict(span.get("attrs") or {})
+        args["span_id"] = span["span_id"]
+        if span.get("error"):
+            args["error"] = span["error"]
+        events.append({
+            "name": span["name"],
+            "cat": span["name"].split(".", 1)[0],
+            "ph": "X",
+            "ts": span["start_us"],
+            "dur": span["duration_us"],
+            "pid": 1,
+            "tid": tid,
+            "args": args,
+        })
+    events.extend(
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+        for name, tid in threads.items()
+    )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _incoming_trace(headers: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+    """(trace_id, parent_id) из traceparent (W3C) или X-Trace-Id"""
+    traceparent = headers.get("traceparent", "")
+    parts = traceparent.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    trace_id = headers.get("x-trace-id", "").strip()
+    if trace_id and len(trace_id) <= 64 and all(c.isalnum() or c in "-_" for c in trace_id):
+        return trace_id, None
+    return None, None
+
+
+class TracingMiddleware:
+    """ASGI-middleware: корневой интервал запроса и заголовок X-Trace-Id в ответе"""
+
+    def __init__(self, app: Any, tracer: "Tracer", exclude: Iterable[str] = ("/metrics", "/traces")) -> None:
+        self.app = app
+        self.tracer = tracer
+        # Префиксы служебных путей, которые не трассируются
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self.tracer.enabled or scope.get("path", "").startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        trace_id, parent_id = _incoming_trace(headers)
+        method = scope.get("method", "")
+        # Корневой интервал запроса - без родителя в этом процессе
+        span = self.tracer.start(f"http {method}", trace_id=trace_id or secrets.token_hex(16),
+                                 method=method, path=scope.get("path", ""))
+        if parent_id:
+            span.attrs["remote_parent_id"] = parent_id
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                span.attrs["status"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", span.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.name = f"http {method} {route}"
+            span.end()
+
+
+def _traced_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    """Обертка функции маршрута: отмечает начало и конец работы обработчика"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def traced_async(*args: Any, **kwargs: Any) -> Any:
+            span = current_span()
+            if span is not None:
+                span.attrs["_endpoint_start"] = now_us()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                if span is not None:
+                    span.attrs["_endpoint_end"] = now_us()
+        wrapped: Callable[..., Any] = traced_async
+    else:
+        @functools.wraps(call)
+        def traced_sync(*args: Any, **kwargs: Any) -> Any:
+            span = current_span()
+            if span is not None:
+                span.attrs["_endpoint_start"] = now_us()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                if span is not None:
+                    span.attrs["_endpoint_end"] = now_us()
+        wrapped = traced_sync
+    wrapped._aeromar_traced = True  # type: ignore[attr-defined]
+    return wrapped
+
+
+class TracedRoute(APIRoute):
+    """
+    Маршрут с интервалами route.decode (тело и зависимости), route.endpoint
+    (обработчик) и route.serialize (валидация и сериализация ответа).
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        if not getattr(self.dependant.call, "_aeromar_traced", False):
+            self.dependant.call = _traced_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def traced_handler(request: Request) -> Response:
+            span = tracer.start("route", route=path)
+            if span is None:
+                return await handler(request)
+            try:
+                return await handler(request)
+            except BaseException as e:
+                span.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                started = span.attrs.pop("_endpoint_start", None)
+                finished = span.attrs.pop("_endpoint_end", None)
+                span.end()
+                if started is not None and finished is not None:
+                    tracer.record("route.decode", span, span.start_us, started)
+                    tracer.record("route.endpoint", span, started, finished)
+                    tracer.record("route.serialize", span, finished, span.end_us)
+
+        return traced_handler
+
+
+# Общий трассировщик приложения (настраивается в main)
+tracer = Tracer()
+
+
+def _main(argv: List[str]) -> int:
+    """python -m app.services.tracing spans.jsonl [trace_id] > trace.json"""
+    if not argv:
+        print(_main.__doc__, file=sys.stderr)
+        return 2
+    trace_id = argv[1] if len(argv) > 1 else None
+    spans = []
+    with open(argv[0], encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                if trace_id is None or span["trace_id"] == trace_id:
+                    spans.append(span)
+    json.dump(chrome_trace(spans), sys.stdout, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+"""
+Прогрев планировщика после импорта рейсов.
+
+Сразу после импорта фоновый поток планирует новое расписание заранее
+(спекулятивный план) и хранит результат под ключом входных данных: версии
+рейсов, машин, водителей и схемы перрона. Первый запрос планирования с тем же
+ключом забирает готовый результат; если прогрев еще идет - дожидается его,
+а не запускает второй расчет. Новый импорт отменяет прогрев, который еще не
+начался; результат устаревшего прогрева отбрасывается.
+
+Перед планом тот же поток выполняет подготовительные задачи (prepare) -
+производные данные, которые кешируются у вызывающего по версии входных
+данных (проверка плана правилами ТГ по версии рейсов и профилю правил).
+
+Результат выдается один раз: ID скобок в нем случайные, и два запроса не
+должны получить один и тот же план.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+PlanResult = Dict[str, Any]
+
+
+class PlanWarmup:
+    """Спекулятивный план для текущих входных данных"""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-warmup")
+        self._lock = Lock()
+        self._key: Optional[Hashable] = None
+        self._future: Optional[Future] = None
+
+    def start(
+        self, key: Hashable, plan: Callable[[], PlanResult], prepare: Sequence[Callable[[], Any]] = ()
+    ) -> None:
+        """Запускает прогрев для key (сначала prepare, затем план); прежний прогрев больше не нужен"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._future is not None:
+                self._future.cancel()
+            self._key = key
+            self._future = self._executor.submit(self._run, key, plan, prepare)
+
+    def _run(self, key: Hashable, plan: Callable[[], PlanResult], prepare: Sequence[Callable[[], Any]]) -> PlanResult:
+        for task in prepare:
+            try:
+                task()
+            except Exception as e:
+                logger.warning("Подготовка при прогреве не выполнена: %s", e)
+        started = time.perf_counter()
+        result = plan()
+        logger.info(
+            "Прогрев плана: скобок %d за %.2f с", len(result.get("brackets", [])), time.perf_counter() - started,
+            extra={"warmup_key": repr(key)},
+        )
+        return result
+
+    async def take(self, key: Hashable) -> Optional[PlanResult]:
+        """Готовый или почти готовый план для key (один раз); None - прогрева для key нет"""
+        with self._lock:
+            if self._key != key or self._future is None or self._future.cancelled():
+                return None
+            future = self._future
+            self._key = None
+            self._future = None
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            logger.warning("Прогрев плана завершился ошибкой, планируем заново: %s", e)
+            return None
+
+    def discard(self) -> None:
+        with self._lock:
+            if self._future is not None:
+                self._future.cancel()
+            self._key = None
+            self._future = None
+
+    def shutdown(self) -> None:
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
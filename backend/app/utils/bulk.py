@@ -0,0 +1,44 @@
+"""
+Пакетное построение и сериализация списков моделей.
+
+TypeAdapter(List[Model]) проверяет и сериализует весь список одним вызовом
+pydantic-core. Построение при этом не быстрее Model(**fields) по одному: на
+50 тыс. рейсов оба варианта ~0.55 с, а model_construct в pydantic 2 еще
+медленнее (~1 с, заполняет поля на Python) - замер tools/bench_bulk.py.
+Адаптер нужен как единый путь проверки для недоверенного ввода (CSV, тело
+запроса) и данных из собственной базы. Выигрыш дает сериализация: готовое
+тело dump_json_many отдается примерно в 4 раза быстрее, чем повторная
+проверка и сериализация через response_model (~120 мс против ~460 мс).
+"""
+from functools import lru_cache
+from typing import Any, Iterable, List, Sequence, Type, TypeVar, Union
+
+from pydantic import BaseModel, TypeAdapter
+
+T = TypeVar("T", bound=BaseModel)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type[T]) -> TypeAdapter:
+    """Адаптер списка моделей (схема строится один раз на модель)"""
+    return TypeAdapter(List[model])
+
+
+def validate_many(model: Type[T], records: Iterable[Any]) -> List[T]:
+    """Модели из словарей полей одним вызовом проверки"""
+    return list_adapter(model).validate_python(records if isinstance(records, list) else list(records))
+
+
+def validate_json_many(model: Type[T], data: Union[bytes, str]) -> List[T]:
+    """Модели из JSON-массива без промежуточных словарей"""
+    return list_adapter(model).validate_json(data)
+
+
+def validate_json_documents(model: Type[T], documents: Sequence[str]) -> List[T]:
+    """Модели из отдельных JSON-документов (строк таблицы) одним разбором"""
+    return validate_json_many(model, "[" + ",".join(documents) + "]")
+
+
+def dump_json_many(model: Type[T], items: Sequence[T]) -> bytes:
+    """JSON-массив списка моделей"""
+    return list_adapter(model).dump_json(items)
@@ -0,0 +1,228 @@
+"""
+Словарь и список из кусков для копирования при записи.
+
+Опубликованная версия не меняется; правка идет через редактор, который
+копирует список кусков и только затронутые куски, остальные остаются общими
+со старой версией. Размер куска растет с числом элементов (около sqrt(n)),
+поэтому правка стоит O(sqrt n) копирований ссылок вместо O(n) при копировании
+целого dict или list, а сборка с нуля - обычное заполнение словарей.
+"""
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Минимальный размер куска: маленькие коллекции живут в одном куске
+MIN_CHUNK = 64
+
+
+def _chunk_count(size: int) -> int:
+    """Число кусков словаря (степень двойки, около sqrt(size))"""
+    count = 1
+    while count * count * 4 < size and size // (count * 2) >= MIN_CHUNK:
+        count *= 2
+    return count
+
+
+def _chunk_length(size: int) -> int:
+    """Длина куска списка (около sqrt(size), не меньше MIN_CHUNK)"""
+    length = MIN_CHUNK
+    while length * length < size:
+        length *= 2
+    return length
+
+
+class ChunkedMap:
+    """Неизменяемый словарь из кусков по хешу ключа; порядок обхода не определен"""
+    __slots__ = ("_chunks", "_mask", "_size")
+
+    def __init__(self, chunks: Tuple[Dict[Hashable, Any], ...] = ({},), size: int = 0) -> None:
+        self._chunks = chunks
+        self._mask = len(chunks) - 1
+        self._size = size
+
+    @classmethod
+    def build(cls, pairs: Any) -> "ChunkedMap":
+        """Словарь из dict или последовательности (key, value); dict не копируется, если хватает одного куска"""
+        source = pairs if isinstance(pairs, dict) else dict(pairs)
+        count = _chunk_count(len(source))
+        if count == 1:
+            return cls((source,), len(source))
+        chunks: List[Dict[Hashable, Any]] = [{} for _ in range(count)]
+        mask = count - 1
+        for key, value in source.items():
+            chunks[hash(key) & mask][key] = value
+        return cls(tuple(chunks), len(source))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._chunks[hash(key) & self._mask]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        return self._chunks[hash(key) & self._mask].get(key, default)
+
+    def get_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        """Значения для ключей (все ключи должны быть в словаре)"""
+        chunks, mask = self._chunks, self._mask
+        if mask == 0:
+            chunk = chunks[0]
+            return [chunk[key] for key in keys]
+        return [chunks[hash(key) & mask][key] for key in keys]
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        for chunk in self._chunks:
+            yield from chunk.items()
+
+    def values(self) -> Iterator[Any]:
+        for chunk in self._chunks:
+            yield from chunk.values()
+
+    def editor(self) -> "MapEditor":
+        return MapEditor(self)
+
+
+class MapEditor:
+    """Правка ChunkedMap: затронутые куски копируются один раз, freeze() дает новую версию"""
+    __slots__ = ("_base", "_chunks", "_mask", "_size", "_owned")
+
+    def __init__(self, base: ChunkedMap) -> None:
+        self._base = base
+        self._chunks: Optional[List[Dict[Hashable, Any]]] = None
+        self._mask = base._mask
+        self._size = base._size
+        self._owned: set = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Hashable) -> bool:
+        chunks = self._chunks if self._chunks is not None else self._base._chunks
+        return key in chunks[hash(key) & self._mask]
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        chunks = self._chunks if self._chunks is not None else self._base._chunks
+        return chunks[hash(key) & self._mask].get(key, default)
+
+    def _chunk(self, key: Hashable) -> Dict[Hashable, Any]:
+        if self._chunks is None:
+            self._chunks = list(self._base._chunks)
+        index = hash(key) & self._mask
+        if index not in self._owned:
+            self._chunks[index] = dict(self._chunks[index])
+            self._owned.add(index)
+        return self._chunks[index]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        chunk = self._chunk(key)
+        if key not in chunk:
+            self._size += 1
+        chunk[key] = value
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key not in self:
+            return default
+        self._size -= 1
+        return self._chunk(key).pop(key)
+
+    def freeze(self) -> ChunkedMap:
+        if self._chunks is None:
+            return self._base
+        count = len(self._chunks)
+        target = _chunk_count(self._size)
+        if target > count * 2 or target * 4 < count:
+            # Размер сильно изменился - куски пересобираются (амортизированно O(1) на правку)
+            merged: Dict[Hashable, Any] = {}
+            for chunk in self._chunks:
+                merged.update(chunk)
+            return ChunkedMap.build(merged)
+        return ChunkedMap(tuple(self._chunks), self._size)
+
+
+class ChunkedList:
+    """Неизменяемый список из кусков равной длины"""
+    __slots__ = ("_chunks", "_length", "_size")
+
+    def __init__(self, chunks: Tuple[List[Any], ...] = (), length: int = MIN_CHUNK, size: int = 0) -> None:
+        self._chunks = chunks
+        self._length = length
+        self._size = size
+
+    @classmethod
+    def build(cls, values: Iterable[Any]) -> "ChunkedList":
+        items = list(values)
+        length = _chunk_length(len(items))
+        chunks = tuple(items[i:i + length] for i in range(0, len(items), length))
+        return cls(chunks, length, len(items))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Any:
+        return self._chunks[index // self._length][index % self._length]
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def take(self, indexes: Iterable[int]) -> List[Any]:
+        """Элементы по списку индексов"""
+        chunks, length = self._chunks, self._length
+        return [chunks[index // length][index % length] for index in indexes]
+
+    def editor(self) -> "ListEditor":
+        return ListEditor(self)
+
+
+class ListEditor:
+    """Правка ChunkedList: замена элементов и добавление в конец"""
+    __slots__ = ("_base", "_chunks", "_length", "_size", "_owned")
+
+    def __init__(self, base: ChunkedList) -> None:
+        self._base = base
+        self._chunks: Optional[List[List[Any]]] = None
+        self._length = base._length
+        self._size = base._size
+        self._owned: set = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Any:
+        chunks = self._chunks if self._chunks is not None else self._base._chunks
+        return chunks[index // self._length][index % self._length]
+
+    def _chunk(self, number: int) -> List[Any]:
+        if self._chunks is None:
+            self._chunks = list(self._base._chunks)
+        if number not in self._owned:
+            self._chunks[number] = list(self._chunks[number])
+            self._owned.add(number)
+        return self._chunks[number]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        self._chunk(index // self._length)[index % self._length] = value
+
+    def append(self, value: Any) -> None:
+        number = self._size // self._length
+        if self._chunks is None:
+            self._chunks = list(self._base._chunks)
+        if number == len(self._chunks):
+            self._chunks.append([])
+            self._owned.add(number)
+        self._chunk(number).append(value)
+        self._size += 1
+
+    def freeze(self) -> ChunkedList:
+        if self._chunks is None:
+            return self._base
+        if _chunk_length(self._size) > self._length * 2:
+            return ChunkedList.build(value for chunk in self._chunks for value in chunk)
+        return ChunkedList(tuple(self._chunks), self._length, self._size)
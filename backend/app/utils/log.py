@@ -0,0 +1,156 @@
+"""
+Структурное логирование приложения.
+
+Все модули пишут в логгеры logging.getLogger(__name__) с ленивым
+форматированием (logger.debug("... %s", value)): при выключенном уровне
+строка не собирается. configure_logging вешает на логгер "app" один
+обработчик - JSON-строка на запись (или текст), уровни задаются по модулям,
+а однотипные сообщения ниже WARNING ограничиваются по частоте: не больше
+rate записей в секунду на шаблон, число пропущенных попадает в следующую
+запись (поле suppressed).
+"""
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, Optional, TextIO, Tuple
+
+ROOT_LOGGER = "app"
+
+# Сколько шаблонов сообщений отслеживать в ограничителе частоты
+MAX_TRACKED_TEMPLATES = 10000
+
+# Стандартные атрибуты LogRecord; все остальное - структурные поля из extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: ts, level, logger, msg и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data.update(_fields(record))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Читаемый формат для локальной разработки: поля из extra дописываются как key=value"""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не больше rate записей в секунду на шаблон сообщения (логгер + msg до
+    подстановки аргументов). WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, rate: float, level: int = logging.WARNING) -> None:
+        super().__init__()
+        self.rate = rate
+        self.level = level
+        # Шаблон -> (начало окна, записей в окне, пропущено)
+        self._windows: Dict[Tuple[str, Any], Tuple[float, int, int]] = {}
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= self.level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - started >= 1.0:
+                if suppressed:
+                    record.suppressed = suppressed
+                started, count, suppressed = now, 0, 0
+            allowed = count < self.rate
+            if allowed:
+                count += 1
+            else:
+                suppressed += 1
+            if len(self._windows) >= MAX_TRACKED_TEMPLATES and key not in self._windows:
+                self._windows.clear()
+            self._windows[key] = (started, count, suppressed)
+        return allowed
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'services.bracket_scheduler=DEBUG,api=WARNING' -> {логгер: уровень}"""
+    levels: Dict[str, str] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, sep, level = part.partition("=")
+        if not sep:
+            raise ValueError(f"Ожидается модуль=УРОВЕНЬ, получено: {part!r}")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def set_levels(levels: Dict[str, str]) -> Dict[str, str]:
+    """Уровни логгеров модулей (имена без префикса app дополняются им)"""
+    applied: Dict[str, str] = {}
+    for name, level in levels.items():
+        if not isinstance(logging.getLevelName(level.upper()), int):
+            raise ValueError(f"Неизвестный уровень логирования: {level}")
+        full = name if name == ROOT_LOGGER or name.startswith(ROOT_LOGGER + ".") else f"{ROOT_LOGGER}.{name}"
+        logging.getLogger(full).setLevel(level.upper())
+        applied[full] = level.upper()
+    return applied
+
+
+def current_levels() -> Dict[str, str]:
+    """Явно заданные уровни логгеров приложения"""
+    loggers = logging.Logger.manager.loggerDict
+    return {
+        name: logging.getLevelName(logger.level)
+        for name, logger in sorted(loggers.items())
+        if isinstance(logger, logging.Logger)
+        and (name == ROOT_LOGGER or name.startswith(ROOT_LOGGER + "."))
+        and logger.level != logging.NOTSET
+    }
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    module_levels: str = "",
+    rate: float = 20.0,
+    stream: Optional[TextIO] = None,
+) -> logging.Logger:
+    """Настраивает логгер приложения (повторный вызов заменяет обработчик)"""
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        if getattr(handler, "_aeromar", False):
+            root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler.addFilter(RateLimitFilter(rate))
+    handler._aeromar = True  # type: ignore[attr-defined]
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    root.propagate = False
+    set_levels(parse_levels(module_levels))
+    return root
@@ -0,0 +1,187 @@
+"""
+Неизменяемый словарь со структурным разделением (HAMT).
+
+Ключи раскладываются по префиксному дереву по 5 бит хеша на уровень, узел -
+кортеж из 32 ячеек. Изменение копирует только путь от корня до листа
+(log32 n узлов), остальное дерево общее со старой версией. Поэтому хранить
+много версий дешево, а сравнение двух версий (diff) пропускает общие
+поддеревья по ссылке и стоит пропорционально числу различий.
+
+Хеши строк случайны между процессами - дерево живет только в памяти процесса.
+"""
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_HASH_MASK = (1 << 64) - 1
+_EMPTY: Tuple[Any, ...] = (None,) * _WIDTH
+
+
+class _Leaf:
+    __slots__ = ("hash", "key", "value")
+
+    def __init__(self, hash_: int, key: Hashable, value: Any) -> None:
+        self.hash = hash_
+        self.key = key
+        self.value = value
+
+
+class _Collision:
+    """Ключи с одинаковым полным хешем"""
+    __slots__ = ("hash", "items")
+
+    def __init__(self, hash_: int, items: Tuple[Tuple[Hashable, Any], ...]) -> None:
+        self.hash = hash_
+        self.items = items
+
+
+def _hash(key: Hashable) -> int:
+    return hash(key) & _HASH_MASK
+
+
+def _merge(a: Any, b: Any, shift: int) -> Tuple[Any, ...]:
+    """Узел с двумя записями разных хешей, совпавших до уровня shift"""
+    ia = (a.hash >> shift) & _MASK
+    ib = (b.hash >> shift) & _MASK
+    if ia == ib:
+        child = _merge(a, b, shift + _BITS)
+        return _EMPTY[:ia] + (child,) + _EMPTY[ia + 1:]
+    node = list(_EMPTY)
+    node[ia] = a
+    node[ib] = b
+    return tuple(node)
+
+
+def _set(node: Tuple[Any, ...], shift: int, h: int, key: Hashable, value: Any) -> Tuple[Tuple[Any, ...], bool]:
+    """Новый узел с key=value и признак добавления ключа; тот же узел - значение не изменилось"""
+    index = (h >> shift) & _MASK
+    slot = node[index]
+    added = False
+    if slot is None:
+        new = _Leaf(h, key, value)
+        added = True
+    elif type(slot) is tuple:
+        new, added = _set(slot, shift + _BITS, h, key, value)
+        if new is slot:
+            return node, False
+    elif type(slot) is _Leaf:
+        if slot.key == key:
+            if slot.value is value or slot.value == value:
+                return node, False
+            new = _Leaf(h, key, value)
+        elif slot.hash == h:
+            new = _Collision(h, ((slot.key, slot.value), (key, value)))
+            added = True
+        else:
+            new = _merge(slot, _Leaf(h, key, value), shift + _BITS)
+            added = True
+    elif slot.hash == h:
+        items = [(k, v) for k, v in slot.items if k != key]
+        added = len(items) == len(slot.items)
+        new = _Collision(h, tuple(items) + ((key, value),))
+    else:
+        new = _merge(slot, _Leaf(h, key, value), shift + _BITS)
+        added = True
+    return node[:index] + (new,) + node[index + 1:], added
+
+
+def _entries(slot: Any) -> Iterator[Tuple[Hashable, Any]]:
+    if slot is None:
+        return
+    if type(slot) is tuple:
+        for child in slot:
+            yield from _entries(child)
+    elif type(slot) is _Leaf:
+        yield slot.key, slot.value
+    else:
+        yield from slot.items
+
+
+def _diff(a: Any, b: Any, out: Dict[Hashable, Tuple[Any, Any]], missing: Any) -> None:
+    if a is b:
+        return
+    if type(a) is tuple and type(b) is tuple:
+        for sa, sb in zip(a, b):
+            if sa is not sb:
+                _diff(sa, sb, out, missing)
+        return
+    left = dict(_entries(a))
+    right = dict(_entries(b))
+    for key, value in left.items():
+        other = right.pop(key, missing)
+        if other is missing or not (other is value or other == value):
+            out[key] = (value, other)
+    for key, value in right.items():
+        out[key] = (missing, value)
+
+
+class PersistentMap:
+    """Неизменяемый словарь: set/update возвращают новую версию, делящую структуру со старой"""
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, root: Tuple[Any, ...] = _EMPTY, size: int = 0) -> None:
+        self._root = root
+        self._size = size
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[Hashable, Any]]) -> "PersistentMap":
+        return cls().update(items)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _EMPTY) is not _EMPTY
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return (key for key, _ in _entries(self._root))
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        return _entries(self._root)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        h = _hash(key)
+        node = self._root
+        shift = 0
+        while True:
+            slot = node[(h >> shift) & _MASK]
+            if slot is None:
+                return default
+            if type(slot) is tuple:
+                node = slot
+                shift += _BITS
+                continue
+            if type(slot) is _Leaf:
+                return slot.value if slot.key == key else default
+            for k, v in slot.items:
+                if k == key:
+                    return v
+            return default
+
+    def set(self, key: Hashable, value: Any) -> "PersistentMap":
+        root, added = _set(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return PersistentMap(root, self._size + added)
+
+    def update(self, items: Any) -> "PersistentMap":
+        """Новая версия с парами из словаря или последовательности (key, value)"""
+        pairs = items.items() if isinstance(items, dict) else items
+        root = self._root
+        size = self._size
+        for key, value in pairs:
+            root, added = _set(root, 0, _hash(key), key, value)
+            size += added
+        if root is self._root:
+            return self
+        return PersistentMap(root, size)
+
+    def diff(self, other: "PersistentMap", missing: Any = None) -> Dict[Hashable, Tuple[Any, Any]]:
+        """
+        Ключи с разными значениями: {ключ: (значение здесь, значение в other)};
+        отсутствующий ключ - missing. Общие поддеревья пропускаются по ссылке.
+        """
+        out: Dict[Hashable, Tuple[Any, Any]] = {}
+        _diff(self._root, other._root, out, missing)
+        return out
@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+
+from app.models.flight import Flight, FlightType
+from app.services.apron import TravelTimes
+from app.services.bracket_scheduler import BracketScheduler
+
+# Стоянки A и B рядом, C далеко, D не связана ни с одной
+TRAVEL = TravelTimes(
+    ["A", "B", "C", "D"],
+    np.array([
+        [0.0, 5.0, 15.0, math.inf],
+        [5.0, 0.0, 15.0, math.inf],
+        [15.0, 15.0, 0.0, math.inf],
+        [math.inf, math.inf, math.inf, 0.0],
+    ]),
+)
+
+
+def flight(no, service_start, stand):
+    return Flight(
+        id=no, flightNo=no, route="SVO-LED", acType="320", type=FlightType.SMS, stand=stand,
+        stdMin=service_start + 40, kitchenOut=service_start - 20, serviceStart=service_start,
+        serviceEnd=service_start + 30, unloadEnd=service_start + 40, loadStart=service_start - 60,
+        loadEnd=service_start - 30,
+    )
+
+
+def scheduler():
+    return BracketScheduler([], [], travel=TRAVEL)
+
+
+def test_longer_travel_scores_worse():
+    near = [flight("F1", 600, "A"), flight("F2", 650, "B"), flight("F3", 700, "A")]
+    far = [flight("F1", 600, "A"), flight("F2", 650, "C"), flight("F3", 700, "A")]
+
+    assert scheduler()._calculate_bracket_quality(near) < scheduler()._calculate_bracket_quality(far)
+
+
+def test_disconnected_stands_are_infeasible():
+    flights = [flight("F1", 600, "A"), flight("F2", 650, "D")]
+
+    assert not scheduler()._check_flight_intervals(flights)
+    assert scheduler()._calculate_bracket_quality(flights) == math.inf
+
+
+def test_short_travel_keeps_rule_minimum():
+    # Интервал 10 минут: переезд A-B 5 минут, но минимум ТГ 18 минут
+    flights = [flight("F1", 600, "A"), flight("F2", 640, "B")]
+
+    assert not scheduler()._check_flight_intervals(flights)
+    assert scheduler()._check_flight_intervals([flight("F1", 600, "A"), flight("F2", 650, "B")])
@@ -0,0 +1,30 @@
+from app.models.driver import Driver
+from app.models.flight import Flight, FlightType
+from app.services.change_log import UPSERT, ChangeLog
+from app.services.repository import Store
+
+
+def flight(no):
+    return Flight(
+        id=no, flightNo=no, route="SVO-LED", acType="320", type=FlightType.SMS, stdMin=600,
+        kitchenOut=500, serviceStart=560, serviceEnd=590, unloadEnd=600, loadStart=480, loadEnd=520,
+    )
+
+
+def test_changes_since_with_out_of_order_appends():
+    store = Store()
+    store.flights.replace_all([flight("F1"), flight("F2")])
+    store.drivers.replace_all([Driver(id="D1", full_name="Driver", shift_start=0, shift_end=480)])
+    log = ChangeLog()
+    log.attach(store, ("flights", "drivers"))
+    now = store.version
+
+    # Писатель drivers получил версию now-1 раньше flights (now), но дописал журнал позже
+    log._record("flights", "F1", now - 2, UPSERT)
+    log._record("flights", "F2", now, UPSERT)
+    log._record("drivers", "D1", now - 1, UPSERT)
+
+    changes = log.changes_since(now - 2)["changes"]
+    assert [f.id for f in changes["flights"]["upserted"]] == ["F2"]
+    assert [d.id for d in changes["drivers"]["upserted"]] == ["D1"]
+    assert list(log._entries) == [("flights", "F1"), ("drivers", "D1"), ("flights", "F2")]
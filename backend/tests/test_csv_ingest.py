@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from pydantic import BaseModel
+
+from app.services.csv_ingest import CHUNK_SIZE, IngestError, ingest_stream
+
+
+class Row(BaseModel):
+    code: str
+    name: str
+
+
+def row_mapper(header):
+    code, name = header.index("CODE"), header.index("NAME")
+    return lambda row: {"code": row[code], "name": row[name]}
+
+
+def ascii_rows(size):
+    lines = ["CODE;NAME"]
+    n = 0
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.append(f"R{n:06d};Driver {n}")
+        n += 1
+    return "\n".join(lines) + "\n"
+
+
+def test_cp1251_after_first_chunk():
+    text = ascii_rows(CHUNK_SIZE + 40 * 1024) + "X000001;Иванов Иван\n"
+    items, report = ingest_stream(io.BytesIO(text.encode("cp1251")), row_mapper, Row)
+
+    assert report.encoding == "cp1251"
+    assert report.error_count == 0
+    assert items[-1].name == "Иванов Иван"
+    assert len(items) == text.count("\n") - 1
+
+
+def test_utf8_after_first_chunk():
+    text = ascii_rows(CHUNK_SIZE + 40 * 1024) + "X000001;Иванов Иван\n"
+    items, report = ingest_stream(io.BytesIO(text.encode("utf-8")), row_mapper, Row)
+
+    assert report.encoding == "utf-8"
+    assert items[-1].name == "Иванов Иван"
+
+
+def test_mixed_encodings_rejected():
+    head = "CODE;NAME\nX000000;Петров\n" + ascii_rows(CHUNK_SIZE + 1024).split("\n", 1)[1]
+    data = head.encode("utf-8") + "X000001;Иванов\n".encode("cp1251")
+    with pytest.raises(IngestError):
+        ingest_stream(io.BytesIO(data), row_mapper, Row)
@@ -0,0 +1,75 @@
+import pytest
+
+from app.models.flight import Flight, FlightType
+from app.services import edit_history as edit_history_module
+from app.services.edit_history import EditHistory, EditHistoryError
+from app.services.repository import Store
+
+
+def flight(no, vehicle=""):
+    return Flight(
+        id=no, flightNo=no, route="SVO-LED", acType="320", type=FlightType.SMS, stdMin=600,
+        kitchenOut=500, serviceStart=560, serviceEnd=590, unloadEnd=600, loadStart=480, loadEnd=520,
+        vehicleId=vehicle, chainId=f"chain_{vehicle}" if vehicle else "",
+    )
+
+
+def setup(count=40):
+    store = Store()
+    store.flights.replace_all([flight(f"F{i}") for i in range(count)])
+    history = EditHistory()
+    history.attach(store.flights)
+    return store, history
+
+
+def edit(store, history, changes):
+    base = store.flights.snapshot()
+    store.flights.update_many(changes, expected=base)
+    history.record(base, store.flights.version, changes)
+
+
+def move(store, history, steps):
+    target, changes = history.plan_move(steps, store.flights.version)
+    store.flights.update_many(changes)
+    history.moved(target, store.flights.version)
+
+
+def vehicles(store):
+    return {f.id: f.vehicleId for f in store.flights if f.vehicleId}
+
+
+def test_undo_redo_across_import():
+    store, history = setup()
+    edit(store, history, {"F1": {"vehicleId": "M1", "chainId": "c1"}})
+    # Импорт заменяет рейсы целиком - прежняя история устарела
+    store.flights.replace_all([flight(f"F{i}", "M9" if i == 2 else "") for i in range(40)])
+    with pytest.raises(EditHistoryError):
+        history.plan_move(-1, store.flights.version)
+
+    history.prepare(store.flights.snapshot())
+    edit(store, history, {"F3": {"vehicleId": "M3", "chainId": "c3"}})
+    edit(store, history, {"F2": {"vehicleId": "", "chainId": ""}})
+    assert vehicles(store) == {"F3": "M3"}
+
+    move(store, history, -2)
+    assert vehicles(store) == {"F2": "M9"}
+    move(store, history, 1)
+    assert vehicles(store) == {"F2": "M9", "F3": "M3"}
+
+
+def test_foreign_write_rebases_without_rebuild(monkeypatch):
+    store, history = setup()
+    history.prepare(store.flights.snapshot())
+    edit(store, history, {"F1": {"vehicleId": "M1", "chainId": "c1"}})
+
+    rebuilds = []
+    build = edit_history_module._assignments
+    monkeypatch.setattr(edit_history_module, "_assignments", lambda flights: rebuilds.append(1) or build(flights))
+    # Запись помимо ручных правок (автопланирование одного рейса)
+    store.flights.update_many({"F5": {"vehicleId": "M5", "chainId": "c5"}})
+    assert not history.needs_prepare()
+    edit(store, history, {"F1": {"vehicleId": "", "chainId": ""}})
+
+    assert rebuilds == []
+    move(store, history, -1)
+    assert vehicles(store) == {"F1": "M1", "F5": "M5"}
@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+os.environ.setdefault("AEROMAR_PERSISTENCE", "0")
+
+from app.api import routes
+from app.models.flight import Flight, FlightType
+
+store = routes.store
+
+
+def flight(flight_id, flight_no="SU100"):
+    return Flight(
+        id=flight_id, flightNo=flight_no, route="SVO-LED", acType="320", type=FlightType.SMS, stdMin=600,
+        kitchenOut=500, serviceStart=560, serviceEnd=590, unloadEnd=600, loadStart=480, loadEnd=520,
+    )
+
+
+def test_update_flight_publishes_one_version():
+    store.flights.replace_all([flight("F1"), flight("F2", "SU200")])
+    seen = []
+    store.flights.subscribe(
+        lambda event, payload: seen.append((event, store.flights.version, {f.id for f in store.flights}))
+    )
+    before = store.flights.version
+
+    asyncio.run(routes.update_flight("F1", flight("F1-new", "SU101")))
+
+    assert store.flights.version == before + 1
+    # Оба события - одной версии, и ни в одной рейс не пропадает целиком
+    assert [event for event, _, _ in seen] == ["remove", "upsert"]
+    assert {version for _, version, _ in seen} == {store.flights.version}
+    assert all(ids == {"F1-new", "F2"} for _, _, ids in seen)
+    assert store.flights.get("F1") is None
+    assert store.flights.get("F1-new").flightNo == "SU101"
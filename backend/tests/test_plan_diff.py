@@ -0,0 +1,38 @@
+from app.services.plan_diff import diff_plans
+
+
+def bracket(bracket_id, driver, flights, start=600, end=800):
+    return {"id": bracket_id, "driverId": driver, "flights": flights, "startTime": start, "endTime": end}
+
+
+def test_diff_classifies_brackets_and_moved_flights():
+    old = [
+        bracket("a1", "D1", ["F1", "F2"]),
+        bracket("b1", "D2", ["F3"]),
+        bracket("c1", "D3", ["F4"]),
+    ]
+    new = [
+        bracket("a2", "D1", ["F1", "F2"]),
+        bracket("b2", "D4", ["F3"]),
+        bracket("e2", "D3", ["F4", "F5"], end=900),
+    ]
+
+    diff = diff_plans(old, new)
+
+    assert diff["summary"] == {"unchanged": 1, "added": 1, "removed": 1, "changed": 1, "movedFlights": 2}
+    assert diff["brackets"]["changed"] == [
+        {"from": "b1", "to": "b2", "flights": ["F3"], "changes": {"driverId": ["D2", "D4"]}}
+    ]
+    assert diff["flights"] == [
+        {"flightNo": "F4", "from": {"bracketId": "c1", "driverId": "D3"}, "to": {"bracketId": "e2", "driverId": "D3"}},
+        {"flightNo": "F5", "from": None, "to": {"bracketId": "e2", "driverId": "D3"}},
+    ]
+
+
+def test_identical_plans_have_no_changes():
+    plan = [bracket("a1", "D1", ["F1"]), bracket("b1", "D2", ["F2"])]
+
+    diff = diff_plans(plan, [dict(b, id=b["id"] + "x") for b in plan])
+
+    assert diff["summary"]["unchanged"] == 2
+    assert diff["flights"] == [] and diff["brackets"]["added"] == []
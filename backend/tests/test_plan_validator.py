@@ -0,0 +1,30 @@
+from app.models.flight import Flight, FlightType
+from app.models.validation import ViolationType
+from app.services.plan_validator import validate_plan
+
+
+def flight(no, std, vehicle, chain, flight_type=FlightType.SMS):
+    return Flight(
+        id=no, flightNo=no, route="SVO-LED", acType="320", type=flight_type, stdMin=std,
+        kitchenOut=std - 130, serviceStart=std - 100, serviceEnd=std - 70, unloadEnd=std - 60,
+        loadStart=std - 155, loadEnd=std - 120, vehicleId=vehicle, chainId=chain,
+    )
+
+
+def test_dms_bracket_takes_two_loading_windows():
+    sms_pair = [flight("F1", 600, "D1", "c1"), flight("F2", 600, "D2", "c2")]
+    dms_and_sms = [flight("F1", 600, "D1", "c1", FlightType.DMS), flight("F2", 600, "D2", "c2")]
+
+    assert validate_plan(sms_pair, 1, windows=2).counts[ViolationType.WINDOW_OVERLOAD] == 0
+    result = validate_plan(dms_and_sms, 1, windows=2)
+    assert result.counts[ViolationType.WINDOW_OVERLOAD] == 1
+    assert "занято 3 окон при 2" in result.violations[0].message
+
+
+def test_overlap_counts_are_a_lower_bound_on_pairs():
+    # Три взаимно пересекающиеся скобки одного водителя: 3 пары, сообщается 2
+    flights = [flight(f"F{i}", 600 + 10 * i, "D1", f"c{i}") for i in range(3)]
+
+    counts = validate_plan(flights, 1).counts
+    assert counts[ViolationType.DRIVER_DOUBLE_BOOKED] == 2
+    assert counts[ViolationType.LEAVE_TOO_LATE] == 0
@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+os.environ.setdefault("AEROMAR_PERSISTENCE", "0")
+os.environ.setdefault("AEROMAR_PLAN_WARMUP", "0")
+
+import httpx
+
+from app.api.routes import MAX_PLANS_PAGE
+from app.main import app
+
+
+def get(path):
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get(path)
+    return asyncio.run(run())
+
+
+def test_plans_limit_is_bounded():
+    assert get(f"/plans?limit={MAX_PLANS_PAGE + 1}").status_code == 422
+    assert get("/plans?limit=0").status_code == 422
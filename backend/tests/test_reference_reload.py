@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+os.environ.setdefault("AEROMAR_PERSISTENCE", "0")
+
+from app.api import routes
+from app.models.driver import Autolift, Driver
+from app.services.data_watcher import DataDirectoryWatcher
+from app.services.drivers_csv_parser import driver_row_mapper
+
+store = routes.store
+
+
+def test_drivers_reload_rebuilds_machines(tmp_path):
+    store.autolifts.replace_all([Autolift(id="AL135", number="135"), Autolift(id="AL140", number="140")])
+    store.drivers.replace_all([Driver(id="1", full_name="Old Driver", shift_start=0, shift_end=480)])
+    watcher = DataDirectoryWatcher(str(tmp_path), 0.01)
+    watcher.watch_file(
+        "drivers.csv",
+        routes._parse_with_machines(driver_row_mapper, Driver, store.drivers),
+        routes._swap_with_machines(store.drivers),
+    )
+    watcher.snapshot()
+    (tmp_path / "drivers.csv").write_text("DRIVER_ID;FULL_NAME\n7;Иванов Иван\n8;Петров Петр\n", encoding="utf-8")
+
+    async def reload():
+        # Файл применяется, когда его сигнатура не меняется два опроса подряд
+        await watcher.poll()
+        return await watcher.poll()
+
+    events = asyncio.run(reload())
+
+    assert [event.status for event in events] == ["ok"]
+    assert [d.full_name for d in store.drivers.all()] == ["Иванов Иван", "Петров Петр"]
+    assert {m.id: m.driver for m in store.machines.all()} == {"M135": "Иванов Иван", "M140": "Петров Петр"}
@@ -0,0 +1,59 @@
+import asyncio
+
+from app.models.flight import Flight, FlightType
+from app.services.persistence import PlanArchive
+from app.services.repository import Store
+from app.services.shared_state import SharedStateSync, table_reader
+
+
+def flight(no, vehicle=""):
+    return Flight(
+        id=no, flightNo=no, route="SVO-LED", acType="320", type=FlightType.SMS, stdMin=600,
+        kitchenOut=500, serviceStart=560, serviceEnd=590, unloadEnd=600, loadStart=480, loadEnd=520,
+        vehicleId=vehicle,
+    )
+
+
+def worker(path):
+    store = Store()
+    archive = PlanArchive(path)
+    archive.attach(store)
+    sync = SharedStateSync(interval=0)
+    sync.register(store.flights, table_reader("flights", PlanArchive.load_flights))
+    sync.bind(archive)
+    sync.remember("flights", 0)
+    return store, archive, sync
+
+
+def db_ids(archive):
+    return sorted(f.id for f in archive.load_flights())
+
+
+def test_second_writer_from_same_version_conflicts(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    store_a, archive_a, sync_a = worker(path)
+    store_b, archive_b, sync_b = worker(path)
+
+    async def run():
+        store_a.flights.replace_all([flight("F1"), flight("F2")])
+        assert await sync_a.flush() == []
+        # B еще не видел записи A и пишет от той же версии 0
+        store_b.flights.replace_all([flight("F9")])
+        assert await sync_b.flush() == ["flights"]
+        assert sorted(f.id for f in store_b.flights) == ["F1", "F2"]
+
+        # A заменяет рейсы целиком; ключевой upsert B от прежней версии не воскрешает F1
+        await sync_b.sync(force=True)
+        store_a.flights.replace_all([flight("F3")])
+        assert await sync_a.flush() == []
+        store_b.flights.update("F1", vehicleId="M1")
+        assert await sync_b.flush() == ["flights"]
+        assert [f.id for f in store_b.flights] == ["F3"]
+
+    try:
+        asyncio.run(run())
+        assert db_ids(archive_a) == ["F3"]
+        assert archive_a.read_versions()["flights"] == 2
+    finally:
+        archive_a.close()
+        archive_b.close()
@@ -0,0 +1,36 @@
+import asyncio
+
+from app.services.warmup import PlanWarmup
+
+
+def test_prepare_runs_before_plan_and_failures_do_not_block_it():
+    calls = []
+
+    def failing():
+        calls.append("failing")
+        raise RuntimeError("boom")
+
+    warmup = PlanWarmup()
+    try:
+        warmup.start(
+            ("flights", 7),
+            lambda: calls.append("plan") or {"brackets": [1]},
+            prepare=(failing, lambda: calls.append("validate")),
+        )
+        assert asyncio.run(warmup.take(("flights", 8))) is None
+        result = asyncio.run(warmup.take(("flights", 7)))
+    finally:
+        warmup.shutdown()
+
+    assert result == {"brackets": [1]}
+    assert calls == ["failing", "validate", "plan"]
+
+
+def test_warm_plan_is_handed_out_once():
+    warmup = PlanWarmup()
+    try:
+        warmup.start("key", lambda: {"brackets": []})
+        assert asyncio.run(warmup.take("key")) == {"brackets": []}
+        assert asyncio.run(warmup.take("key")) is None
+    finally:
+        warmup.shutdown()
@@ -0,0 +1,4 @@
+"""
+Служебные инструменты разработки (нагрузочный прогон и т.п.); запускаются из каталога backend:
+python -m tools.<модуль>
+"""
@@ -0,0 +1,102 @@
+"""
+Замер пакетного построения и сериализации рейсов.
+
+Сравнивает на N синтетических рейсах (по строкам test.csv):
+  построение  - Flight(**поля) по одному, model_construct и validate_many
+                (TypeAdapter над всем списком);
+  ответ       - маршрут с response_model=List[Flight] (проверка и
+                сериализация на выходе) и готовое тело из dump_json_many,
+                как у маршрутов записи через response_cache.send.
+Каждый вариант повторяется --repeat раз, в отчет идет лучшее время.
+
+    cd backend
+    python -m tools.bench_bulk --flights 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Response
+
+from app.models.flight import Flight
+from app.services.csv_parser import parse_csv
+from app.utils.bulk import dump_json_many, validate_many
+
+from .loadtest import DEFAULT_CSV
+
+
+def _flight_records(count: int, path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    header, rows = lines[0], [line for line in lines[1:] if line.strip()]
+    text = "\n".join([header] + (rows * (count // len(rows) + 1))[:count]) + "\n"
+    return [flight.model_dump() for flight in parse_csv(text)]
+
+
+def _best(repeat: int, run: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 1)
+
+
+def _echo_app(flights: List[Flight]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=List[Flight])
+    async def validated():
+        return flights
+
+    @app.get("/prebuilt", response_model=List[Flight])
+    async def prebuilt():
+        return Response(content=dump_json_many(Flight, flights), media_type="application/json")
+
+    return app
+
+
+async def _echo_times(flights: List[Flight], repeat: int) -> Dict[str, float]:
+    transport = httpx.ASGITransport(app=_echo_app(flights))
+    times: Dict[str, float] = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/validated", "/prebuilt"):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = await client.get(path)
+                best = min(best, time.perf_counter() - started)
+            response.raise_for_status()
+            times[path.strip("/")] = round(best * 1000, 1)
+    return times
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Замер пакетного построения и сериализации рейсов")
+    parser.add_argument("--flights", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    args = parser.parse_args(argv)
+
+    records = _flight_records(args.flights, args.csv)
+    flights = validate_many(Flight, records)
+    report = {
+        "flights": len(records),
+        "construct_ms": {
+            "init_per_row": _best(args.repeat, lambda: [Flight(**r) for r in records]),
+            "model_construct": _best(args.repeat, lambda: [Flight.model_construct(**r) for r in records]),
+            "validate_many": _best(args.repeat, lambda: validate_many(Flight, records)),
+        },
+        "serialize_ms": {
+            "dump_json_many": _best(args.repeat, lambda: dump_json_many(Flight, flights)),
+        },
+        "echo_ms": asyncio.run(_echo_times(flights, args.repeat)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
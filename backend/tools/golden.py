@@ -0,0 +1,247 @@
+"""
+Регрессионный прогон планировщика по эталонному корпусу суток.
+
+Корпус (golden_corpus.json) - части дня из test.csv и их синтетические
+варианты: сдвиг всех STD, случайный разброс STD, прореживание и уплотнение
+расписания. Для каждого входа записаны ожидаемые отпечаток плана, покрытие
+рейсов, число водителей со скобками и сменами и бюджет времени. Прогон
+планирует каждый вход через BracketScheduler и ShiftAssignmentService и
+завершается с кодом 1, если покрытие упало, водителей стало больше или
+время вышло за бюджет. Изменившийся при том же качестве отпечаток только
+отмечается в отчете (с --strict - тоже регрессия).
+
+Бюджеты записаны на машине, где делали --update, вместе со временем
+калибровочной нагрузки (calibration_ms). Перед прогоном калибровка
+повторяется, и на более медленной машине бюджеты растягиваются в той же
+пропорции; сами бюджеты - с трехкратным запасом и не меньше 500 мс, чтобы
+шум машины без изменений кода не давал регрессий.
+
+    cd backend
+    python -m tools.golden
+    python -m tools.golden --update          # перезаписать ожидания после осознанного изменения
+    python -m tools.golden --only morning,dense-evening
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.driver import make_drivers
+from app.models.machine import make_machines
+from app.services.bracket_scheduler import BracketScheduler
+from app.services.csv_parser import parse_csv
+from app.services.plan_fingerprint import plan_fingerprint
+from app.services.shift_assignment_service import ShiftAssignmentService
+from app.services.shifts_csv_parser import ShiftsCSVParser
+
+from .loadtest import DEFAULT_CSV, ROOT_DIR, SHIFTS_CSV
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_corpus.json")
+MINUTES_PER_DAY = 24 * 60
+# Нижняя граница бюджета времени входа: мелкие входы шумят сильнее всего
+MIN_BUDGET_MS = 500
+# Размер калибровочной нагрузки (чистый Python, от кода планировщика не зависит)
+CALIBRATION_SIZE = 200_000
+
+
+def _std_minutes(value: str) -> Optional[int]:
+    hours, _, minutes = value.strip().partition(":")
+    if not hours.isdigit() or not minutes.isdigit():
+        return None
+    return int(hours) * 60 + int(minutes)
+
+
+def _variant_rows(rows: List[List[str]], std_index: int, flight_index: int, variant: Dict[str, Any]) -> List[List[str]]:
+    """Синтетический вариант расписания; STD за пределами суток отбрасываются"""
+    rng = random.Random(variant.get("seed", 1))
+    shift = variant.get("shift", 0)
+    jitter = variant.get("jitter", 0)
+    thin = variant.get("thin", 0)
+    densify = variant.get("densify", 0)
+
+    # Пары (строка, добавка к STD); уплотнение - второй рейс того же направления через densify минут
+    source = [(row, 0) for i, row in enumerate(rows) if not thin or (i + 1) % thin]
+    if densify:
+        source += [
+            ([part + "D" if j == flight_index else part for j, part in enumerate(row)], densify)
+            for row, _ in source
+        ]
+    result = []
+    for row, extra in source:
+        std = _std_minutes(row[std_index])
+        if std is None:
+            result.append(row)
+            continue
+        std += shift + extra + (rng.randint(-jitter, jitter) if jitter else 0)
+        if not 0 < std < MINUTES_PER_DAY:
+            continue
+        result.append(row[:std_index] + [f"{std // 60}:{std % 60:02d}"] + row[std_index + 1:])
+    return result
+
+
+def build_schedule(entry: Dict[str, Any], csv_path: str) -> str:
+    """CSV рейсов входа корпуса: срез строк исходного файла и его вариант"""
+    with open(csv_path, encoding="utf-8-sig") as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    header = lines[0].split(";")
+    offset, count = entry["rows"]
+    rows = [line.split(";") for line in lines[1 + offset:1 + offset + count]]
+    variant = entry.get("variant") or {}
+    if variant:
+        rows = _variant_rows(rows, header.index("STD"), header.index("FLIGHT"), variant)
+    return "\n".join(";".join(row) for row in [header] + rows) + "\n"
+
+
+def _best_of(repeat: int, run: Any) -> Tuple[Any, float]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def _calibration_workload() -> int:
+    """Сортировки, словари и строки - того же рода работа, что у планировщика"""
+    rng = random.Random(7)
+    values = [rng.random() for _ in range(CALIBRATION_SIZE)]
+    index = {f"k{i}": value for i, value in enumerate(sorted(values))}
+    return sum(1 for key, value in index.items() if value > 0.5 and key.endswith("7"))
+
+
+def calibrate(repeat: int) -> float:
+    """Время калибровочной нагрузки на этой машине, мс (лучшее из прогонов)"""
+    _, elapsed = _best_of(max(repeat, 3), _calibration_workload)
+    return round(elapsed, 1)
+
+
+def replay(entry: Dict[str, Any], csv_path: str, repeat: int) -> Dict[str, Any]:
+    """Планирует вход корпуса; время - лучшее из repeat прогонов"""
+    flights = parse_csv(build_schedule(entry, csv_path))
+    machines = make_machines(ROOT_DIR)
+    drivers = make_drivers(ROOT_DIR)
+    shifts = ShiftsCSVParser.parse_shifts_file(SHIFTS_CSV)
+
+    plan, plan_ms = _best_of(repeat, lambda: BracketScheduler(flights, machines, drivers).plan_brackets())
+    assignments, shifts_ms = _best_of(
+        repeat, lambda: ShiftAssignmentService(shifts).assign_shifts_to_drivers(plan["brackets"], drivers)
+    )
+    assigned = len(plan["assignments"])
+    return {
+        "fingerprint": plan_fingerprint(plan["brackets"]),
+        "flights": len(flights),
+        "coverage": round(assigned / len(flights), 4) if flights else 0.0,
+        "brackets": len(plan["brackets"]),
+        "drivers": len({b["driverId"] for b in plan["brackets"]}),
+        "shift_assignments": len(assignments),
+        "plan_ms": round(plan_ms, 1),
+        "shifts_ms": round(shifts_ms, 1),
+    }
+
+
+def check(
+    entry: Dict[str, Any],
+    result: Dict[str, Any],
+    coverage_tolerance: float,
+    strict: bool,
+    scale: float = 1.0,
+) -> List[str]:
+    """Чем вход хуже ожиданий корпуса; scale - во сколько раз эта машина медленнее записавшей бюджеты"""
+    expected = entry.get("expected")
+    if not expected:
+        return ["нет ожиданий - запустите с --update"]
+    problems = []
+    if result["flights"] != expected["flights"]:
+        problems.append(f"рейсов {expected['flights']} -> {result['flights']} (вход корпуса изменился)")
+    if result["coverage"] < expected["coverage"] - coverage_tolerance:
+        problems.append(f"покрытие {expected['coverage']} -> {result['coverage']}")
+    if result["drivers"] > expected["drivers"]:
+        problems.append(f"водителей {expected['drivers']} -> {result['drivers']}")
+    if result["shift_assignments"] < expected["shift_assignments"]:
+        problems.append(f"назначений смен {expected['shift_assignments']} -> {result['shift_assignments']}")
+    latency = result["plan_ms"] + result["shifts_ms"]
+    budget = round(expected["budget_ms"] * scale)
+    if latency > budget:
+        problems.append(f"время {round(latency, 1)} мс больше бюджета {budget} мс")
+    if strict and result["fingerprint"] != expected["fingerprint"]:
+        problems.append(f"отпечаток плана {expected['fingerprint']} -> {result['fingerprint']}")
+    return problems
+
+
+def _expectations(result: Dict[str, Any], headroom: float) -> Dict[str, Any]:
+    expected = {key: result[key] for key in ("fingerprint", "flights", "coverage", "brackets", "drivers", "shift_assignments")}
+    # Бюджет с запасом на шум машины; не меньше MIN_BUDGET_MS, чтобы мелкие входы не мигали
+    expected["budget_ms"] = max(MIN_BUDGET_MS, math.ceil((result["plan_ms"] + result["shifts_ms"]) * (1 + headroom)))
+    return expected
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Регрессионный прогон планировщика по эталонному корпусу")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="Исходное расписание для срезов корпуса")
+    parser.add_argument("--only", help="Имена входов через запятую")
+    parser.add_argument("--repeat", type=int, default=3, help="Прогонов на вход (берется лучшее время)")
+    parser.add_argument("--coverage-tolerance", type=float, default=0.0, help="Допустимое падение покрытия (доля)")
+    parser.add_argument("--strict", action="store_true", help="Изменение отпечатка плана - тоже регрессия")
+    parser.add_argument("--update", action="store_true", help="Записать текущие результаты как ожидания")
+    parser.add_argument("--headroom", type=float, default=2.0, help="Запас бюджета времени при --update (доля)")
+    parser.add_argument("--out", help="Файл для JSON-отчета (иначе - stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    # Планировщик подробно пишет о каждой скобке - в прогоне нужны только ошибки
+    logging.getLogger("app").setLevel(logging.ERROR)
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    selected = set(args.only.split(",")) if args.only else None
+
+    # Бюджеты только растягиваются: более быстрая машина их не ужесточает
+    calibration_ms = calibrate(args.repeat)
+    recorded_ms = corpus.get("calibration_ms")
+    scale = max(1.0, calibration_ms / recorded_ms) if recorded_ms else 1.0
+    report: Dict[str, Any] = {
+        "calibration": {"ms": calibration_ms, "recorded_ms": recorded_ms, "scale": round(scale, 2)},
+        "entries": {},
+        "regressions": {},
+    }
+    for entry in corpus["entries"]:
+        if selected is not None and entry["name"] not in selected:
+            continue
+        result = replay(entry, args.csv, args.repeat)
+        expected = entry.get("expected") or {}
+        result["changed"] = bool(expected) and result["fingerprint"] != expected.get("fingerprint")
+        report["entries"][entry["name"]] = result
+        if args.update:
+            entry["expected"] = _expectations(result, args.headroom)
+            continue
+        problems = check(entry, result, args.coverage_tolerance, args.strict, scale)
+        if problems:
+            report["regressions"][entry["name"]] = problems
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.update:
+        corpus["calibration_ms"] = calibration_ms
+        with open(args.corpus, "w", encoding="utf-8") as f:
+            f.write(json.dumps(corpus, ensure_ascii=False, indent=2) + "\n")
+        return 0
+    for name, problems in report["regressions"].items():
+        for line in problems:
+            print(f"Регрессия {name}: {line}", file=sys.stderr)
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Нагрузочный прогон API: одновременные сессии диспетчеров.
+
+Сессии крутятся параллельно заданное время, каждая по своему сценарию:
+  poll         - опрос /flights и /machines с If-None-Match, как экран диспетчера
+  assign       - перетаскивание рейсов: пакет назначений POST /assign/batch
+  import       - повторный импорт CSV рейсов
+  plan         - полное планирование скобок
+  shift-assign - автоназначение смен водителям
+
+По умолчанию приложение запускается в этом же процессе (httpx.ASGITransport,
+временная база SQLite); с --url нагрузка идет на работающий сервер, например
+несколько воркеров uvicorn. Отчет - JSON: пропускная способность и
+p50/p95/p99 по маршрутам. С --baseline прогон сравнивается с прошлым отчетом
+и завершается с кодом 1, если p95 какого-то маршрута вырос больше допустимого.
+
+    cd backend
+    python -m tools.loadtest --duration 30 --pollers 20 --out report.json
+    python -m tools.loadtest --url http://127.0.0.1:8000 --baseline report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CSV = os.path.join(ROOT_DIR, "test.csv")
+SHIFTS_CSV = os.path.join(ROOT_DIR, "shifts.csv")
+
+# Перцентили задержки в отчете
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """Задержки и статусы ответов по имени маршрута"""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs: Any) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            self.statuses[name][type(exc).__name__] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statuses[name][str(response.status_code)] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+        total = 0
+        for name in sorted(set(self.latencies) | set(self.statuses)):
+            values = np.array(self.latencies.get(name, []), dtype=float) * 1000
+            count = int(values.size)
+            total += count
+            stats: Dict[str, Any] = {
+                "count": count,
+                "rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+                "statuses": dict(self.statuses[name]),
+            }
+            if count:
+                p = np.percentile(values, PERCENTILES)
+                stats.update({f"p{q}_ms": round(float(v), 2) for q, v in zip(PERCENTILES, p)})
+                stats["mean_ms"] = round(float(values.mean()), 2)
+                stats["max_ms"] = round(float(values.max()), 2)
+            routes[name] = stats
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "routes": routes,
+        }
+
+
+class Session:
+    """Одна сессия диспетчера: свой кеш ETag и свое представление рейсов/машин"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, think: float, seed: int) -> None:
+        self.client = client
+        self.recorder = recorder
+        self.think = think
+        self.random = random.Random(seed)
+        self.etags: Dict[str, str] = {}
+        self.bodies: Dict[str, Any] = {}
+
+    async def pause(self) -> None:
+        if self.think > 0:
+            # Разброс паузы, чтобы сессии не шли в ногу
+            await asyncio.sleep(self.think * self.random.uniform(0.5, 1.5))
+
+    async def fetch(self, path: str) -> Any:
+        """GET с If-None-Match: при 304 возвращается закешированное тело"""
+        headers = {"If-None-Match": self.etags[path]} if path in self.etags else {}
+        response = await self.recorder.call(self.client, f"GET {path}", "GET", path, headers=headers)
+        if response is None:
+            return self.bodies.get(path)
+        if response.status_code == 200:
+            if "etag" in response.headers:
+                self.etags[path] = response.headers["etag"]
+            self.bodies[path] = response.json()
+        return self.bodies.get(path)
+
+    async def poll(self) -> None:
+        await self.fetch("/flights")
+        await self.fetch("/machines")
+
+    async def assign(self) -> None:
+        flights = await self.fetch("/flights") or []
+        machines = await self.fetch("/machines") or []
+        if not flights or not machines:
+            return
+        operations = []
+        for flight in self.random.sample(flights, min(len(flights), self.random.randint(1, 5))):
+            if flight.get("vehicleId") and self.random.random() < 0.3:
+                operations.append({"op": "unassign", "flightId": flight["id"]})
+            else:
+                machine = self.random.choice(machines)
+                operations.append({"op": "assign", "flightId": flight["id"], "machineId": machine["id"]})
+        await self.recorder.call(self.client, "POST /assign/batch", "POST", "/assign/batch", json={"operations": operations})
+
+    async def import_flights(self, csv_data: bytes) -> None:
+        files = {"file": ("flights.csv", csv_data, "text/csv")}
+        await self.recorder.call(self.client, "POST /flights/import-csv", "POST", "/flights/import-csv", files=files)
+
+    async def plan(self) -> None:
+        await self.recorder.call(self.client, "POST /brackets/create-schedule", "POST", "/brackets/create-schedule")
+
+    async def shift_assign(self) -> None:
+        await self.recorder.call(
+            self.client, "POST /shift-assignments/auto-assign", "POST", "/shift-assignments/auto-assign"
+        )
+
+
+async def _prepare(client: httpx.AsyncClient, csv_data: bytes) -> None:
+    """Исходные данные: рейсы, смены и один план, чтобы назначение смен было осмысленным"""
+    response = await client.post("/flights/import-csv", files={"file": ("flights.csv", csv_data, "text/csv")})
+    response.raise_for_status()
+    with open(SHIFTS_CSV, "rb") as f:
+        response = await client.post("/shifts/upload", files={"file": ("shifts.csv", f.read(), "text/csv")})
+    response.raise_for_status()
+    response = await client.post("/brackets/create-schedule")
+    response.raise_for_status()
+
+
+async def _run_sessions(client: httpx.AsyncClient, args: argparse.Namespace, csv_data: bytes) -> Dict[str, Any]:
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    mix = [
+        ("poll", args.pollers),
+        ("assign", args.assigners),
+        ("import", args.importers),
+        ("plan", args.planners),
+        ("shift-assign", args.shift_assigners),
+    ]
+
+    async def loop(kind: str, seed: int) -> None:
+        session = Session(client, recorder, args.think, seed)
+        actions = {
+            "poll": session.poll,
+            "assign": session.assign,
+            "import": lambda: session.import_flights(csv_data),
+            "plan": session.plan,
+            "shift-assign": session.shift_assign,
+        }
+        # Тяжелые сценарии стартуют вразнобой, а не одновременно в первую секунду
+        await asyncio.sleep(session.random.uniform(0, args.think))
+        while time.monotonic() < deadline:
+            await actions[kind]()
+            await session.pause()
+
+    started = time.monotonic()
+    tasks = [loop(kind, args.seed + i * 1000 + n) for i, (kind, count) in enumerate(mix) for n in range(count)]
+    await asyncio.gather(*tasks)
+    report = recorder.report(time.monotonic() - started)
+    report["sessions"] = {kind: count for kind, count in mix}
+    report["target"] = args.url or "in-process"
+    return report
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    csv_data = _read_csv(args.csv, args.rows)
+    timeout = httpx.Timeout(args.timeout)
+    async with AsyncExitStack() as stack:
+        if args.url:
+            client = await stack.enter_async_context(httpx.AsyncClient(base_url=args.url, timeout=timeout))
+        else:
+            app = _in_process_app(stack)
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            transport = httpx.ASGITransport(app=app)
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout)
+            )
+        await _prepare(client, csv_data)
+        return await _run_sessions(client, args, csv_data)
+
+
+def _read_csv(path: str, rows: int) -> bytes:
+    """Заголовок и первые rows строк CSV (0 - весь файл)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if rows <= 0:
+        return data
+    lines = data.splitlines(keepends=True)
+    return b"".join(lines[: rows + 1])
+
+
+def _in_process_app(stack: AsyncExitStack) -> Any:
+    """Приложение во временной базе: без наблюдателя за файлами, трассы только в памяти, в лог - только ошибки"""
+    workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="aeromar-loadtest-"))
+    os.environ.setdefault("AEROMAR_DB_PATH", os.path.join(workdir, "aeromar.db"))
+    os.environ.setdefault("AEROMAR_WATCH_INTERVAL", "0")
+    os.environ.setdefault("AEROMAR_TRACE_FILE", "")
+    os.environ.setdefault("AEROMAR_LOG_LEVEL", "ERROR")
+    from app.main import app
+    return app
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Маршруты, у которых p95 вырос больше чем на max_regression (доля) относительно базового отчета"""
+    regressions = []
+    for name, stats in report["routes"].items():
+        before = baseline.get("routes", {}).get(name, {}).get("p95_ms")
+        after = stats.get("p95_ms")
+        if before and after and after > before * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before} -> {after} мс")
+    return regressions
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API диспетчерскими сессиями")
+    parser.add_argument("--url", help="Адрес работающего сервера (по умолчанию - приложение в процессе)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность прогона, секунды")
+    parser.add_argument("--pollers", type=int, default=20, help="Сессии опроса")
+    parser.add_argument("--assigners", type=int, default=5, help="Сессии перетаскивания рейсов")
+    parser.add_argument("--importers", type=int, default=1, help="Сессии импорта CSV")
+    parser.add_argument("--planners", type=int, default=1, help="Сессии планирования")
+    parser.add_argument("--shift-assigners", type=int, default=1, help="Сессии назначения смен")
+    parser.add_argument("--think", type=float, default=1.0, help="Средняя пауза между действиями сессии, секунды")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="CSV рейсов для импорта")
+    # Полный суточный test.csv планируется минутами - для прогона хватает части дня
+    parser.add_argument("--rows", type=int, default=60, help="Сколько первых строк CSV импортировать (0 - все)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Таймаут запроса, секунды")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Файл для JSON-отчета (иначе - stdout)")
+    parser.add_argument("--baseline", help="Прошлый отчет для сравнения p95")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Допустимый рост p95 (доля)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"Регрессия: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())